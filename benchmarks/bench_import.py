@@ -0,0 +1,75 @@
+"""Benchmark the import time of the updater module.
+
+Imports the module in fresh interpreters under `python -X importtime`,
+then reports the best cumulative time, the slowest imports and the heavy
+dependencies that got loaded:
+
+    python -m benchmarks.bench_import [--module src.update_data] [--repeat 5] [--max-ms 250]
+
+With --max-ms, exits with an error when the import is slower, or when
+any heavy dependency is imported, so that a regression fails a CI step.
+"""
+import argparse
+import subprocess
+import sys
+from pathlib import Path
+from typing import List, Tuple
+
+# Dependencies that must only be imported by the stages using them
+HEAVY_MODULES = ('pandas', 'numpy', 'pyarrow', 'requests', 'tqdm', 'dotenv')
+ROOT = Path(__file__).parent.parent
+
+
+def import_times(module: str) -> List[Tuple[str, int, int, int]]:
+    """(name, depth, self us, cumulative us) of every import made by module"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    times = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        times.append((name.strip(), depth, int(self_us), int(cumulative_us)))
+    return times
+
+
+def subtree(times: List[Tuple[str, int, int, int]], module: str) -> List[Tuple[str, int, int, int]]:
+    """Imports made while importing module: the deeper lines printed just before it"""
+    end = next(i for i, entry in enumerate(times) if entry[0] == module)
+    start = end
+    while start > 0 and times[start - 1][1] > times[end][1]:
+        start -= 1
+    return times[start:end + 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--module', default='src.update_data')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--max-ms', type=float, help="fail above this import time")
+    args = parser.parse_args()
+
+    runs = [import_times(args.module) for _ in range(args.repeat)]
+    totals = [next(cumulative for name, _, _, cumulative in times if name == args.module)
+              for times in runs]
+    best = min(range(len(runs)), key=totals.__getitem__)
+    times = subtree(runs[best], args.module)
+    print(f"{args.module}: {totals[best] / 1000:.1f} ms (best of {args.repeat})")
+
+    print("slowest imports:")
+    for name, depth, _, cumulative in sorted(times[:-1], key=lambda e: -e[3])[:args.top]:
+        print(f"  {cumulative / 1000:8.1f} ms  {'  ' * depth}{name}")
+
+    loaded = sorted({name.split('.')[0] for name, *_ in times} & set(HEAVY_MODULES))
+    print(f"heavy dependencies imported: {', '.join(loaded) or 'none'}")
+
+    if args.max_ms is not None and (loaded or totals[best] / 1000 > args.max_ms):
+        sys.exit(f"{args.module} import regressed: {totals[best] / 1000:.1f} ms, limit {args.max_ms} ms")
+
+
+if __name__ == '__main__':
+    main()
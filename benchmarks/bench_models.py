@@ -0,0 +1,86 @@
+"""Benchmark the memory of the world airports as dicts and as typed records.
+
+Loads every airports.json of the generated data/ tree, as parsed dicts and
+as Airport records, and reports the memory held by each, the conversion
+time and the time of the export consumers. The records must dump to the
+same bytes as the dicts they were built from:
+
+    python -m benchmarks.bench_models [--data data] [--copies 1]
+
+--copies repeats the dataset, e.g. to approach the enriched world size.
+"""
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, List
+
+from src.export import compact_airport, dumps_pretty, marker_columns
+from src.models import to_airports
+
+
+def load_dicts(data_dir: Path, copies: int, enriched: bool = False) -> List[List[dict]]:
+    countries = []
+    for _ in range(copies):
+        for path in sorted(data_dir.glob('*/airports.json')):
+            with open(path, 'r', encoding='utf-8') as f:
+                airports = json.load(f)['airports']
+            if enriched:
+                airports = [a for a in airports if a.get('runways')]
+            countries.append(airports)
+    return countries
+
+
+def held(name: str, build: Callable[[], object]):
+    """Build a value and report the memory it holds"""
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    value = build()
+    elapsed = time.perf_counter() - started
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:>18}: {current / 1e6:8.1f} MB  {elapsed * 1000:8.0f} ms")
+    return value
+
+
+def timed(name: str, run: Callable[[], object]) -> None:
+    started = time.perf_counter()
+    run()
+    print(f"{name:>18}: {(time.perf_counter() - started) * 1000:8.0f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--data', type=Path, default=Path(__file__).parent.parent / 'data')
+    parser.add_argument('--copies', type=int, default=1)
+    args = parser.parse_args()
+
+    dicts = held('dicts', lambda: load_dicts(args.data, args.copies))
+    print(f"{sum(map(len, dicts))} airports in {len(dicts)} countries")
+    # Converted from a separate load, so that the records own their strings
+    records = held('records', lambda: [
+        to_airports(airports) for airports in load_dicts(args.data, args.copies)
+    ])
+
+    # Enriched airports carry runways, frequencies and navaids as strings
+    enriched = held('enriched dicts', lambda: load_dicts(args.data, args.copies, enriched=True))
+    print(f"{sum(map(len, enriched))} enriched airports")
+    held('enriched records', lambda: [
+        to_airports(airports) for airports in load_dicts(args.data, args.copies, enriched=True)
+    ])
+
+    for airports, typed in zip(dicts, records):
+        assert dumps_pretty(typed) == dumps_pretty(airports)
+        assert [compact_airport(a) for a in typed] == [compact_airport(dict(a)) for a in airports]
+    print("records dump to the bytes of the dicts")
+
+    for name, countries in (('dicts', dicts), ('records', records)):
+        timed(f'compact {name}', lambda: [compact_airport(a) for c in countries for a in c])
+        timed(f'markers {name}', lambda: [marker_columns(c) for c in countries])
+
+
+if __name__ == '__main__':
+    main()
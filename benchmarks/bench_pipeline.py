@@ -0,0 +1,263 @@
+"""Benchmark the update pipeline stage by stage on synthetic data.
+
+For each size, a synthetic airport-codes CSV is generated and the updater
+runs against local stub APIs (see stub_server.py). Every stage is timed
+separately with its peak RSS and the HTTP calls it made:
+
+    python -m benchmarks.bench_pipeline [--rows 10000 80000 500000]
+        [--latency 0.02] [--error-rate 0.01] [--output pipeline.json]
+        [--compare previous.json]
+
+Each size runs in its own process so that peak RSS values do not leak
+from one size into the next. Worker processes of save_country_data are not
+included in the RSS figures.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from benchmarks.stub_server import StubServer
+from benchmarks.synthetic import COUNTRIES, write_csv
+from src.http_client import HttpClient
+from src.scope import EnrichmentScope
+from src.update_data import DEFAULT_SCOPE, AirportDataUpdater, default_rate_limits, peak_rss_mb
+
+
+DEFAULT_ROWS = [10_000, 80_000, 500_000]
+
+
+def current_rss_mb() -> Optional[float]:
+    """Resident set size of the process, on Linux"""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+
+
+class RssSampler:
+    """Track the peak RSS over a block by polling in a thread"""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.peak = current_rss_mb()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            rss = current_rss_mb()
+            if rss is not None and (self.peak is None or rss > self.peak):
+                self.peak = rss
+
+    def __enter__(self) -> 'RssSampler':
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+        rss = current_rss_mb()
+        if rss is not None and (self.peak is None or rss > self.peak):
+            self.peak = rss
+
+
+def _diff(after: Dict[str, int], before: Dict[str, int]) -> Dict[str, int]:
+    return {
+        key: value - before.get(key, 0)
+        for key, value in after.items() if value != before.get(key, 0)
+    }
+
+
+def run_size(rows: int, args: argparse.Namespace) -> Dict:
+    """Run every stage once on a synthetic CSV of rows airports"""
+    os.environ.setdefault('AIRPORTDB_API_KEY', 'benchmark')
+    names = {code: f'Country {code}' for code, *_ in COUNTRIES}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp_dir = Path(tmp)
+        started = time.perf_counter()
+        csv_path = write_csv(rows, tmp_dir / 'airport-codes.csv', seed=args.seed)
+        generate_seconds = time.perf_counter() - started
+
+        with StubServer(csv_path=csv_path, country_names=names) as source, \
+                StubServer(args.latency, args.error_rate, seed=args.seed) as airportdb, \
+                StubServer(args.latency, args.error_rate, seed=args.seed + 1) as metar:
+            airportdb_api = f'{airportdb.url}/airport/'
+            metar_api = f'{metar.url}/metar'
+            rate_limits = {}
+            if args.rate_limits:
+                rate_limits = default_rate_limits(airportdb_api=airportdb_api, metar_api=metar_api)
+            http = HttpClient(max_per_host=args.max_per_host, rate_limits=rate_limits,
+                              backoff=args.backoff)
+            updater = AirportDataUpdater(
+                f'{source.url}/airport-codes.csv', tmp_dir / 'data',
+                max_per_host=args.max_per_host,
+                scope=EnrichmentScope.parse(args.countries, args.continents, args.types,
+                                            default=DEFAULT_SCOPE),
+                http=http,
+                save_workers=args.save_workers,
+                snapshot_dir=tmp_dir / 'data' / 'snapshot' if args.snapshot else None,
+                tiles_dir=tmp_dir / 'data' / 'tiles' if args.tiles else None,
+                search_dir=tmp_dir / 'data' / 'search' if args.search else None,
+            )
+            updater.data_dir.mkdir(parents=True)
+            updater.airportdb_api = airportdb_api
+            updater.metar_api = metar_api
+            updater.country_names_url = f'{source.url}/names.json'
+            servers = {'source': source, 'airportdb': airportdb, 'metar': metar}
+
+            frame = {}
+            stages: List[tuple] = [
+                ('load_country_names', updater.load_country_names),
+                ('download_source_data', lambda: frame.update(df=updater.download_source_data())),
+                ('process_airports', lambda: updater.process_airports(frame['df'])),
+                ('assign_nearest_metar', updater.assign_nearest_metar),
+                ('generate_countries_index', updater.generate_countries_index),
+                ('save_country_data', updater.save_country_data),
+                ('save_tiles', updater.save_tiles),
+                ('save_search_index', updater.save_search_index),
+                ('save_snapshot', updater.save_snapshot),
+            ]
+            results = {}
+            for name, stage in stages:
+                results[name] = measure_stage(stage, servers, http)
+                print(f"{rows:>8} rows  {name:<26} {results[name]['seconds']:8.2f}s  "
+                      f"peak {results[name]['peak_rss_mb'] or 0:7.0f} MB  "
+                      f"{sum(results[name]['http_calls'].values()):6d} calls",
+                      file=sys.stderr)
+            http.close()
+
+    return {
+        'rows': rows,
+        'airports_processed': updater.total_airports,
+        'countries': len(updater.countries_data),
+        'generate_csv_seconds': round(generate_seconds, 3),
+        'total_seconds': round(sum(stage['seconds'] for stage in results.values()), 3),
+        'peak_rss_mb': peak_rss_mb(),
+        'stages': results,
+    }
+
+
+def measure_stage(stage: Callable[[], object], servers: Dict[str, StubServer],
+                  http: HttpClient) -> Dict:
+    before = {name: server.snapshot() for name, server in servers.items()}
+    retries_before = sum(http.retries.values())
+    # Stage output and progress bars are silenced
+    with RssSampler() as sampler, contextlib.redirect_stdout(io.StringIO()), \
+            contextlib.redirect_stderr(io.StringIO()):
+        started = time.perf_counter()
+        stage()
+        seconds = time.perf_counter() - started
+    calls = {}
+    for name, server in servers.items():
+        for key, count in _diff(server.snapshot(), before[name]).items():
+            calls[f'{name} {key}'] = count
+    return {
+        'seconds': round(seconds, 4),
+        'peak_rss_mb': round(sampler.peak, 1) if sampler.peak is not None else None,
+        'http_calls': calls,
+        'retries': sum(http.retries.values()) - retries_before,
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(previous: Dict, current: Dict) -> None:
+    """Print the stage times of current against a previous result file"""
+    old_runs = {run['rows']: run for run in previous.get('runs', [])}
+    print(f"\nCompared with {previous.get('commit') or 'previous run'}:")
+    for run in current['runs']:
+        old = old_runs.get(run['rows'])
+        if old is None:
+            continue
+        for name, stage in run['stages'].items():
+            old_stage = old['stages'].get(name)
+            if not old_stage or not old_stage['seconds']:
+                continue
+            ratio = stage['seconds'] / old_stage['seconds']
+            print(f"{run['rows']:>8} rows  {name:<26} {old_stage['seconds']:8.2f}s -> "
+                  f"{stage['seconds']:8.2f}s  ({ratio:5.2f}x)")
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=DEFAULT_ROWS)
+    parser.add_argument('--latency', type=float, default=0.02, help="stub API latency in seconds")
+    parser.add_argument('--error-rate', type=float, default=0.01,
+                        help="share of stub API requests failing with a 503")
+    parser.add_argument('--countries', help="enrichment scope, as for update_data")
+    parser.add_argument('--continents')
+    parser.add_argument('--types')
+    parser.add_argument('--max-per-host', type=int, default=4)
+    parser.add_argument('--backoff', type=float, default=0.01, help="retry backoff base in seconds")
+    parser.add_argument('--rate-limits', action='store_true',
+                        help="apply the production rate limits to the stub APIs")
+    parser.add_argument('--save-workers', type=int, default=1)
+    parser.add_argument('--no-snapshot', dest='snapshot', action='store_false')
+    parser.add_argument('--no-tiles', dest='tiles', action='store_false')
+    parser.add_argument('--no-search', dest='search', action='store_false')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', type=Path, default=Path('pipeline-benchmark.json'))
+    parser.add_argument('--compare', type=Path, help="previous result file to compare with")
+    parser.add_argument('--single', action='store_true', help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    if args.single:
+        # Child process: one size, result written to --output
+        args.output.write_text(json.dumps(run_size(args.rows[0], args)))
+        return
+
+    runs = []
+    child_args = list(argv if argv is not None else sys.argv[1:])
+    for rows in args.rows:
+        with tempfile.TemporaryDirectory() as tmp:
+            output = Path(tmp) / 'run.json'
+            subprocess.run(
+                [sys.executable, '-m', 'benchmarks.bench_pipeline', *child_args,
+                 '--rows', str(rows), '--single', '--output', str(output)],
+                check=True,
+            )
+            runs.append(json.loads(output.read_text()))
+
+    result = {
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'config': {
+            key: value for key, value in vars(args).items()
+            if key not in ('rows', 'output', 'compare', 'single')
+        },
+        'runs': runs,
+    }
+    args.output.write_text(json.dumps(result, indent=2))
+    print(f"Results written to {args.output}")
+    if args.compare is not None:
+        compare(json.loads(args.compare.read_text()), result)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""Benchmark the conversion of source rows into airport records.
+
+Compares the former iterrows() loop with the vectorized
+AirportDataUpdater._build_records on the full world CSV:
+
+    python -m benchmarks.bench_records [--csv airport-codes.csv]
+
+Without --csv, the CSV is downloaded from the source URL.
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import pandas as pd
+import requests
+
+from src.update_data import AIRPORT_COLUMNS, AirportDataUpdater
+
+
+SOURCE_URL = "https://raw.githubusercontent.com/datasets/airport-codes/main/data/airport-codes.csv"
+
+
+def iterrows_records(frame: pd.DataFrame) -> List[Dict]:
+    """Row conversion as done before the vectorized pass"""
+    records = []
+    for _, row in frame.iterrows():
+        airport_data = {}
+        for col in AIRPORT_COLUMNS:
+            if col in row.index and pd.notna(row[col]):
+                value = row[col]
+                if col == 'elevation_ft':
+                    value = float(value)
+                airport_data[col] = value
+        records.append(airport_data)
+    return records
+
+
+def measure(name: str, build: Callable[[pd.DataFrame], List[Dict]],
+            frame: pd.DataFrame, repeat: int) -> List[Dict]:
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        records = build(frame)
+        best = min(best, time.perf_counter() - started)
+    print(f"{name:>12}: {best:8.3f}s  {len(frame) / best:12,.0f} rows/s")
+    return records
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--csv', type=Path, help="local copy of airport-codes.csv")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    if args.csv:
+        frame = AirportDataUpdater._read_source_csv(args.csv)
+    else:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir) / 'airport-codes.csv'
+            path.write_bytes(requests.get(SOURCE_URL, timeout=60).content)
+            frame = AirportDataUpdater._read_source_csv(path)
+    print(f"{len(frame)} rows")
+
+    before = measure('iterrows', iterrows_records, frame, args.repeat)
+    after = measure('vectorized', AirportDataUpdater._build_records, frame, args.repeat)
+    assert before == after, "vectorized records differ from the iterrows records"
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""Benchmark the search index against a linear scan of the records.
+
+Builds the index from the generated data/ tree, then measures build,
+save and load times and the latency of prefix, multi-word and fuzzy
+queries taken from the indexed names and codes:
+
+    python -m benchmarks.bench_search [--data data] [--queries 2000]
+"""
+import argparse
+import random
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, List
+
+from src.search import SearchIndex, normalize
+
+
+def timed(name: str, run: Callable[[], object]):
+    started = time.perf_counter()
+    result = run()
+    print(f"{name:>16}: {(time.perf_counter() - started) * 1000:10.1f} ms")
+    return result
+
+
+def latency(name: str, query: Callable[[str], object], queries: List[str]) -> None:
+    durations = []
+    for text in queries:
+        started = time.perf_counter()
+        query(text)
+        durations.append(time.perf_counter() - started)
+    durations.sort()
+    p50 = durations[len(durations) // 2] * 1000
+    p99 = durations[int(len(durations) * 0.99)] * 1000
+    print(f"{name:>16}: p50 {p50:7.3f} ms  p99 {p99:7.3f} ms")
+
+
+def typo(word: str, rng: random.Random) -> str:
+    """word with one character dropped"""
+    i = rng.randrange(1, len(word))
+    return word[:i] + word[i + 1:]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--data', type=Path, default=Path(__file__).parent.parent / 'data')
+    parser.add_argument('--queries', type=int, default=2000)
+    args = parser.parse_args()
+
+    index = timed('build', lambda: SearchIndex.from_data_dir(args.data))
+    print(f"{len(index)} airports, {len(index.terms)} terms")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = Path(tmp_dir) / 'search.json'
+        timed('save', lambda: index.save(path))
+        index = timed('load', lambda: SearchIndex.load(path))
+
+    rng = random.Random(0)
+    names = [normalize(name) for name in index.records['name'] if normalize(name)]
+    sample = [rng.choice(names).split() for _ in range(args.queries)]
+    prefixes = [words[0][:rng.randint(2, 5)] for words in sample]
+    phrases = [' '.join(words[:2]) for words in sample]
+    typos = [typo(words[0], rng) for words in sample if len(words[0]) > 4]
+    codes = [rng.choice(index.records['ident']) for _ in range(args.queries)]
+
+    timed('trigram index', lambda: index.search('xqzv'))
+    latency('code', index.search, codes)
+    latency('prefix', index.search, prefixes)
+    latency('two words', index.search, phrases)
+    latency('fuzzy', index.search, typos)
+    latency('linear scan', lambda text: [
+        i for i, name in enumerate(names) if text in name
+    ][:10], prefixes[:200])
+
+
+if __name__ == '__main__':
+    main()
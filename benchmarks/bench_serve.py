@@ -0,0 +1,124 @@
+"""Load test of the local query service.
+
+Starts src.serve on the generated data/ tree (or targets a running service
+with --url) and sends a mix of country, ident, bbox and search requests
+from concurrent keep-alive clients. Reports the requests per second and
+the p50/p99 latency per endpoint:
+
+    python -m benchmarks.bench_serve [--data data] [--requests 5000] [--clients 8]
+
+Idents, boxes and queries are drawn from a skewed distribution, so that
+popular requests repeat as they would from real tools; --cache-size 0
+measures the service without its response cache.
+"""
+import argparse
+import http.client
+import random
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+from urllib.parse import quote, urlparse
+
+from src.search import normalize
+from src.serve import AirportServer, AirportService
+
+
+def build_requests(service_data, count: int, seed: int = 0) -> List[Tuple[str, str]]:
+    """(endpoint, path) pairs; a fifth of the idents and names get most requests"""
+    rng = random.Random(seed)
+    idents = sorted(service_data.idents)
+    countries = sorted(service_data.headers)
+    names = [normalize(name) for name in service_data.search.records['name'] if normalize(name)]
+
+    def skewed(values):
+        return values[int(len(values) * rng.random() ** 3)]
+
+    requests = []
+    for _ in range(count):
+        kind = rng.choices(['airport', 'search', 'bbox', 'country'], weights=[50, 30, 15, 5])[0]
+        if kind == 'airport':
+            path = f'/airports/{quote(skewed(idents))}'
+        elif kind == 'search':
+            words = skewed(names).split()
+            path = f'/search?q={quote(" ".join(words)[:rng.randint(3, 12)])}'
+        elif kind == 'bbox':
+            lat, lon = rng.uniform(-60, 70), rng.uniform(-180, 175)
+            size = rng.choice([0.5, 2, 10])
+            path = f'/bbox?south={lat:.1f}&west={lon:.1f}&north={lat + size:.1f}&east={lon + size:.1f}'
+        else:
+            path = f'/countries/{skewed(countries)}'
+        requests.append((kind, path))
+    return requests
+
+
+def run_client(url: str, requests: List[Tuple[str, str]], latencies: Dict[str, List[float]],
+               lock: threading.Lock) -> None:
+    target = urlparse(url)
+    connection = http.client.HTTPConnection(target.hostname, target.port)
+    local: Dict[str, List[float]] = {}
+    for kind, path in requests:
+        started = time.perf_counter()
+        connection.request('GET', path, headers={'Accept-Encoding': 'gzip'})
+        response = connection.getresponse()
+        response.read()
+        local.setdefault(kind, []).append(time.perf_counter() - started)
+        if response.status >= 500:
+            raise RuntimeError(f"{path}: HTTP {response.status}")
+    connection.close()
+    with lock:
+        for kind, values in local.items():
+            latencies.setdefault(kind, []).extend(values)
+
+
+def report(name: str, durations: List[float], elapsed: float) -> None:
+    durations = sorted(durations)
+    p50 = durations[len(durations) // 2] * 1000
+    p99 = durations[int(len(durations) * 0.99)] * 1000
+    print(f"{name:>8}: {len(durations):6d} requests  {len(durations) / elapsed:8.0f} req/s  "
+          f"p50 {p50:7.2f} ms  p99 {p99:7.2f} ms")
+
+
+def load_test(url: str, requests: List[Tuple[str, str]], clients: int) -> None:
+    latencies: Dict[str, List[float]] = {}
+    lock = threading.Lock()
+    threads = [
+        threading.Thread(target=run_client, args=(url, requests[i::clients], latencies, lock))
+        for i in range(clients)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    for kind in sorted(latencies):
+        report(kind, latencies[kind], elapsed)
+    report('total', [d for values in latencies.values() for d in values], elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--data', type=Path, default=Path(__file__).parent.parent / 'data')
+    parser.add_argument('--url', help="running service to target instead of a local one")
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--cache-size', type=int, default=1024)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    # The request mix is drawn from the dataset, also when targeting --url
+    service = AirportService(args.data, cache_size=args.cache_size, reload_interval=0)
+    print(f"Loaded {len(service.dataset)} airports in {time.perf_counter() - started:.1f}s")
+    requests = build_requests(service.dataset, args.requests)
+
+    if args.url:
+        load_test(args.url, requests, args.clients)
+        return
+    with AirportServer(service, port=0, quiet=True) as server:
+        load_test(server.url, requests, args.clients)
+        print(f"cache: {service.health()['cache']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""Benchmark the spatial index against a full NumPy scan.
+
+Builds the index from the generated data/ tree (or random points), then
+measures build and load times and nearest/radius queries per second:
+
+    python -m benchmarks.bench_spatial [--data data] [--synthetic 500000]
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+
+from src.spatial import SpatialIndex, haversine_km
+
+
+def timed(name: str, run: Callable[[], object]):
+    started = time.perf_counter()
+    result = run()
+    print(f"{name:>16}: {(time.perf_counter() - started) * 1000:10.1f} ms")
+    return result
+
+
+def qps(name: str, query: Callable[[float, float], object], points: np.ndarray) -> None:
+    started = time.perf_counter()
+    for lat, lon in points:
+        query(lat, lon)
+    elapsed = time.perf_counter() - started
+    print(f"{name:>16}: {len(points) / elapsed:10,.0f} queries/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--data', type=Path, default=Path(__file__).parent.parent / 'data')
+    parser.add_argument('--synthetic', type=int, help="index this many random points instead")
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('-k', type=int, default=5)
+    parser.add_argument('--radius', type=float, default=50.0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    if args.synthetic:
+        lat = np.degrees(np.arcsin(rng.uniform(-1, 1, args.synthetic)))
+        lon = rng.uniform(-180, 180, args.synthetic)
+        records = [
+            {'ident': f'P{i}', 'latitude_deg': a, 'longitude_deg': b}
+            for i, (a, b) in enumerate(zip(lat, lon))
+        ]
+        index = timed('build', lambda: SpatialIndex.from_records(records))
+    else:
+        index = timed('build', lambda: SpatialIndex.from_data_dir(args.data))
+    print(f"{len(index)} airports")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = Path(tmp_dir) / 'spatial.npz'
+        timed('save', lambda: index.save(path))
+        index = timed('load', lambda: SpatialIndex.load(path))
+
+    # Query around indexed airports, where the data actually is
+    sample = rng.integers(0, len(index), args.queries)
+    points = np.column_stack([index.lat[sample], index.lon[sample]]) + rng.normal(0, 0.2, (args.queries, 2))
+    points[:, 0] = np.clip(points[:, 0], -90, 90)
+
+    qps(f'nearest k={args.k}', lambda a, b: index.nearest(a, b, args.k), points)
+    qps(f'within {args.radius:g} km', lambda a, b: index.within(a, b, args.radius), points)
+    if not args.synthetic:
+        qps('nearest METAR', lambda a, b: index.nearest(a, b, metar_available=True), points)
+    qps('full scan', lambda a, b: np.argpartition(
+        haversine_km(a, b, index.lat, index.lon), args.k)[:args.k], points[:200])
+
+
+if __name__ == '__main__':
+    main()
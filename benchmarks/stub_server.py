@@ -0,0 +1,125 @@
+"""Local stand-ins for the APIs used by the updater.
+
+StubServer answers AirportDB lookups, METAR queries, the country names and
+the source CSV on 127.0.0.1, with a configurable latency and error rate,
+and counts the requests it served.
+"""
+import json
+import random
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Optional
+from urllib.parse import parse_qs, urlparse
+
+
+def has_metar(ident: str) -> bool:
+    """Stations reporting METAR: a deterministic half of the idents"""
+    return zlib.crc32(ident.encode('utf-8')) % 2 == 0
+
+
+def airport_details(ident: str) -> Dict:
+    """An AirportDB-like response with a runway, a frequency and a navaid"""
+    return {
+        'ident': ident,
+        'icao_code': ident,
+        'runways': [{
+            'id': '1', 'airport_ident': ident, 'length_ft': '9000', 'width_ft': '150',
+            'surface': 'ASP', 'lighted': '1', 'closed': '0', 'le_ident': '09', 'he_ident': '27',
+        }],
+        'freqs': [{'id': '2', 'airport_ident': ident, 'type': 'TWR', 'frequency_mhz': '118.5'}],
+        'navaids': [{'id': '3', 'ident': ident[:3], 'type': 'VOR', 'frequency_khz': '113000'}],
+        'station': {'icao_code': ident, 'distance': 0},
+    }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: 'StubServer'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: bytes, content_type: str = 'application/json') -> None:
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        stub = self.server
+        url = urlparse(self.path)
+        kind = url.path.strip('/').split('/')[0] or 'root'
+        if stub.latency:
+            time.sleep(stub.latency)
+        if kind in ('airport', 'metar') and stub.fail():
+            stub.count(kind, 503)
+            return self._send(503, b'{"error": "unavailable"}')
+
+        if kind == 'airport':
+            ident = url.path.rsplit('/', 1)[-1]
+            status, body = 200, airport_details(ident)
+        elif kind == 'metar':
+            ids = parse_qs(url.query).get('ids', [''])[0].split(',')
+            status, body = 200, [{'icaoId': ident} for ident in ids if ident and has_metar(ident)]
+        elif kind == 'names.json':
+            status, body = 200, stub.country_names
+        elif kind == 'airport-codes.csv' and stub.csv_path is not None:
+            stub.count(kind, 200)
+            return self._send(200, stub.csv_path.read_bytes(), 'text/csv')
+        else:
+            status, body = 404, {'error': 'not found'}
+        stub.count(kind, status)
+        self._send(status, json.dumps(body).encode('utf-8'))
+
+
+class StubServer(ThreadingHTTPServer):
+    """Threaded HTTP server on a free local port.
+
+    Routes: /airport/<ident>, /metar?ids=..., /names.json and
+    /airport-codes.csv. AirportDB and METAR requests fail with a 503 at
+    error_rate, after waiting latency seconds like every request.
+    """
+    daemon_threads = True
+
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0,
+                 csv_path: Optional[Path] = None,
+                 country_names: Optional[Dict[str, str]] = None, seed: int = 0):
+        super().__init__(('127.0.0.1', 0), _Handler)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.csv_path = csv_path
+        self.country_names = country_names or {}
+        self.counts: Dict[str, int] = {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def fail(self) -> bool:
+        with self._lock:
+            return self._random.random() < self.error_rate
+
+    def count(self, kind: str, status: int) -> None:
+        with self._lock:
+            key = f'{kind} {status}'
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.counts)
+
+    def __enter__(self) -> 'StubServer':
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.shutdown()
+        self.server_close()
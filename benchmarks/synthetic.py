@@ -0,0 +1,129 @@
+"""Synthetic airport-codes CSVs for benchmarks.
+
+Rows follow the shape of the real source: countries with a skewed airport
+count, the real mix of airport types, and ICAO-like idents for the larger
+airports. Generation is seeded and vectorized:
+
+    python -m benchmarks.synthetic 80000 airport-codes.csv
+"""
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+
+SOURCE_HEADER = [
+    'ident', 'type', 'name', 'elevation_ft', 'continent', 'iso_country', 'iso_region',
+    'municipality', 'icao_code', 'iata_code', 'gps_code', 'local_code', 'coordinates',
+]
+
+# Share of each type in the real source
+TYPE_SHARES = {
+    'small_airport': 0.50,
+    'heliport': 0.27,
+    'closed': 0.12,
+    'medium_airport': 0.06,
+    'seaplane_base': 0.016,
+    'large_airport': 0.007,
+    'balloonport': 0.007,
+}
+
+# Countries with their continent and a rough centre, to place airports
+COUNTRIES = [
+    ('US', 'NA', 39, -98), ('BR', 'SA', -10, -52), ('JP', 'AS', 36, 138),
+    ('CA', 'NA', 56, -106), ('AU', 'OC', -25, 134), ('MX', 'NA', 23, -102),
+    ('RU', 'EU', 60, 90), ('FR', 'EU', 46, 2), ('GB', 'EU', 54, -2),
+    ('DE', 'EU', 51, 10), ('AR', 'SA', -34, -64), ('CO', 'SA', 4, -72),
+    ('ZA', 'AF', -29, 24), ('IT', 'EU', 42, 12), ('ES', 'EU', 40, -4),
+    ('IN', 'AS', 21, 78), ('CN', 'AS', 35, 103), ('PH', 'AS', 13, 122),
+    ('ID', 'AS', -2, 118), ('NZ', 'OC', -41, 174), ('PG', 'OC', -6, 147),
+    ('NO', 'EU', 61, 8), ('SE', 'EU', 62, 15), ('FI', 'EU', 64, 26),
+    ('PL', 'EU', 52, 19), ('UA', 'EU', 49, 32), ('TR', 'AS', 39, 35),
+    ('KE', 'AF', 0, 38), ('NG', 'AF', 9, 8), ('EG', 'AF', 27, 30),
+    ('CL', 'SA', -30, -71), ('PE', 'SA', -9, -75), ('VE', 'SA', 7, -66),
+    ('BO', 'SA', -17, -64), ('NL', 'EU', 52, 5), ('BE', 'EU', 50, 4),
+    ('CH', 'EU', 47, 8), ('AT', 'EU', 47, 14), ('IE', 'EU', 53, -8),
+    ('PT', 'EU', 39, -8), ('LU', 'EU', 49.8, 6.1), ('MC', 'EU', 43.7, 7.4),
+    ('GR', 'EU', 39, 22), ('CZ', 'EU', 49.8, 15.5), ('DK', 'EU', 56, 10),
+    ('IS', 'EU', 65, -18), ('KR', 'AS', 36, 128), ('TH', 'AS', 15, 101),
+    ('VN', 'AS', 16, 107), ('MY', 'AS', 4, 102), ('SA', 'AS', 24, 45),
+    ('IR', 'AS', 32, 53), ('PK', 'AS', 30, 70), ('KZ', 'AS', 48, 68),
+    ('MA', 'AF', 32, -6), ('DZ', 'AF', 28, 2), ('TZ', 'AF', -6, 35),
+    ('AO', 'AF', -12, 18), ('NA', 'AF', -22, 17), ('GL', 'NA', 72, -40),
+    ('CU', 'NA', 22, -80), ('GT', 'NA', 15, -90), ('FJ', 'OC', -18, 178),
+    ('AQ', 'AN', -80, 0),
+]
+
+
+def generate(rows: int, seed: int = 0) -> pd.DataFrame:
+    """A source frame of rows synthetic airports"""
+    rng = np.random.default_rng(seed)
+    codes = np.array([c[0] for c in COUNTRIES])
+    continents = np.array([c[1] for c in COUNTRIES])
+    centres = np.array([(c[2], c[3]) for c in COUNTRIES], dtype=float)
+
+    # Zipf-like country sizes: a few countries hold most airports
+    weights = 1.0 / np.arange(1, len(COUNTRIES) + 1) ** 1.1
+    country = rng.choice(len(COUNTRIES), size=rows, p=weights / weights.sum())
+    types = np.array(list(TYPE_SHARES))
+    shares = np.array(list(TYPE_SHARES.values()))
+    airport_type = types[rng.choice(len(types), size=rows, p=shares / shares.sum())]
+
+    lat = np.clip(centres[country, 0] + rng.normal(0, 4, rows), -89.9, 89.9)
+    lon = (centres[country, 1] + rng.normal(0, 6, rows) + 180) % 360 - 180
+    number = np.arange(rows)
+    cc = codes[country]
+
+    # ICAO-like idents for large and medium airports, local ones otherwise
+    letters = np.array(list('ABCDEFGHIJKLMNOPQRSTUVWXYZ'))
+    icao = (
+        pd.Series(cc).str[0]
+        + pd.Series(letters[number % 26])
+        + pd.Series(letters[(number // 26) % 26])
+        + pd.Series(letters[(number // 676) % 26])
+        + pd.Series(number // 17576).astype(str).where(number >= 17576, '')
+    )
+    major = np.isin(airport_type, ['large_airport', 'medium_airport'])
+    ident = np.where(major, icao, pd.Series(cc) + '-' + pd.Series(number).astype(str).str.zfill(6))
+
+    elevation = np.round(np.abs(rng.normal(300, 500, rows)))
+    elevation_values = pd.Series(elevation, dtype='float64').where(rng.random(rows) > 0.05)
+    region = pd.Series(cc) + '-' + pd.Series(rng.integers(1, 30, rows)).astype(str).str.zfill(2)
+
+    return pd.DataFrame({
+        'ident': ident,
+        'type': airport_type,
+        'name': 'Synthetic Airport ' + pd.Series(number).astype(str),
+        'elevation_ft': elevation_values.astype('Int64'),
+        'continent': continents[country],
+        'iso_country': cc,
+        'iso_region': region,
+        'municipality': 'Town ' + pd.Series(number % 5000).astype(str),
+        'icao_code': np.where(major, ident, ''),
+        'iata_code': '',
+        'gps_code': np.where(major, ident, ''),
+        'local_code': '',
+        'coordinates': (
+            pd.Series(np.round(lat, 6)).astype(str) + ', ' + pd.Series(np.round(lon, 6)).astype(str)
+        ),
+    }, columns=SOURCE_HEADER)
+
+
+def write_csv(rows: int, path: Path, seed: int = 0) -> Path:
+    """Write a synthetic airport-codes CSV"""
+    generate(rows, seed).to_csv(path, index=False)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('rows', type=int)
+    parser.add_argument('output', type=Path)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    write_csv(args.rows, args.output, args.seed)
+
+
+if __name__ == '__main__':
+    main()
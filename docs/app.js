@@ -3,6 +3,31 @@ let map = null;
 let markers = null;
 let currentCountry = null;
 
+const DATA_URL = 'https://raw.githubusercontent.com/Teyk0o/airport-explorer/master/data';
+const TILES_URL = `${DATA_URL}/tiles`;
+const SEARCH_URL = `${DATA_URL}/search`;
+
+// Details chunks already fetched, keyed by country and chunk number
+const detailsChunks = new Map();
+
+// World view: tile pyramid description, fetched tiles keyed by z/x/y,
+// cluster markers of the current view and a counter discarding stale renders
+let tileIndex = null;
+const tiles = new Map();
+let clusters = null;
+let worldViewRender = 0;
+
+// Search: index description, fetched term shards and record chunks, the
+// marker of the chosen result and a counter discarding stale searches
+let searchIndex = null;
+const searchShards = new Map();
+const searchRecords = new Map();
+let searchMarker = null;
+let searchRequest = 0;
+const SEARCH_LIMIT = 10;
+const FUZZY_THRESHOLD = 0.4;
+const FUZZY_TERMS = 20;
+
 /**
  * Initialize the map and base layer
  */
@@ -19,6 +44,15 @@ function initializeMap() {
     // Initialize marker cluster group
     markers = L.markerClusterGroup();
     map.addLayer(markers);
+
+    // Precomputed clusters of the world view
+    clusters = L.layerGroup();
+    map.addLayer(clusters);
+    map.on('moveend', updateWorldView);
+
+    // Airport chosen in the search results
+    searchMarker = L.layerGroup();
+    map.addLayer(searchMarker);
 }
 
 /**
@@ -26,14 +60,14 @@ function initializeMap() {
  */
 async function loadCountries() {
     try {
-        const response = await fetch('https://raw.githubusercontent.com/Teyk0o/airport-explorer/master/data/countries.json');
+        const response = await fetch(`${DATA_URL}/countries.json`);
         if (!response.ok) {
             throw new Error(`HTTP error! status: ${response.status}`);
         }
         const countries = await response.json();
 
         const select = document.getElementById('countrySelect');
-        select.innerHTML = '<option value="">Select a country</option>';
+        select.innerHTML = '<option value="">World view</option>';
 
         // Sort countries by name
         countries.sort((a, b) => a.name.localeCompare(b.name));
@@ -50,41 +84,253 @@ async function loadCountries() {
     }
 }
 
+/**
+ * Fetch a JSON file, resolving to null on 404
+ * @param {string} url - File URL
+ * @returns {Promise<Object|null>} Parsed JSON
+ */
+async function fetchJson(url) {
+    const response = await fetch(url);
+    if (response.status === 404) {
+        return null;
+    }
+    if (!response.ok) {
+        throw new Error(`HTTP error! status: ${response.status}`);
+    }
+    return response.json();
+}
+
+/**
+ * Fetch a JSON file once, keeping the request in a cache
+ * @param {Map} cache - Requests keyed by path
+ * @param {string} baseUrl - URL the path is relative to
+ * @param {string} path - File path, without the .json extension
+ * @returns {Promise<Object|null>} Parsed JSON, null on 404
+ */
+function fetchCached(cache, baseUrl, path) {
+    if (!cache.has(path)) {
+        const request = fetchJson(`${baseUrl}/${path}.json`)
+            .catch(error => {
+                cache.delete(path);
+                throw error;
+            });
+        cache.set(path, request);
+    }
+    return cache.get(path);
+}
+
+/**
+ * Fetch the details chunk holding the airport at a marker position
+ * @param {string} countryCode - The ISO country code
+ * @param {number} chunk - Chunk number
+ * @returns {Promise<Array>} Airport records of the chunk
+ */
+function loadDetailsChunk(countryCode, chunk) {
+    return fetchCached(detailsChunks, DATA_URL, `${countryCode}/details/${chunk}`);
+}
+
+/**
+ * Create a marker whose popup loads the airport details when first opened
+ * @param {Array} position - Latitude and longitude
+ * @param {Object} summary - Name and type shown until the details are loaded
+ * @param {string} countryCode - The ISO country code, lowercase
+ * @param {number} index - Airport position in the country files
+ * @param {number} chunkSize - Airports per details chunk
+ * @returns {L.Marker} The marker
+ */
+function createLazyMarker(position, summary, countryCode, index, chunkSize) {
+    const marker = L.marker(position).bindPopup(createPopupContent(summary));
+
+    marker.once('popupopen', async () => {
+        try {
+            const chunk = await loadDetailsChunk(countryCode, Math.floor(index / chunkSize));
+            marker.setPopupContent(createPopupContent(chunk[index % chunkSize]));
+        } catch (error) {
+            console.error('Error loading airport details:', error);
+        }
+    });
+
+    return marker;
+}
+
+/**
+ * Add a marker of a country's compact markers file
+ * @param {string} countryCode - The ISO country code
+ * @param {Object} data - Compact markers file
+ * @param {number} index - Airport position in the marker arrays
+ */
+function addCompactMarker(countryCode, data, index) {
+    const { ident, lat, lon, type } = data.markers;
+    markers.addLayer(createLazyMarker(
+        [lat[index], lon[index]], { name: ident[index], type: type[index] },
+        countryCode, index, data.details_chunk_size
+    ));
+}
+
+/**
+ * Fetch a tile of the world view, resolving to null for tiles without airports
+ * @param {number} z - Zoom
+ * @param {number} x - Tile column
+ * @param {number} y - Tile row
+ * @returns {Promise<Object|null>} Tile content
+ */
+function loadTile(z, x, y) {
+    return fetchCached(tiles, TILES_URL, `${z}/${x}/${y}`);
+}
+
+/**
+ * Tiles of a zoom covering the visible map area
+ * @param {L.LatLngBounds} bounds - Visible area
+ * @param {number} z - Zoom
+ * @returns {Array} [x, y] pairs
+ */
+function tilesInView(bounds, z) {
+    const scale = 2 ** z;
+    const clamp = (value) => Math.min(scale - 1, Math.max(0, Math.floor(value)));
+    const tileX = (lon) => clamp((lon + 180) / 360 * scale);
+    const tileY = (lat) => {
+        const sin = Math.sin(Math.max(-85.0511, Math.min(85.0511, lat)) * Math.PI / 180);
+        return clamp((0.5 - Math.log((1 + sin) / (1 - sin)) / (4 * Math.PI)) * scale);
+    };
+
+    const result = [];
+    for (let x = tileX(bounds.getWest()); x <= tileX(bounds.getEast()); x++) {
+        for (let y = tileY(bounds.getNorth()); y <= tileY(bounds.getSouth()); y++) {
+            result.push([x, y]);
+        }
+    }
+    return result;
+}
+
+/**
+ * Create a cluster marker zooming into its airports when clicked
+ * @param {number} lat - Centroid latitude
+ * @param {number} lon - Centroid longitude
+ * @param {number} count - Number of airports
+ * @returns {L.Marker} The marker
+ */
+function createClusterMarker(lat, lon, count) {
+    const size = count < 10 ? 'small' : count < 100 ? 'medium' : 'large';
+    const icon = L.divIcon({
+        html: `<div><span>${count}</span></div>`,
+        className: `marker-cluster marker-cluster-${size}`,
+        iconSize: L.point(40, 40)
+    });
+    return L.marker([lat, lon], { icon })
+        .on('click', () => map.setView([lat, lon], map.getZoom() + 2));
+}
+
+/**
+ * Show the precomputed clusters, or the markers at the deepest zoom, of the
+ * tiles in view when no country is selected
+ */
+async function updateWorldView() {
+    if (currentCountry || !tileIndex) return;
+
+    const render = ++worldViewRender;
+    const z = Math.min(map.getZoom(), tileIndex.max_zoom);
+
+    try {
+        const content = await Promise.all(
+            tilesInView(map.getBounds(), z).map(([x, y]) => loadTile(z, x, y))
+        );
+        // A newer view or a selected country replaced this one meanwhile
+        if (render !== worldViewRender || currentCountry) return;
+
+        clusters.clearLayers();
+        markers.clearLayers();
+        content.filter(tile => tile).forEach(tile => {
+            if (tile.clusters) {
+                const { lat, lon, count } = tile.clusters;
+                count.forEach((value, i) => clusters.addLayer(createClusterMarker(lat[i], lon[i], value)));
+            } else {
+                const { ident, lat, lon, type, country, index } = tile.markers;
+                markers.addLayers(ident.map((name, i) => createLazyMarker(
+                    [lat[i], lon[i]], { name, type: type[i] },
+                    country[i].toLowerCase(), index[i], tileIndex.details_chunk_size
+                )));
+            }
+        });
+    } catch (error) {
+        console.error('Error loading map tiles:', error);
+        showError('Failed to load the world map. Please try again.');
+    }
+}
+
+/**
+ * Load the tile pyramid description and show the world view
+ */
+async function loadWorldView() {
+    try {
+        tileIndex = await fetchJson(`${TILES_URL}/index.json`);
+    } catch (error) {
+        console.error('Error loading the tile index:', error);
+    }
+    if (tileIndex) {
+        document.getElementById('statistics').innerHTML = `
+            <h3>World</h3>
+            <p>Total airports: <strong>${tileIndex.total_airports}</strong></p>
+        `;
+    }
+    updateWorldView();
+}
+
+/**
+ * Leave the selected country for the world view
+ */
+function showWorldView() {
+    currentCountry = null;
+    markers.clearLayers();
+    map.setView([0, 0], 2);
+    loadWorldView();
+}
+
 /**
  * Load and display airports for a selected country
  * @param {string} countryCode - The ISO country code
  */
 async function loadAirports(countryCode) {
     try {
-        // Clear existing markers
+        // Clear existing markers and world view clusters
         markers.clearLayers();
+        clusters.clearLayers();
 
         // Show loading indicator
         showLoading(true);
 
-        const response = await fetch(`https://raw.githubusercontent.com/Teyk0o/airport-explorer/master/data/${countryCode}/airports.json`);
-        if (!response.ok) {
-            throw new Error(`HTTP error! status: ${response.status}`);
-        }
-        const data = await response.json();
-
         const bounds = [];
 
-        // Add markers for each airport
-        data.airports.forEach(airport => {
-            if (!airport.coordinates) return;
+        // Compact marker arrays first, the full file for older data
+        let data = await fetchJson(`${DATA_URL}/${countryCode}/markers.json`);
+        if (data) {
+            const { lat, lon } = data.markers;
+            lat.forEach((latitude, index) => {
+                if (latitude === null || lon[index] === null) return;
+                bounds.push([latitude, lon[index]]);
+                addCompactMarker(countryCode, data, index);
+            });
+        } else {
+            data = await fetchJson(`${DATA_URL}/${countryCode}/airports.json`);
+            if (!data) {
+                throw new Error('No airport data for this country');
+            }
+
+            // Add markers for each airport
+            data.airports.forEach(airport => {
+                if (!airport.coordinates) return;
 
-            const [lat, lon] = airport.coordinates.split(',').map(coord => parseFloat(coord.trim()));
+                const [lat, lon] = airport.coordinates.split(',').map(coord => parseFloat(coord.trim()));
 
-            if (!isNaN(lat) && !isNaN(lon)) {
-                bounds.push([lat, lon]);
+                if (!isNaN(lat) && !isNaN(lon)) {
+                    bounds.push([lat, lon]);
 
-                const marker = L.marker([lat, lon])
-                    .bindPopup(createPopupContent(airport));
+                    const marker = L.marker([lat, lon])
+                        .bindPopup(createPopupContent(airport));
 
-                markers.addLayer(marker);
-            }
-        });
+                    markers.addLayer(marker);
+                }
+            });
+        }
 
         // Fit map to show all markers
         if (bounds.length > 0) {
@@ -102,6 +348,181 @@ async function loadAirports(countryCode) {
     }
 }
 
+/**
+ * Normalize text as the search index does: lowercase ASCII words
+ * @param {string} text - Query
+ * @returns {Array} Words
+ */
+function searchTokens(text) {
+    return text
+        .normalize('NFKD')
+        .replace(/[\u0300-\u036f]/g, '')
+        .toLowerCase()
+        .split(/[^a-z0-9]+/)
+        .filter(Boolean);
+}
+
+/**
+ * Trigrams of a term padded with a space on both sides
+ * @param {string} term - Index term
+ * @returns {Set} Trigrams
+ */
+function trigrams(term) {
+    const padded = ` ${term} `;
+    const result = new Set();
+    for (let i = 0; i < padded.length - 2; i++) {
+        result.add(padded.slice(i, i + 3));
+    }
+    return result;
+}
+
+/**
+ * Record ids of the terms of a shard starting with a word, and of the
+ * terms similar to it when fuzzy
+ * @param {Object|null} shard - Terms file of the word's prefix
+ * @param {string} token - Query word
+ * @param {boolean} fuzzy - Whether to add similar terms
+ * @returns {Set} Record ids
+ */
+function matchingIds(shard, token, fuzzy) {
+    const ids = new Set();
+    if (!shard) return ids;
+    const { terms } = shard;
+
+    // Terms are sorted: those starting with the word follow its position
+    let lo = 0;
+    let hi = terms.length;
+    while (lo < hi) {
+        const mid = (lo + hi) >> 1;
+        if (terms[mid] < token) lo = mid + 1; else hi = mid;
+    }
+    for (let i = lo; i < terms.length && terms[i].startsWith(token); i++) {
+        shard.ids[i].forEach(id => ids.add(id));
+    }
+
+    if (fuzzy) {
+        const wanted = trigrams(token);
+        terms
+            .map((term, i) => {
+                const own = trigrams(term);
+                const shared = [...wanted].filter(trigram => own.has(trigram)).length;
+                return [shared / (wanted.size + own.size - shared), i];
+            })
+            .filter(([similarity]) => similarity >= FUZZY_THRESHOLD)
+            .sort((a, b) => b[0] - a[0])
+            .slice(0, FUZZY_TERMS)
+            .forEach(([_, i]) => shard.ids[i].forEach(id => ids.add(id)));
+    }
+    return ids;
+}
+
+/**
+ * Records of the airports matching every word of a query, best first:
+ * exact codes, then words starting with the query words, then similar words
+ * @param {string} query - Search text
+ * @returns {Promise<Array>} Airport records
+ */
+async function searchAirports(query) {
+    const tokens = searchTokens(query);
+    if (!searchIndex || !tokens.length) return [];
+
+    const prefix = (text) => text.slice(0, searchIndex.prefix_length);
+    const loadShard = (text) => fetchCached(searchShards, SEARCH_URL, `terms/${prefix(text)}`);
+    const code = tokens.join('');
+    const [codeShard, ...shards] = await Promise.all([code, ...tokens].map(loadShard));
+
+    const found = [...((codeShard && codeShard.codes[code]) || [])].slice(0, SEARCH_LIMIT);
+    for (const fuzzy of [false, true]) {
+        if (found.length >= SEARCH_LIMIT) break;
+        const sets = tokens.map((token, i) => matchingIds(shards[i], token, fuzzy));
+        const ids = [...sets[0]]
+            .filter(id => sets.every(set => set.has(id)) && !found.includes(id))
+            .sort((a, b) => a - b);
+        found.push(...ids.slice(0, SEARCH_LIMIT - found.length));
+    }
+
+    const chunkSize = searchIndex.record_chunk_size;
+    return Promise.all(found.map(async id => {
+        const chunk = await fetchCached(searchRecords, SEARCH_URL, `records/${Math.floor(id / chunkSize)}`);
+        const record = {};
+        Object.keys(chunk).forEach(field => { record[field] = chunk[field][id % chunkSize]; });
+        return record;
+    }));
+}
+
+/**
+ * Show the search results of the current input
+ */
+async function updateSearchResults() {
+    const query = document.getElementById('airportSearch').value;
+    const list = document.getElementById('searchResults');
+    const request = ++searchRequest;
+
+    try {
+        const results = await searchAirports(query);
+        if (request !== searchRequest) return;
+
+        list.innerHTML = '';
+        results.forEach(airport => {
+            const item = document.createElement('li');
+            const codes = [airport.ident, airport.iata_code].filter(Boolean).join(' / ');
+            const place = [airport.municipality, airport.country].filter(Boolean).join(', ');
+            const strong = document.createElement('strong');
+            strong.textContent = codes;
+            const detail = document.createElement('span');
+            detail.className = 'search-detail';
+            detail.textContent = place;
+            item.append(strong, ` ${airport.name || ''} `, detail);
+            item.addEventListener('click', () => showSearchResult(airport));
+            list.appendChild(item);
+        });
+        list.style.display = results.length ? 'block' : 'none';
+    } catch (error) {
+        console.error('Error searching airports:', error);
+        showError('Search failed. Please try again.');
+    }
+}
+
+/**
+ * Center the map on a search result and open its popup
+ * @param {Object} airport - Search record
+ */
+function showSearchResult(airport) {
+    document.getElementById('searchResults').style.display = 'none';
+    if (airport.lat === null || airport.lon === null) return;
+
+    const marker = createLazyMarker(
+        [airport.lat, airport.lon], { name: airport.name, type: airport.type },
+        airport.country.toLowerCase(), airport.index, searchIndex.details_chunk_size
+    );
+    searchMarker.clearLayers();
+    searchMarker.addLayer(marker);
+    map.setView([airport.lat, airport.lon], 12);
+    marker.openPopup();
+}
+
+/**
+ * Load the search index description and enable the search box
+ */
+async function loadSearch() {
+    const input = document.getElementById('airportSearch');
+    try {
+        searchIndex = await fetchJson(`${SEARCH_URL}/index.json`);
+    } catch (error) {
+        console.error('Error loading the search index:', error);
+    }
+    if (!searchIndex) {
+        input.disabled = true;
+        return;
+    }
+
+    let timer = null;
+    input.addEventListener('input', () => {
+        clearTimeout(timer);
+        timer = setTimeout(updateSearchResults, 150);
+    });
+}
+
 /**
  * Create popup content for an airport marker
  * @param {Object} airport - Airport data object
@@ -115,7 +536,10 @@ function createPopupContent(airport) {
         ['Local Code', airport.local_code],
         ['Elevation', airport.elevation_ft ? `${airport.elevation_ft} ft` : 'N/A'],
         ['Municipality', airport.municipality],
-        ['Region', airport.iso_region]
+        ['Region', airport.iso_region],
+        ['Nearest METAR', airport.nearest_metar && !airport.metar_available
+            ? `${airport.nearest_metar.ident} (${airport.nearest_metar.distance_km} km)`
+            : null]
     ];
 
     const detailsHtml = details
@@ -187,12 +611,16 @@ function showError(message) {
 document.addEventListener('DOMContentLoaded', () => {
     initializeMap();
     loadCountries();
+    loadWorldView();
+    loadSearch();
 
     // Add event listener for country selection
     document.getElementById('countrySelect').addEventListener('change', (e) => {
         if (e.target.value) {
             currentCountry = e.target.value;
             loadAirports(currentCountry);
+        } else {
+            showWorldView();
         }
     });
 });
\ No newline at end of file
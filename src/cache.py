@@ -0,0 +1,184 @@
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Set
+
+
+# Default time-to-live of cached enrichment results, per source
+DEFAULT_TTLS = {
+    "airportdb": 30 * 24 * 3600,
+    "metar": 7 * 24 * 3600,
+}
+DEFAULT_MAX_ENTRIES = 200_000
+# Entries expire up to this fraction earlier than their TTL, spread
+# deterministically by ident, so that refreshes are staggered across runs
+DEFAULT_JITTER = 0.25
+
+
+class EnrichmentCache:
+    """Persistent SQLite cache of enrichment results keyed by source and ident.
+
+    Each source has its own TTL. Expired entries are reported as misses so
+    the caller refetches them, and the least recently used entries are
+    evicted once the cache grows beyond max_entries.
+    """
+
+    def __init__(self, path: Path, ttls: Optional[Dict[str, float]] = None,
+                 max_entries: int = DEFAULT_MAX_ENTRIES, jitter: float = DEFAULT_JITTER,
+                 clock: Callable[[], float] = time.time):
+        self.path = Path(path)
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self.max_entries = max_entries
+        self.jitter = jitter
+        self.clock = clock
+        self.stats: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(exist_ok=True, parents=True)
+        # Shard processes share the cache: wait for each other's writes
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " source TEXT NOT NULL,"
+            " ident TEXT NOT NULL,"
+            " value TEXT NOT NULL,"
+            " fetched_at REAL NOT NULL,"
+            " accessed_at REAL NOT NULL,"
+            " PRIMARY KEY (source, ident))"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed_at)"
+        )
+        self._conn.commit()
+
+    def _count(self, source: str, key: str) -> None:
+        counters = self.stats.setdefault(
+            source, {"hits": 0, "misses": 0, "expired": 0, "stored": 0}
+        )
+        counters[key] = counters.get(key, 0) + 1
+
+    def _ttl(self, source: str, ident: str) -> float:
+        ttl = self.ttls.get(source, DEFAULT_TTLS["airportdb"])
+        spread = zlib.crc32(f"{source}:{ident}".encode()) / 0xFFFFFFFF
+        return ttl * (1 - self.jitter * spread)
+
+    def _row(self, source: str, ident: str):
+        return self._conn.execute(
+            "SELECT value, fetched_at FROM entries WHERE source = ? AND ident = ?",
+            (source, ident),
+        ).fetchone()
+
+    def get(self, source: str, ident: str) -> Optional[Any]:
+        """Return the cached value, or None when missing or expired"""
+        with self._lock:
+            row = self._row(source, ident)
+            if row is None:
+                self._count(source, "misses")
+                return None
+            value, fetched_at = row
+            now = self.clock()
+            if now - fetched_at > self._ttl(source, ident):
+                self._count(source, "expired")
+                return None
+            self._conn.execute(
+                "UPDATE entries SET accessed_at = ? WHERE source = ? AND ident = ?",
+                (now, source, ident),
+            )
+            self._conn.commit()
+            self._count(source, "hits")
+            return json.loads(value)
+
+    def is_expired(self, source: str, ident: str) -> bool:
+        """Whether an entry exists for ident and is past its TTL"""
+        with self._lock:
+            row = self._row(source, ident)
+        if row is None:
+            return False
+        return self.clock() - row[1] > self._ttl(source, ident)
+
+    def has(self, source: str, ident: str) -> bool:
+        """Whether a fresh entry exists for ident, without counting a lookup"""
+        with self._lock:
+            row = self._row(source, ident)
+        return row is not None and self.clock() - row[1] <= self._ttl(source, ident)
+
+    def expired(self, source: str) -> Set[str]:
+        """Idents of source whose entry is past its TTL"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT ident, fetched_at FROM entries WHERE source = ?", (source,)
+            ).fetchall()
+        now = self.clock()
+        return {ident for ident, fetched_at in rows if now - fetched_at > self._ttl(source, ident)}
+
+    def fetched_at(self, source: str, ident: str) -> Optional[float]:
+        """Timestamp of the last time ident was stored for source"""
+        with self._lock:
+            row = self._row(source, ident)
+        return row[1] if row else None
+
+    def set(self, source: str, ident: str, value: Any) -> None:
+        """Store a freshly fetched value"""
+        now = self.clock()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (source, ident, value, fetched_at, accessed_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (source, ident, json.dumps(value, ensure_ascii=False), now, now),
+            )
+            self._conn.commit()
+            self._count(source, "stored")
+
+    def seed(self, source: str, ident: str, value: Any) -> None:
+        """Store value as freshly fetched unless an entry already exists"""
+        now = self.clock()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO entries (source, ident, value, fetched_at, accessed_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (source, ident, json.dumps(value, ensure_ascii=False), now, now),
+            )
+            self._conn.commit()
+            if cursor.rowcount:
+                self._count(source, "stored")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def evict(self) -> int:
+        """Drop the least recently used entries beyond max_entries"""
+        with self._lock:
+            count = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            excess = count - self.max_entries
+            if excess <= 0:
+                return 0
+            self._conn.execute(
+                "DELETE FROM entries WHERE rowid IN ("
+                " SELECT rowid FROM entries ORDER BY accessed_at LIMIT ?)",
+                (excess,),
+            )
+            self._conn.commit()
+            return excess
+
+    def report(self) -> str:
+        """Human readable summary of the hit/miss/expiry counters"""
+        if not self.stats:
+            return "Cache: no lookups"
+        return "\n".join(
+            f"Cache {source}: {c['hits']} hits, {c['misses']} misses, "
+            f"{c['expired']} expired, {c['stored']} stored"
+            for source, c in sorted(self.stats.items())
+        )
+
+    def close(self) -> None:
+        """Apply the size cap and close the database"""
+        evicted = self.evict()
+        if evicted:
+            print(f"Cache: evicted {evicted} least recently used entries")
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,171 @@
+import json
+import shutil
+import threading
+import time
+from collections.abc import MutableMapping
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List
+
+from .export import dumps_compact, write_atomic
+from .models import Airport, to_airports
+
+
+DEFAULT_CHECKPOINT_DIR = Path(__file__).parent.parent / '.cache' / 'checkpoint'
+# Enrichment results buffered before they are appended to the journal, and
+# maximum seconds between two appends
+JOURNAL_FLUSH_EVERY = 100
+JOURNAL_FLUSH_INTERVAL = 10.0
+
+
+class CountryStore(MutableMapping):
+    """Airports per country kept on disk, one JSON file per country.
+
+    Only the country codes are held in memory: a country is written when
+    it is stored and read back when it is accessed, so the stages iterating
+    over the countries hold one country at a time.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self._countries: Dict[str, None] = {}
+
+    def _path(self, country: str) -> Path:
+        return self.directory / f'{country.lower()}.json'
+
+    def __getitem__(self, country: str) -> List[Airport]:
+        if country not in self._countries:
+            raise KeyError(country)
+        with open(self._path(country), 'r', encoding='utf-8') as f:
+            return to_airports(json.load(f))
+
+    def __setitem__(self, country: str, airports: List[Airport]) -> None:
+        self.directory.mkdir(exist_ok=True, parents=True)
+        write_atomic(self._path(country), dumps_compact(airports))
+        self._countries[country] = None
+
+    def __delitem__(self, country: str) -> None:
+        del self._countries[country]
+        self._path(country).unlink(missing_ok=True)
+
+    def __contains__(self, country: object) -> bool:
+        return country in self._countries
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._countries))
+
+    def __len__(self) -> int:
+        return len(self._countries)
+
+    def restore(self, country: str) -> bool:
+        """Register a country already written by an earlier run, if its file exists"""
+        if not self._path(country).exists():
+            return False
+        self._countries[country] = None
+        return True
+
+
+class Checkpoint:
+    """Journal of the work completed by a run, to resume it after an interruption.
+
+    The directory holds journal.jsonl, to which the fingerprint of the run
+    input, the enrichment results and the processed countries are
+    appended, and a CountryStore of the processed countries. Enrichment
+    results are buffered and appended every flush_every results or
+    flush_interval seconds; processed countries are appended immediately.
+    """
+
+    def __init__(self, directory: Path = DEFAULT_CHECKPOINT_DIR,
+                 flush_every: int = JOURNAL_FLUSH_EVERY,
+                 flush_interval: float = JOURNAL_FLUSH_INTERVAL,
+                 clock: Callable[[], float] = time.monotonic):
+        self.directory = directory
+        self.journal_path = directory / 'journal.jsonl'
+        self.flush_every = max(1, flush_every)
+        self.flush_interval = flush_interval
+        self.clock = clock
+        self.countries = CountryStore(directory / 'countries')
+        # Enrichment results and processed countries of the resumed run
+        self.results: Dict[str, Dict[str, Any]] = {}
+        self.processed: Dict[str, Dict[str, int]] = {}
+        self._buffer: List[str] = []
+        self._flushed_at = clock()
+        self._lock = threading.Lock()
+
+    def start(self, fingerprint: str, resume: bool = False) -> bool:
+        """Open the journal for a run over the input identified by fingerprint.
+
+        With resume, the results and countries journaled by an interrupted
+        run over the same input are loaded. Otherwise, or when the input
+        changed, the journal starts empty. Returns whether a run was resumed.
+        """
+        if resume and self._load(fingerprint):
+            return True
+        self.clear()
+        self.directory.mkdir(exist_ok=True, parents=True)
+        self._append([{'event': 'start', 'fingerprint': fingerprint}])
+        return False
+
+    def _load(self, fingerprint: str) -> bool:
+        try:
+            with open(self.journal_path, 'r', encoding='utf-8') as f:
+                lines = f.read().splitlines()
+        except OSError:
+            return False
+        events = []
+        for line in lines:
+            try:
+                events.append(json.loads(line))
+            except ValueError:
+                # A line cut short when the run was killed
+                continue
+        if not events or events[0].get('event') != 'start' \
+                or events[0].get('fingerprint') != fingerprint:
+            return False
+        for event in events[1:]:
+            if event.get('event') == 'result':
+                self.results.setdefault(event['source'], {})[event['ident']] = event['value']
+            elif event.get('event') == 'country' and self.countries.restore(event['country']):
+                self.processed[event['country']] = event['stats']
+        return True
+
+    def _append(self, events: List[Dict]) -> None:
+        with open(self.journal_path, 'a', encoding='utf-8') as f:
+            f.writelines(json.dumps(event, ensure_ascii=False) + '\n' for event in events)
+
+    def _flush(self) -> None:
+        if self._buffer:
+            with open(self.journal_path, 'a', encoding='utf-8') as f:
+                f.writelines(self._buffer)
+            self._buffer = []
+        self._flushed_at = self.clock()
+
+    def record(self, source: str, results: Dict[str, Any]) -> None:
+        """Journal enrichment results of source keyed by ident"""
+        with self._lock:
+            self._buffer.extend(
+                json.dumps({'event': 'result', 'source': source, 'ident': ident, 'value': value},
+                           ensure_ascii=False) + '\n'
+                for ident, value in results.items()
+            )
+            if len(self._buffer) >= self.flush_every \
+                    or self.clock() - self._flushed_at >= self.flush_interval:
+                self._flush()
+
+    def country_done(self, country: str, stats: Dict[str, int]) -> None:
+        """Journal a country whose airports were stored in countries"""
+        with self._lock:
+            self._flush()
+            self._append([{'event': 'country', 'country': country, 'stats': stats}])
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush()
+
+    def clear(self) -> None:
+        """Delete the journal and the stored countries"""
+        with self._lock:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            self.countries = CountryStore(self.directory / 'countries')
+            self.results = {}
+            self.processed = {}
+            self._buffer = []
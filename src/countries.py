@@ -0,0 +1,126 @@
+import json
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+
+from .export import new_write_stats, write_if_changed
+
+
+COUNTRY_NAMES_URL = "https://country.io/names.json"
+COUNTRY_CONTINENTS_URL = "https://country.io/continent.json"
+# Table shipped with the code, and the refreshed copy kept between runs
+BUNDLED_METADATA_PATH = Path(__file__).parent / 'country_metadata.json'
+DEFAULT_METADATA_PATH = Path(__file__).parent.parent / '.cache' / 'country_metadata.json'
+
+
+def dumps_metadata(version: int, countries: Dict[str, Dict[str, str]]) -> bytes:
+    """JSON of a metadata table, one country per line so that changes diff cleanly"""
+    lines = [
+        f'    {json.dumps(code)}: {json.dumps(entry, ensure_ascii=False, sort_keys=True)}'
+        for code, entry in sorted(countries.items())
+    ]
+    body = ',\n'.join(lines)
+    return f'{{\n  "version": {version},\n  "countries": {{\n{body}\n  }}\n}}\n'.encode('utf-8')
+
+
+def _read_table(path: Path) -> Optional[Dict]:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            table = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(table.get('version'), int) or not isinstance(table.get('countries'), dict):
+        return None
+    return table
+
+
+class CountryMetadata:
+    """Names and continents of ISO country codes, without any network access.
+
+    The table is read on first use from the most recent of the bundled
+    table and the refreshed copy at path. refresh() updates that copy from
+    country.io when the published names or continents changed; the table
+    already loaded by a run is left as it is, so that a run is consistent.
+    """
+
+    def __init__(self, path: Path = DEFAULT_METADATA_PATH,
+                 bundled_path: Path = BUNDLED_METADATA_PATH):
+        self.path = path
+        self.bundled_path = bundled_path
+        self._table: Optional[Dict] = None
+        self._lock = threading.Lock()
+
+    @property
+    def table(self) -> Dict:
+        with self._lock:
+            if self._table is None:
+                tables = [
+                    table for table in (_read_table(self.bundled_path), _read_table(self.path))
+                    if table is not None
+                ]
+                latest: Dict = max(tables, key=lambda table: table['version'],
+                                   default={'version': 0, 'countries': {}})
+                self._table = latest
+            return self._table
+
+    @property
+    def version(self) -> int:
+        return self.table['version']
+
+    def names(self) -> Dict[str, str]:
+        """Country names keyed by code"""
+        return {code: entry['name'] for code, entry in self.table['countries'].items()
+                if entry.get('name')}
+
+    def name(self, code: str) -> str:
+        """Name of a country, its code when unknown"""
+        return self.table['countries'].get(code, {}).get('name') or code
+
+    def continent(self, code: str) -> Optional[str]:
+        return self.table['countries'].get(code, {}).get('continent')
+
+    def refresh(self, http, names_url: str = COUNTRY_NAMES_URL,
+                continents_url: str = COUNTRY_CONTINENTS_URL) -> bool:
+        """Update the copy at path from country.io, returning whether it changed.
+
+        Countries missing from a response keep their current entry. Raises
+        on network or format errors, leaving the table untouched.
+        """
+        fetched = {}
+        for key, url in (('name', names_url), ('continent', continents_url)):
+            response = http.get(url)
+            response.raise_for_status()
+            values = response.json()
+            if not isinstance(values, dict):
+                raise ValueError(f"unexpected response from {url}")
+            fetched[key] = values
+
+        current = self.table
+        countries = {code: dict(entry) for code, entry in current['countries'].items()}
+        for key, values in fetched.items():
+            for code, value in values.items():
+                if isinstance(value, str) and value:
+                    countries.setdefault(code, {})[key] = value
+        if countries == current['countries']:
+            return False
+        self.path.parent.mkdir(exist_ok=True, parents=True)
+        write_if_changed(self.path, dumps_metadata(current['version'] + 1, countries),
+                         new_write_stats())
+        return True
+
+    def refresh_in_background(self, http, names_url: str = COUNTRY_NAMES_URL,
+                              continents_url: str = COUNTRY_CONTINENTS_URL) -> threading.Thread:
+        """Run refresh() in a daemon thread, reporting its outcome"""
+        # Load the current table first: the run keeps using it
+        self.table
+
+        def run():
+            try:
+                if self.refresh(http, names_url, continents_url):
+                    print(f"Country metadata updated, used from the next run ({self.path})")
+            except Exception as e:
+                print(f"Warning: Could not refresh the country metadata: {str(e)}")
+
+        thread = threading.Thread(target=run, name='country-metadata-refresh', daemon=True)
+        thread.start()
+        return thread
@@ -0,0 +1,303 @@
+import gzip
+import json
+import os
+import re
+import tempfile
+from collections.abc import Mapping
+from pathlib import Path
+from typing import AbstractSet, Any, Dict, List, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip copies are always written
+    brotli = None
+
+
+# Airports per lazily fetched details file
+DETAILS_CHUNK_SIZE = 100
+MARKER_FIELDS = ['ident', 'lat', 'lon', 'type']
+
+# Fields stored as strings in airports.json that are numbers or flags
+NUMERIC_FIELDS = {
+    'airport': {'elevation_ft', 'latitude_deg', 'longitude_deg'},
+    'runways': {
+        'length_ft', 'width_ft', 'le_latitude_deg', 'le_longitude_deg',
+        'le_elevation_ft', 'le_heading_degT', 'le_displaced_threshold_ft',
+        'he_latitude_deg', 'he_longitude_deg', 'he_elevation_ft',
+        'he_heading_degT', 'he_displaced_threshold_ft',
+    },
+    'freqs': {'frequency_mhz'},
+    'navaids': {
+        'frequency_khz', 'latitude_deg', 'longitude_deg', 'elevation_ft',
+        'dme_frequency_khz', 'dme_latitude_deg', 'dme_longitude_deg',
+        'dme_elevation_ft', 'slaved_variation_deg', 'magnetic_variation_deg',
+    },
+}
+FLAG_FIELDS = {'runways': {'lighted', 'closed'}}
+# Redundant with the airport a nested record belongs to
+PARENT_FIELDS = {'airport_ref', 'airport_ident'}
+# Mode of newly written files, existing files keep theirs
+DEFAULT_FILE_MODE = 0o644
+# Header timestamp of airports.json, ignored when comparing contents
+LAST_UPDATED = re.compile(rb'"last_updated": "([^"]*)"')
+
+
+def new_write_stats() -> Dict[str, int]:
+    return {'written': 0, 'skipped': 0, 'bytes_written': 0, 'bytes_skipped': 0}
+
+
+def merge_write_stats(total: Dict[str, int], stats: Dict[str, int]) -> None:
+    for key, value in stats.items():
+        total[key] += value
+
+
+def write_atomic(path: Path, payload: bytes) -> None:
+    """Write payload to a temporary file and rename it over path"""
+    try:
+        mode = os.stat(path).st_mode & 0o777
+    except OSError:
+        mode = DEFAULT_FILE_MODE
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f'.{path.name}.', suffix='.tmp')
+    try:
+        # mkstemp creates files readable by the owner only
+        os.fchmod(fd, mode)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def _read_bytes(path: Path) -> Optional[bytes]:
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def write_if_changed(path: Path, payload: bytes, stats: Dict[str, int],
+                     current: Optional[bytes] = None) -> bool:
+    """Atomically write payload unless path already holds it.
+
+    current is the content of path when the caller already read it.
+    Returns whether the file was written.
+    """
+    if current is None:
+        current = _read_bytes(path)
+    if current == payload:
+        stats['skipped'] += 1
+        stats['bytes_skipped'] += len(payload)
+        return False
+    write_atomic(path, payload)
+    stats['written'] += 1
+    stats['bytes_written'] += len(payload)
+    return True
+
+
+def remove_stale(directory: Path, written: AbstractSet[Path], pattern: str = '*.json') -> int:
+    """Delete the files of directory matching pattern that were not written by this run.
+
+    Subdirectories left empty are removed too. Returns the number of files deleted.
+    """
+    if not directory.is_dir():
+        return 0
+    removed = 0
+    for path in directory.glob(pattern):
+        if path.is_file() and path not in written:
+            os.remove(path)
+            removed += 1
+    for child in directory.iterdir():
+        if child.is_dir() and not any(child.iterdir()):
+            child.rmdir()
+    return removed
+
+
+def to_number(value: Any) -> Any:
+    """Convert a numeric string to an int or float, '' to None"""
+    if not isinstance(value, str):
+        return value
+    value = value.strip()
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        pass
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
+def to_flag(value: Any) -> Any:
+    """Convert '1'/'0' flags to booleans"""
+    if isinstance(value, str):
+        if value.strip() in ('1', 'true', 'True'):
+            return True
+        if value.strip() in ('0', 'false', 'False'):
+            return False
+        return None if not value.strip() else value
+    return value
+
+
+def _compact_record(record: Dict, kind: str) -> Dict:
+    numeric = NUMERIC_FIELDS.get(kind, set())
+    flags = FLAG_FIELDS.get(kind, set())
+    compact = {}
+    for key, value in record.items():
+        if kind != 'airport' and key in PARENT_FIELDS:
+            continue
+        if key in numeric:
+            value = to_number(value)
+        elif key in flags:
+            value = to_flag(value)
+        if value is None or value == '':
+            continue
+        compact[key] = value
+    return compact
+
+
+def compact_airport(airport: Dict) -> Dict:
+    """Airport record with typed numeric fields and no empty values"""
+    if hasattr(airport, 'compact'):
+        # Typed records parsed their fields when they were built
+        return airport.compact()
+    compact = _compact_record(airport, 'airport')
+    for kind in ('runways', 'freqs', 'navaids'):
+        if isinstance(airport.get(kind), list):
+            compact[kind] = [_compact_record(item, kind) for item in airport[kind]]
+    return compact
+
+
+def airport_position(airport: Mapping[str, Any]) -> Tuple[Optional[float], Optional[float]]:
+    """Latitude and longitude of an airport, from its fields or coordinates"""
+    if hasattr(airport, 'position'):
+        return airport.position
+    lat = to_number(airport.get('latitude_deg'))
+    lon = to_number(airport.get('longitude_deg'))
+    if isinstance(lat, (int, float)) and isinstance(lon, (int, float)):
+        return float(lat), float(lon)
+    return coordinates_position(airport.get('coordinates'))
+
+
+def coordinates_position(coordinates: Any) -> Tuple[Optional[float], Optional[float]]:
+    """Latitude and longitude of a 'lat, lon' coordinates string"""
+    if isinstance(coordinates, str) and ',' in coordinates:
+        lat, lon = coordinates.split(',', 1)
+        try:
+            # float() accepts what to_number parses, surrounding spaces included
+            return float(lat), float(lon)
+        except ValueError:
+            pass
+    return None, None
+
+
+def marker_columns(airports: List[Dict]) -> Dict[str, List]:
+    """Columnar marker arrays; airport i's details are in chunk i // chunk size"""
+    columns: Dict[str, List] = {field: [] for field in MARKER_FIELDS}
+    for airport in airports:
+        lat, lon = airport_position(airport)
+        columns['ident'].append(airport.get('ident'))
+        columns['lat'].append(round(lat, 6) if lat is not None else None)
+        columns['lon'].append(round(lon, 6) if lon is not None else None)
+        columns['type'].append(airport.get('type'))
+    return columns
+
+
+def _to_json(value: Any) -> Any:
+    """Serialize mappings other than dicts, such as the typed airport records"""
+    if isinstance(value, Mapping):
+        return dict(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps_compact(data: Any) -> bytes:
+    """Minified JSON"""
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'), default=_to_json).encode('utf-8')
+
+
+def dumps_pretty(data: Any) -> bytes:
+    """JSON as written to airports.json and countries.json"""
+    return json.dumps(data, ensure_ascii=False, indent=2, default=_to_json).encode('utf-8')
+
+
+def write_compressed(path: Path, payload: bytes, stats: Dict[str, int]) -> None:
+    """Write payload with pre-compressed .gz (and .br) copies.
+
+    The gzip header carries no timestamp so unchanged content gives
+    identical files, which are not rewritten. Without brotli, a .br copy
+    left by an earlier run is deleted rather than served stale.
+    """
+    variants = [(path, payload), (path.with_name(path.name + '.gz'), gzip.compress(payload, mtime=0))]
+    br_path = path.with_name(path.name + '.br')
+    if brotli is not None:
+        variants.append((br_path, brotli.compress(payload)))
+    elif br_path.exists():
+        os.remove(br_path)
+    for target, content in variants:
+        write_if_changed(target, content, stats)
+
+
+def write_compact_country(country_dir: Path, header: Dict, airports: List[Dict],
+                          chunk_size: int = DETAILS_CHUNK_SIZE,
+                          stats: Optional[Dict[str, int]] = None) -> Dict[str, int]:
+    """Write markers.json and the details chunks of a country.
+
+    markers.json holds the country header and columnar marker arrays;
+    details/<n>.json holds the typed records of airports n * chunk_size to
+    (n + 1) * chunk_size - 1. Returns the write statistics.
+    """
+    stats = stats if stats is not None else new_write_stats()
+    markers = dict(header)
+    markers['details_chunk_size'] = chunk_size
+    markers['markers'] = marker_columns(airports)
+    write_compressed(country_dir / 'markers.json', dumps_compact(markers), stats)
+
+    details_dir = country_dir / 'details'
+    details_dir.mkdir(exist_ok=True, parents=True)
+    chunk_names = set()
+    for index, start in enumerate(range(0, len(airports), chunk_size)):
+        chunk = [compact_airport(a) for a in airports[start:start + chunk_size]]
+        name = f'{index}.json'
+        chunk_names.add(name)
+        write_compressed(details_dir / name, dumps_compact(chunk), stats)
+
+    # Drop the chunks of a previous, larger, version of the country
+    for stale in details_dir.iterdir():
+        base = stale.name
+        for suffix in ('.gz', '.br'):
+            if base.endswith(suffix):
+                base = base[:-len(suffix)]
+        if base not in chunk_names:
+            os.remove(stale)
+    return stats
+
+
+def save_country(country_dir: Path, header: Dict, airports: List[Dict],
+                 compact: bool = True) -> Dict[str, int]:
+    """Write the files of a country, leaving unchanged files untouched.
+
+    airports.json is compared with the previous file with the previous
+    last_updated put back; when nothing else differs, the previous
+    timestamp is kept and no file is rewritten. Runs in worker processes.
+    """
+    stats = new_write_stats()
+    country_dir.mkdir(exist_ok=True, parents=True)
+    path = country_dir / 'airports.json'
+    payload = dumps_pretty({**header, 'airports': airports})
+
+    current = _read_bytes(path)
+    previous = LAST_UPDATED.search(current) if current is not None else None
+    if previous is not None:
+        updated = b'"last_updated": ' + json.dumps(header['last_updated']).encode('utf-8')
+        kept = previous.group(0)
+        if payload.replace(updated, kept, 1) == current:
+            header = {**header, 'last_updated': previous.group(1).decode('utf-8')}
+            payload = current
+    write_if_changed(path, payload, stats, current=current)
+
+    if compact:
+        write_compact_country(country_dir, header, airports, stats=stats)
+    return stats
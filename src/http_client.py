@@ -0,0 +1,207 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import TYPE_CHECKING, Callable, Dict, Optional
+from urllib.parse import urlparse
+
+if TYPE_CHECKING:
+    import requests
+
+
+# Responses worth retrying: rate limiting and transient server errors
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+DEFAULT_MAX_RETRIES = 3
+# Base and cap, in seconds, of the exponential backoff between retries
+DEFAULT_BACKOFF = 0.5
+DEFAULT_MAX_BACKOFF = 30.0
+# Retry-After values longer than this give up instead of waiting
+DEFAULT_MAX_RETRY_AFTER = 60.0
+DEFAULT_TIMEOUT = 10
+
+
+class TokenBucket:
+    """Thread-safe token bucket allowing rate requests per second.
+
+    Up to capacity requests can be sent in a burst. Callers reserve a token
+    and sleep until it becomes available.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.clock = clock
+        self.sleep = sleep
+        self._tokens = self.capacity
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Take one token, waiting if needed. Returns the time waited."""
+        with self._lock:
+            now = self.clock()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait > 0:
+            self.sleep(wait)
+        return wait
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delay or HTTP date)"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+class HttpClient:
+    """Shared HTTP layer: pooled sessions, rate limits and retries per host.
+
+    Each host gets its own keep-alive session, a concurrency limit of
+    max_per_host requests in flight and, when configured, a token bucket.
+    Connection errors, timeouts, 429 and 5xx responses are retried with
+    exponential backoff and full jitter, honouring Retry-After.
+
+    An optional recorder (see instrumentation.RunRecorder) is told the
+    latency, status and size of every attempt, and every retry.
+    """
+
+    def __init__(self, max_per_host: int = 4,
+                 rate_limits: Optional[Dict[str, TokenBucket]] = None,
+                 max_retries: int = DEFAULT_MAX_RETRIES,
+                 backoff: Optional[float] = None,
+                 max_backoff: float = DEFAULT_MAX_BACKOFF,
+                 max_retry_after: float = DEFAULT_MAX_RETRY_AFTER,
+                 timeout: float = DEFAULT_TIMEOUT,
+                 sleep: Callable[[float], None] = time.sleep,
+                 recorder=None):
+        self.max_per_host = max(1, max_per_host)
+        self.rate_limits = dict(rate_limits or {})
+        self.max_retries = max_retries
+        self.backoff = DEFAULT_BACKOFF if backoff is None else backoff
+        self.max_backoff = max_backoff
+        self.max_retry_after = max_retry_after
+        self.timeout = timeout
+        self.sleep = sleep
+        self.recorder = recorder
+        self.retries: Dict[str, int] = {}
+        self._sessions: Dict[str, 'requests.Session'] = {}
+        self._slots: Dict[str, threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+
+    def _host(self, url: str) -> str:
+        return urlparse(url).netloc
+
+    def session(self, url: str) -> 'requests.Session':
+        """The pooled session of url's host"""
+        # requests is only imported by the first request
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        host = self._host(url)
+        with self._lock:
+            if host not in self._sessions:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_per_host)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                self._sessions[host] = session
+            return self._sessions[host]
+
+    def slot(self, url: str) -> threading.BoundedSemaphore:
+        """The semaphore limiting concurrent requests to url's host"""
+        host = self._host(url)
+        with self._lock:
+            if host not in self._slots:
+                self._slots[host] = threading.BoundedSemaphore(self.max_per_host)
+            return self._slots[host]
+
+    def _retry_delay(self, response: 'requests.Response', attempt: int) -> Optional[float]:
+        """Delay before retrying an error response, None to give up"""
+        retry_after = parse_retry_after(response.headers.get('Retry-After'))
+        if retry_after is not None:
+            return retry_after if retry_after <= self.max_retry_after else None
+        return self._backoff(attempt)
+
+    def _backoff(self, attempt: int) -> float:
+        """Jittered exponential delay before the next attempt"""
+        return random.uniform(0, min(self.max_backoff, self.backoff * (2 ** attempt)))
+
+    def _record(self, host: str, started: float, response: Optional['requests.Response'],
+                stream: bool) -> None:
+        if self.recorder is None:
+            return
+        seconds = time.perf_counter() - started
+        if response is None:
+            self.recorder.record_request(host, seconds, None)
+            return
+        if stream:
+            # The body is not read yet: count the announced size
+            try:
+                size = int(response.headers.get('Content-Length') or 0)
+            except ValueError:
+                size = 0
+        else:
+            size = len(response.content)
+        self.recorder.record_request(host, seconds, response.status_code, size)
+
+    def get(self, url: str, **kwargs) -> 'requests.Response':
+        """GET url with pooling, rate limiting and retries.
+
+        Returns the last response, which may still be an error once retries
+        are exhausted; connection errors and timeouts are re-raised.
+        """
+        import requests
+
+        kwargs.setdefault('timeout', self.timeout)
+        host = self._host(url)
+        session = self.session(url)
+        bucket = self.rate_limits.get(host)
+        attempt = 0
+        while True:
+            response = None
+            with self.slot(url):
+                if bucket is not None:
+                    bucket.acquire()
+                started = time.perf_counter()
+                try:
+                    response = session.get(url, **kwargs)
+                except (requests.ConnectionError, requests.Timeout):
+                    self._record(host, started, None, False)
+                    if attempt >= self.max_retries:
+                        raise
+                else:
+                    self._record(host, started, response, kwargs.get('stream', False))
+            if response is None:
+                # Connection error or timeout, with retries left
+                delay = self._backoff(attempt)
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt >= self.max_retries:
+                    return response
+                retry_delay = self._retry_delay(response, attempt)
+                if retry_delay is None:
+                    return response
+                response.close()
+                delay = retry_delay
+            with self._lock:
+                self.retries[host] = self.retries.get(host, 0) + 1
+            if self.recorder is not None:
+                self.recorder.record_retry(host)
+            self.sleep(delay)
+            attempt += 1
+
+    def close(self) -> None:
+        for session in self._sessions.values():
+            session.close()
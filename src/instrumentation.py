@@ -0,0 +1,161 @@
+import io
+import json
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from .export import write_atomic
+
+
+# Upper bounds, in milliseconds, of the request latency histogram buckets
+LATENCY_BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+# Functions listed in the printed profile summary
+PROFILE_TOP = 20
+
+
+def percentile(sorted_values: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile q (0-100) of sorted values, None when empty"""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * q // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def to_ms(seconds: Optional[float]) -> Optional[float]:
+    """Seconds in milliseconds rounded to 0.1, None staying None"""
+    return None if seconds is None else round(seconds * 1000, 1)
+
+
+class HostMetrics:
+    """Latencies and outcomes of the requests sent to one host"""
+
+    def __init__(self) -> None:
+        self.latencies: List[float] = []
+        self.statuses: Dict[str, int] = {}
+        self.retries = 0
+        self.bytes_downloaded = 0
+
+    def summary(self) -> Dict[str, Any]:
+        latencies = sorted(self.latencies)
+        histogram = {f'<={bound}ms': 0 for bound in LATENCY_BUCKETS_MS}
+        histogram[f'>{LATENCY_BUCKETS_MS[-1]}ms'] = 0
+        for seconds in latencies:
+            ms = seconds * 1000
+            bucket = next(
+                (f'<={bound}ms' for bound in LATENCY_BUCKETS_MS if ms <= bound),
+                f'>{LATENCY_BUCKETS_MS[-1]}ms',
+            )
+            histogram[bucket] += 1
+
+        return {
+            'requests': len(latencies),
+            'statuses': dict(sorted(self.statuses.items())),
+            'retries': self.retries,
+            'bytes_downloaded': self.bytes_downloaded,
+            'latency_ms': {
+                'p50': to_ms(percentile(latencies, 50)),
+                'p95': to_ms(percentile(latencies, 95)),
+                'p99': to_ms(percentile(latencies, 99)),
+                'max': to_ms(latencies[-1] if latencies else None),
+                'histogram': histogram,
+            },
+        }
+
+
+class RunRecorder:
+    """Stage timings and per-host request metrics of an update run.
+
+    Requests are recorded by HttpClient, possibly from several threads;
+    stages are timed with the stage() context manager. report() returns
+    everything as a JSON-serializable dict.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.perf_counter):
+        self.clock = clock
+        self.started_at = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+        self.stages: Dict[str, Dict[str, Any]] = {}
+        self.hosts: Dict[str, HostMetrics] = {}
+        self._started = clock()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Time the block as stage name, marking it failed if it raises"""
+        started = self.clock()
+        status = 'ok'
+        try:
+            yield
+        except BaseException:
+            status = 'failed'
+            raise
+        finally:
+            self.stages[name] = {'seconds': round(self.clock() - started, 4), 'status': status}
+
+    def _host(self, host: str) -> HostMetrics:
+        if host not in self.hosts:
+            self.hosts[host] = HostMetrics()
+        return self.hosts[host]
+
+    def record_request(self, host: str, seconds: float, status: Optional[int],
+                       size: int = 0) -> None:
+        """Record one request attempt; status is None for connection errors and timeouts"""
+        with self._lock:
+            metrics = self._host(host)
+            metrics.latencies.append(seconds)
+            key = 'error' if status is None else str(status)
+            metrics.statuses[key] = metrics.statuses.get(key, 0) + 1
+            metrics.bytes_downloaded += size
+
+    def record_retry(self, host: str) -> None:
+        with self._lock:
+            self._host(host).retries += 1
+
+    def report(self, **sections: Any) -> Dict[str, Any]:
+        """The run report, with extra sections such as cache or write statistics"""
+        with self._lock:
+            hosts = {host: metrics.summary() for host, metrics in sorted(self.hosts.items())}
+        return {
+            'started_at': self.started_at,
+            'duration_seconds': round(self.clock() - self._started, 3),
+            'stages': dict(self.stages),
+            'http': hosts,
+            **sections,
+        }
+
+    def write(self, path: Path, **sections: Any) -> Dict[str, Any]:
+        """Write the run report as JSON to path and return it"""
+        report = self.report(**sections)
+        path.parent.mkdir(exist_ok=True, parents=True)
+        write_atomic(path, json.dumps(report, indent=2).encode('utf-8'))
+        return report
+
+
+@contextmanager
+def profiled(path: Optional[Path], top: int = PROFILE_TOP) -> Iterator[None]:
+    """Run the block under cProfile when path is set.
+
+    The stats are dumped to path (readable with pstats or snakeviz) and the
+    top functions by cumulative time are printed. Only the calling thread
+    is profiled.
+    """
+    if path is None:
+        yield
+        return
+    # Only imported when profiling
+    import cProfile
+    import pstats
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        path.parent.mkdir(exist_ok=True, parents=True)
+        profiler.dump_stats(str(path))
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(top)
+        print(f"Profile written to {path}")
+        print(out.getvalue())
@@ -0,0 +1,105 @@
+import json
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Iterable, List, NamedTuple, Optional, Set
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+MANIFEST_VERSION = 1
+
+
+class ManifestDiff(NamedTuple):
+    """Idents added, changed and removed between two source manifests"""
+    added: List[str]
+    changed: List[str]
+    removed: List[str]
+    countries: Set[str]
+
+    def summary(self) -> str:
+        return (
+            f"{len(self.added)} added, {len(self.changed)} changed, "
+            f"{len(self.removed)} removed across {len(self.countries)} countries"
+        )
+
+
+def scope_fingerprint(scope: str, columns: Iterable[str]) -> str:
+    """Identify the filter and columns a manifest was computed with"""
+    return f"{scope}|{','.join(columns)}"
+
+
+def hash_rows(df: 'pd.DataFrame', columns: List[str]) -> Dict[str, List[str]]:
+    """Map each ident to [row hash, iso_country] over the given columns.
+
+    Values are hashed as strings so that the manifest does not depend on the
+    dtypes the CSV was parsed with.
+    """
+    import pandas as pd
+
+    if df.empty:
+        return {}
+    present = [col for col in columns if col in df.columns]
+    values = df[present].astype(object).where(df[present].notna(), None).astype(str)
+    hashes = pd.util.hash_pandas_object(values, index=False)
+    return {
+        str(ident): [f"{row_hash:016x}", str(country)]
+        for ident, row_hash, country in zip(df['ident'], hashes, df['iso_country'])
+        if pd.notna(ident)
+    }
+
+
+def diff_rows(previous: Dict[str, List[str]], current: Dict[str, List[str]]) -> ManifestDiff:
+    """Compare two ident -> [hash, country] mappings"""
+    added = [ident for ident in current if ident not in previous]
+    removed = [ident for ident in previous if ident not in current]
+    changed = [
+        ident for ident, (row_hash, _) in current.items()
+        if ident in previous and previous[ident][0] != row_hash
+    ]
+    countries = set()
+    for ident in added + changed:
+        countries.add(current[ident][1])
+    for ident in changed + removed:
+        countries.add(previous[ident][1])
+    return ManifestDiff(added, changed, removed, countries)
+
+
+def load_manifest(path: Path, scope: str) -> Optional[Dict[str, List[str]]]:
+    """Load the rows of a manifest, or None if missing or built for another scope"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get('version') != MANIFEST_VERSION or manifest.get('scope') != scope:
+        return None
+    return manifest.get('rows', {})
+
+
+def load_unresolved(path: Path, scope: str) -> Set[str]:
+    """Countries left with unknown enrichment values by the run that wrote the manifest"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return set()
+    if manifest.get('version') != MANIFEST_VERSION or manifest.get('scope') != scope:
+        return set()
+    return set(manifest.get('unresolved', []))
+
+
+def save_manifest(path: Path, rows: Dict[str, List[str]], scope: str,
+                  unresolved: Iterable[str] = ()) -> None:
+    """Write the manifest of the source rows processed by the last run.
+
+    unresolved lists the countries whose lookups failed, to be processed
+    again by the next incremental run.
+    """
+    path.parent.mkdir(exist_ok=True, parents=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'version': MANIFEST_VERSION,
+            'scope': scope,
+            'rows': rows,
+            'unresolved': sorted(unresolved),
+        }, f, separators=(',', ':'))
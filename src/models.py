@@ -0,0 +1,314 @@
+import sys
+from collections import deque
+from collections.abc import Mapping, MutableMapping
+from itertools import compress, repeat
+from typing import Any, Dict, FrozenSet, Iterator, List, Optional, Tuple, Type, TypeVar
+
+from .export import (
+    FLAG_FIELDS, NUMERIC_FIELDS, PARENT_FIELDS, coordinates_position, to_flag, to_number,
+)
+
+
+# Key orders of the records: most records share one of a few dozen orders
+_KEY_ORDERS: Dict[Tuple[str, ...], Tuple[str, ...]] = {}
+
+_NUMBER, _FLAG = 1, 2
+
+R = TypeVar('R', bound='Record')
+
+
+def _key_order(keys: Tuple[str, ...]) -> Tuple[str, ...]:
+    return _KEY_ORDERS.setdefault(keys, keys)
+
+
+def _format(value: Any, kind: int) -> Any:
+    """String a parsed number or flag is written back as"""
+    if value is None:
+        return ''
+    if kind == _FLAG:
+        if value is True:
+            return '1'
+        if value is False:
+            return '0'
+    elif isinstance(value, int) and not isinstance(value, bool):
+        return str(value)
+    elif isinstance(value, float):
+        return repr(value)
+    return value
+
+
+class Record(MutableMapping):
+    """Airport data record with its numbers and flags parsed once.
+
+    Known fields are stored in slots; as a mapping the record reads as the
+    JSON schema of airports.json, numeric and flag fields read from strings
+    being formatted back to their original text, so that dumping a record
+    gives the bytes of the dict it was built from. Attributes hold the
+    parsed values: ints and floats, booleans for flags, None when a field
+    is absent or empty. Fields are set through item assignment, which
+    parses them; unknown fields are kept as they are.
+    """
+
+    __slots__ = ('_keys', '_strings', '_text', '_extra')
+    FIELDS: Tuple[str, ...] = ()
+    KIND = ''
+    # Lists of nested records, by field
+    NESTED: Dict[str, type] = {}
+    # Fields with few distinct values, whose strings are shared between records
+    SHARED: FrozenSet[str] = frozenset()
+    _SLOTS: FrozenSet[str] = frozenset()
+    _PARSED: Dict[str, Tuple[int, int]] = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        numeric = NUMERIC_FIELDS.get(cls.KIND, set())
+        flags = FLAG_FIELDS.get(cls.KIND, set())
+        cls._SLOTS = frozenset(cls.FIELDS)
+        cls._PARSED = {
+            field: (1 << bit, _NUMBER if field in numeric else _FLAG)
+            for bit, field in enumerate(cls.FIELDS) if field in numeric or field in flags
+        }
+
+    def __init__(self, data: Any = ()):
+        if not isinstance(data, (dict, Mapping)):
+            data = dict(data)
+        self._keys = _key_order(tuple(data))
+        self._strings = 0
+        self._text: Optional[Dict[str, str]] = None
+        self._extra: Optional[Dict[str, Any]] = None
+        slots, parsed, nested, shared = self._SLOTS, self._PARSED, self.NESTED, self.SHARED
+        for key, value in data.items():
+            if key in parsed or key in nested:
+                self._store(key, value)
+            elif key in slots:
+                if key in shared and type(value) is str:
+                    value = sys.intern(value)
+                setattr(self, key, value)
+            else:
+                if self._extra is None:
+                    self._extra = {}
+                self._extra[key] = value
+        for field in self.FIELDS:
+            if field not in data:
+                setattr(self, field, None)
+
+    @classmethod
+    def from_columns(cls: Type[R], columns: Dict[str, List[Any]]) -> List[R]:
+        """Records of equal-length column lists, None values being left out.
+
+        The slots are filled a column at a time, so no dict is built per
+        row. Columns that need parsing or are not slots fall back to
+        building each record from a dict.
+        """
+        names = list(columns)
+        lists = list(columns.values())
+        rows = len(lists[0]) if lists else 0
+        for name, values in columns.items():
+            if name in cls.NESTED or name not in cls._SLOTS or (
+                    name in cls._PARSED and any(type(value) is str for value in values)):
+                return [
+                    cls({key: value for key, value in zip(names, row) if value is not None})
+                    for row in zip(*lists)
+                ]
+
+        present = zip(*[[value is not None for value in values] for values in lists])
+        orders: Dict[Tuple[bool, ...], Tuple[str, ...]] = {}
+        keys = []
+        for pattern in present:
+            order = orders.get(pattern)
+            if order is None:
+                order = orders[pattern] = _key_order(tuple(compress(names, pattern)))
+            keys.append(order)
+
+        records = [object.__new__(cls) for _ in range(rows)]
+        # Fields without a column are left unset and read as None
+        slot_values: Dict[str, Any] = {}
+        for name, values in columns.items():
+            if name in cls.SHARED:
+                values = [sys.intern(value) if type(value) is str else value for value in values]
+            slot_values[name] = values
+        slot_values.update(_keys=keys, _strings=repeat(0, rows),
+                           _text=repeat(None, rows), _extra=repeat(None, rows))
+        for field, values in slot_values.items():
+            deque(map(getattr(cls, field).__set__, records, values), maxlen=0)
+        return records
+
+    def __getattr__(self, name: str) -> Any:
+        # Only reached for unset slots: fields absent from the columns of from_columns
+        if name in type(self)._SLOTS:
+            return None
+        raise AttributeError(name)
+
+    def _store(self, key: str, value: Any) -> None:
+        if key not in self._SLOTS:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+            return
+        parsed = self._PARSED.get(key)
+        if parsed is not None:
+            mask, kind = parsed
+            if self._text is not None:
+                self._text.pop(key, None)
+            if isinstance(value, str):
+                text, value = value, (to_number if kind == _NUMBER else to_flag)(value)
+                self._strings |= mask
+                if _format(value, kind) != text:
+                    # Kept as read, e.g. '05' or ' 12'
+                    if self._text is None:
+                        self._text = {}
+                    self._text[key] = text
+            else:
+                self._strings &= ~mask
+        elif key in self.NESTED and isinstance(value, list):
+            model = self.NESTED[key]
+            value = [
+                model(item) if isinstance(item, Mapping) and not isinstance(item, model) else item
+                for item in value
+            ]
+        setattr(self, key, value)
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self._keys:
+            raise KeyError(key)
+        parsed = self._PARSED.get(key)
+        if parsed is not None:
+            if self._strings & parsed[0]:
+                if self._text is not None and key in self._text:
+                    return self._text[key]
+                return _format(getattr(self, key), parsed[1])
+        elif key not in self._SLOTS:
+            assert self._extra is not None
+            return self._extra[key]
+        return getattr(self, key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self[key] if key in self._keys else default
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        self._store(key, value)
+        if key not in self._keys:
+            self._keys = _key_order(self._keys + (key,))
+
+    def __delitem__(self, key: str) -> None:
+        if key not in self._keys:
+            raise KeyError(key)
+        if key in self._SLOTS:
+            self._store(key, None)
+        else:
+            assert self._extra is not None
+            del self._extra[key]
+        self._keys = _key_order(tuple(k for k in self._keys if k != key))
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._keys
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._keys)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+    def to_dict(self) -> Dict[str, Any]:
+        """The record as a dict of the airports.json schema"""
+        data = {}
+        for key in self._keys:
+            value = self[key]
+            if key in self.NESTED and isinstance(value, list):
+                value = [item.to_dict() if isinstance(item, Record) else item for item in value]
+            data[key] = value
+        return data
+
+    def compact(self) -> Dict[str, Any]:
+        """Record with typed fields and no empty values, as in the details chunks"""
+        compact = {}
+        for key in self._keys:
+            if self.KIND != 'airport' and key in PARENT_FIELDS:
+                continue
+            if key not in self._SLOTS:
+                assert self._extra is not None
+                value = self._extra[key]
+            else:
+                value = getattr(self, key)
+                if key in self.NESTED and isinstance(value, list):
+                    value = [item.compact() for item in value]
+            if value is None or value == '':
+                continue
+            compact[key] = value
+        return compact
+
+
+class Runway(Record):
+    __slots__ = FIELDS = (
+        'id', 'airport_ref', 'airport_ident', 'length_ft', 'width_ft', 'surface', 'lighted',
+        'closed', 'le_ident', 'le_latitude_deg', 'le_longitude_deg', 'le_elevation_ft',
+        'le_heading_degT', 'le_displaced_threshold_ft', 'he_ident', 'he_latitude_deg',
+        'he_longitude_deg', 'he_elevation_ft', 'he_heading_degT', 'he_displaced_threshold_ft',
+        'le_ils', 'he_ils',
+    )
+    KIND = 'runways'
+    SHARED = frozenset({'surface'})
+
+
+class Frequency(Record):
+    __slots__ = FIELDS = ('id', 'airport_ref', 'airport_ident', 'type', 'description', 'frequency_mhz')
+    KIND = 'freqs'
+    SHARED = frozenset({'type', 'description'})
+
+
+class Navaid(Record):
+    __slots__ = FIELDS = (
+        'id', 'filename', 'ident', 'name', 'type', 'frequency_khz', 'latitude_deg',
+        'longitude_deg', 'elevation_ft', 'iso_country', 'dme_frequency_khz', 'dme_channel',
+        'dme_latitude_deg', 'dme_longitude_deg', 'dme_elevation_ft', 'slaved_variation_deg',
+        'magnetic_variation_deg', 'usageType', 'power', 'associated_airport',
+    )
+    KIND = 'navaids'
+    SHARED = frozenset({'type', 'iso_country', 'usageType', 'power'})
+
+
+class Airport(Record):
+    FIELDS = (
+        'ident', 'type', 'name', 'continent', 'iso_country', 'iso_region', 'municipality',
+        'coordinates', 'metar_available', 'elevation_ft', 'gps_code', 'iata_code', 'local_code',
+        'icao_code', 'latitude_deg', 'longitude_deg', 'scheduled_service', 'home_link',
+        'wikipedia_link', 'keywords', 'country', 'region', 'station', 'runways', 'freqs',
+        'navaids', 'nearest_metar',
+    )
+    # The position is parsed on first use and reset when its fields change
+    __slots__ = FIELDS + ('_position',)
+    _position: Tuple[Optional[float], Optional[float]]
+    KIND = 'airport'
+    NESTED = {'runways': Runway, 'freqs': Frequency, 'navaids': Navaid}
+    SHARED = frozenset({'type', 'continent', 'iso_country', 'iso_region', 'municipality', 'scheduled_service'})
+    POSITION_FIELDS = frozenset({'latitude_deg', 'longitude_deg', 'coordinates'})
+
+    def _store(self, key: str, value: Any) -> None:
+        super()._store(key, value)
+        if key in self.POSITION_FIELDS:
+            try:
+                del self._position
+            except AttributeError:
+                pass
+
+    @property
+    def position(self) -> Tuple[Optional[float], Optional[float]]:
+        """Latitude and longitude, from the parsed fields or the coordinates"""
+        try:
+            return self._position
+        except AttributeError:
+            pass
+        lat, lon = self.latitude_deg, self.longitude_deg
+        if isinstance(lat, (int, float)) and isinstance(lon, (int, float)):
+            self._position = float(lat), float(lon)
+        else:
+            self._position = coordinates_position(self.coordinates)
+        return self._position
+
+
+def to_airports(records: List[Any]) -> List[Airport]:
+    """Airport records of a list of dicts, records already typed being kept"""
+    return [record if isinstance(record, Airport) else Airport(record) for record in records]
@@ -0,0 +1,167 @@
+import hashlib
+import json
+import re
+from pathlib import Path
+from typing import Collection, Dict, Iterator, Optional, TextIO, Tuple
+
+# Characters read from a country file at a time
+READ_BLOCK_SIZE = 1 << 16
+
+_AIRPORTS_KEY = re.compile(r'"airports"\s*:\s*\[')
+_SEPARATORS = re.compile(r'[\s,]*')
+_OBJECT_IDENT = re.compile(r'\{\s*"ident"\s*:\s*"((?:[^"\\]|\\.)*)"')
+# Start and end of an airport object in the indent=2 layout of airports.json
+_PRETTY_START = '{\n      "'
+_PRETTY_END = '\n    }'
+
+
+class _Buffer:
+    """Sliding window over a text file"""
+
+    def __init__(self, f: TextIO, block_size: int):
+        self.f = f
+        self.block_size = block_size
+        self.text = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self) -> bool:
+        """Read one more block, dropping what was consumed. False at EOF."""
+        if self.eof:
+            return False
+        block = self.f.read(self.block_size)
+        if not block:
+            self.eof = True
+            return False
+        self.text = self.text[self.pos:] + block
+        self.pos = 0
+        return True
+
+    def skip_separators(self) -> Optional[str]:
+        """Skip whitespace and commas, returning the next character"""
+        while True:
+            match = _SEPARATORS.match(self.text, self.pos)
+            if match is None:
+                raise ValueError(f"unexpected content at offset {self.pos} of the airports array")
+            self.pos = match.end()
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not self.fill():
+                return None
+
+
+def _iter_objects(buffer: _Buffer, keep: Optional[Collection[str]]) -> Iterator[Dict]:
+    """Decode the airport objects of the array at the buffer position.
+
+    Objects whose ident is not in keep are skipped without being decoded
+    when they use the indent=2 layout written by the updater.
+    """
+    decoder = json.JSONDecoder()
+    while True:
+        char = buffer.skip_separators()
+        if char is None or char == ']':
+            return
+        if keep is not None and buffer.text.startswith(_PRETTY_START, buffer.pos):
+            match = _OBJECT_IDENT.match(buffer.text, buffer.pos)
+            while match is None and len(buffer.text) - buffer.pos < 4096 and buffer.fill():
+                match = _OBJECT_IDENT.match(buffer.text, buffer.pos)
+            ident = match.group(1) if match is not None else None
+            if ident is not None and '\\' in ident:
+                ident = json.loads(f'"{ident}"')
+            if ident is not None and ident not in keep:
+                end = buffer.text.find(_PRETTY_END, buffer.pos)
+                while end < 0 and buffer.fill():
+                    end = buffer.text.find(_PRETTY_END, buffer.pos)
+                if end < 0:
+                    raise ValueError("unterminated airport object")
+                buffer.pos = end + len(_PRETTY_END)
+                continue
+        while True:
+            try:
+                obj, end = decoder.raw_decode(buffer.text, buffer.pos)
+                break
+            except json.JSONDecodeError:
+                # Most likely an object cut by the end of the block
+                if not buffer.fill():
+                    raise
+        buffer.pos = end
+        yield obj
+
+
+def read_airports(path: Path, fields: Optional[Collection[str]] = None,
+                  idents: Optional[Collection[str]] = None,
+                  full: Collection[str] = (),
+                  block_size: int = READ_BLOCK_SIZE) -> Dict[str, Dict]:
+    """Stream the airports of a country file into a dict keyed by ident.
+
+    Only airports in idents (all when None) are kept, reduced to fields
+    (all when None) except for the idents in full, kept whole. The file is
+    read block by block and the airports are decoded one at a time, so
+    memory follows what is kept rather than the size of the file.
+    Raises OSError or ValueError on missing or malformed files.
+    """
+    keep = None if idents is None else set(idents) | set(full)
+    full = set(full)
+    airports: Dict[str, Dict] = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        buffer = _Buffer(f, block_size)
+        while True:
+            match = _AIRPORTS_KEY.search(buffer.text, buffer.pos)
+            if match is not None:
+                buffer.pos = match.end()
+                break
+            # Keep a tail in case the key is cut by the end of the block
+            buffer.pos = max(buffer.pos, len(buffer.text) - 32)
+            if not buffer.fill():
+                return airports
+
+        for airport in _iter_objects(buffer, keep):
+            ident = airport.get('ident')
+            if not ident or (keep is not None and ident not in keep):
+                continue
+            if fields is not None and ident not in full:
+                airport = {key: airport[key] for key in ('ident', *fields) if key in airport}
+            airports[ident] = airport
+    return airports
+
+
+def country_files(data_dir: Path) -> Iterator[Tuple[str, Path]]:
+    """Country code and path of every data/<cc>/airports.json file, by code"""
+    for path in sorted(data_dir.glob('*/airports.json')):
+        yield path.parent.name.upper(), path
+
+
+def iter_countries(data_dir: Path) -> Iterator[Tuple[str, Dict]]:
+    """Country code and content of every readable country file of a data/ tree"""
+    for country, path in country_files(data_dir):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                content = json.load(f)
+        except (OSError, ValueError):
+            continue
+        yield country, content
+
+
+def iter_country_records(data_dir: Path) -> Iterator[Tuple[str, int, Dict]]:
+    """Country code, file position and record of every airport of a data/ tree"""
+    for country, content in iter_countries(data_dir):
+        for position, airport in enumerate(content.get('airports', [])):
+            yield country, position, airport
+
+
+def data_signature(data_dir: Path) -> str:
+    """Digest of the names, modification times and sizes of the files of a data/ tree.
+
+    Covers countries.json and every country file, so it changes with every
+    update run that writes the tree.
+    """
+    digest = hashlib.sha256()
+    paths = [data_dir / 'countries.json', *(path for _, path in country_files(data_dir))]
+    for path in paths:
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        name = path.relative_to(data_dir).as_posix()
+        digest.update(f'{name}:{stat.st_mtime_ns}:{stat.st_size}\n'.encode('utf-8'))
+    return digest.hexdigest()
@@ -0,0 +1,124 @@
+import json
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Set
+
+
+# Lower ranks are enriched first when the budget does not cover everything
+TYPE_PRIORITY = {
+    "large_airport": 0,
+    "medium_airport": 1,
+    "small_airport": 2,
+    "seaplane_base": 3,
+    "heliport": 4,
+    "balloonport": 5,
+    "closed": 6,
+}
+
+
+class Task(NamedTuple):
+    """A pending enrichment lookup"""
+    ident: str
+    country: str
+    airport_type: Optional[str]
+    # When the cached enrichment of ident was last fetched, None if never
+    fetched_at: Optional[float]
+
+
+class BudgetScheduler:
+    """Spend a per-run budget of API calls on the most useful lookups.
+
+    Pending lookups are served by type priority (large airports first),
+    then oldest cached enrichment first, round-robin across countries.
+    The country the round-robin starts from rotates across runs so that
+    leftover work is picked up by the next run.
+    """
+
+    def __init__(self, budgets: Optional[Dict[str, Optional[int]]] = None,
+                 state_path: Optional[Path] = None):
+        self.budgets = dict(budgets or {})
+        self.state_path = state_path
+        self.state: Dict[str, Dict] = {}
+        self.deferred: Dict[str, int] = {}
+        if state_path is not None and state_path.exists():
+            try:
+                with open(state_path, 'r', encoding='utf-8') as f:
+                    self.state = json.load(f)
+            except (OSError, ValueError):
+                self.state = {}
+
+    @property
+    def limited(self) -> bool:
+        """Whether any source has a budget"""
+        return any(budget is not None for budget in self.budgets.values())
+
+    @staticmethod
+    def _order(tasks: List[Task], start_after: Optional[str]) -> List[Task]:
+        """Order tasks by type tier, then round-robin across countries"""
+        tiers: Dict[int, Dict[str, List[Task]]] = {}
+        for task in tasks:
+            rank = TYPE_PRIORITY.get(task.airport_type or '', len(TYPE_PRIORITY))
+            tiers.setdefault(rank, {}).setdefault(task.country, []).append(task)
+
+        ordered = []
+        for rank in sorted(tiers):
+            queues = tiers[rank]
+            countries = sorted(queues)
+            if start_after is not None:
+                # Resume the rotation after the last country served
+                split = sum(1 for country in countries if country <= start_after)
+                countries = countries[split:] + countries[:split]
+            for country in countries:
+                # Never fetched first, then the oldest enrichment
+                queues[country].sort(key=lambda t: (t.fetched_at is not None, t.fetched_at or 0))
+            position = 0
+            while any(position < len(queues[c]) for c in countries):
+                for country in countries:
+                    if position < len(queues[country]):
+                        ordered.append(queues[country][position])
+                position += 1
+        return ordered
+
+    def select(self, source: str, tasks: List[Task], per_call: int = 1) -> List[str]:
+        """Return the idents to look up this run, within the budget of source.
+
+        per_call is the number of lookups served by one API call, for
+        batched endpoints. Idents are returned in the order of tasks.
+        """
+        budget = self.budgets.get(source)
+        if budget is None:
+            return [task.ident for task in tasks]
+
+        capacity = max(0, budget) * per_call
+        source_state = self.state.setdefault(source, {})
+        ordered = self._order(tasks, source_state.get('last_country'))
+        selected = ordered[:capacity]
+        leftover = len(ordered) - len(selected)
+        self.deferred[source] = leftover
+        source_state['pending'] = leftover
+        source_state['pending_countries'] = sorted({task.country for task in ordered[capacity:]})
+        if selected and leftover:
+            source_state['last_country'] = selected[-1].country
+        chosen = {task.ident for task in selected}
+        return [task.ident for task in tasks if task.ident in chosen]
+
+    def pending_countries(self) -> Set[str]:
+        """Countries with lookups left over by the previous run"""
+        return {
+            country
+            for source_state in self.state.values()
+            for country in source_state.get('pending_countries', [])
+        }
+
+    def report(self) -> str:
+        """Summary of the lookups deferred to the next run"""
+        return ", ".join(
+            f"{source}: {count} deferred" for source, count in sorted(self.deferred.items())
+        ) or "nothing deferred"
+
+    def save(self) -> None:
+        """Persist the rotation state for the next run"""
+        if self.state_path is None:
+            return
+        self.state_path.parent.mkdir(exist_ok=True, parents=True)
+        with open(self.state_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, indent=2, sort_keys=True)
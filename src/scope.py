@@ -0,0 +1,91 @@
+from typing import TYPE_CHECKING, Any, FrozenSet, Iterable, Mapping, Optional
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+def _normalize(values: Optional[Iterable[str]]) -> Optional[FrozenSet[str]]:
+    if values is None:
+        return None
+    return frozenset(values)
+
+
+class EnrichmentScope:
+    """Airports selected for processing and enrichment.
+
+    Each criterion is a set of allowed values; None allows every value.
+    """
+
+    def __init__(self, countries: Optional[Iterable[str]] = None,
+                 continents: Optional[Iterable[str]] = None,
+                 types: Optional[Iterable[str]] = None):
+        self.countries = _normalize(countries)
+        self.continents = _normalize(continents)
+        self.types = _normalize(types)
+
+    @classmethod
+    def parse(cls, countries: Optional[str] = None, continents: Optional[str] = None,
+              types: Optional[str] = None, default: Optional['EnrichmentScope'] = None
+              ) -> 'EnrichmentScope':
+        """Build a scope from comma-separated lists, 'all' lifting a criterion.
+
+        Criteria that are not given keep the value of default.
+        """
+        def parse_list(value, fallback, upper=False):
+            if value is None:
+                return fallback
+            if value.strip().lower() == 'all':
+                return None
+            items = [item.strip() for item in value.split(',') if item.strip()]
+            return [item.upper() for item in items] if upper else items
+
+        default = default or cls()
+        return cls(
+            countries=parse_list(countries, default.countries, upper=True),
+            continents=parse_list(continents, default.continents, upper=True),
+            types=parse_list(types, default.types),
+        )
+
+    def mask(self, df: 'pd.DataFrame') -> 'pd.Series':
+        """Boolean mask of the rows of df within the scope"""
+        mask = df['iso_country'].notna()
+        if self.countries is not None:
+            mask &= df['iso_country'].isin(self.countries)
+        if self.continents is not None:
+            if 'continent' in df.columns:
+                mask &= df['continent'].isin(self.continents)
+            else:
+                mask &= False
+        if self.types is not None:
+            mask &= df['type'].isin(self.types)
+        return mask
+
+    def contains(self, airport_data: Mapping[str, Any]) -> bool:
+        """Whether a single airport record is within the scope"""
+        if not airport_data.get('iso_country'):
+            return False
+        checks = (
+            (self.countries, 'iso_country'),
+            (self.continents, 'continent'),
+            (self.types, 'type'),
+        )
+        return all(
+            allowed is None or airport_data.get(field) in allowed
+            for allowed, field in checks
+        )
+
+    def fingerprint(self) -> str:
+        """Stable description of the scope, used to invalidate manifests"""
+        def describe(values):
+            return '*' if values is None else ','.join(sorted(values))
+        return '|'.join([
+            describe(self.countries),
+            describe(self.continents),
+            describe(self.types),
+        ])
+
+    def __repr__(self) -> str:
+        return (
+            f"EnrichmentScope(countries={self.countries!r}, "
+            f"continents={self.continents!r}, types={self.types!r})"
+        )
@@ -0,0 +1,398 @@
+import argparse
+import json
+import re
+import unicodedata
+from bisect import bisect_left
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Mapping, NamedTuple, Optional, Set, Tuple
+
+import numpy as np
+
+from .export import (
+    DETAILS_CHUNK_SIZE, airport_position, dumps_compact, new_write_stats, remove_stale,
+    write_if_changed,
+)
+from .reader import data_signature, iter_country_records
+
+
+INDEX_VERSION = 1
+DEFAULT_INDEX_PATH = Path(__file__).parent.parent / '.cache' / 'search.json'
+# Fields matched by the index; codes are also matched as a whole query
+CODE_FIELDS = ('ident', 'iata_code', 'gps_code', 'local_code')
+TEXT_FIELDS = ('name', 'municipality', 'keywords')
+# Result order of the airport types, unknown types last
+TYPE_RANK = {
+    'large_airport': 0, 'medium_airport': 1, 'small_airport': 2, 'seaplane_base': 3,
+    'heliport': 4, 'balloonport': 5, 'closed': 6,
+}
+# Matches of prefixes with more ids than this are computed once and kept,
+# as they are the most expensive to merge and the most often queried
+COMMON_PREFIX_IDS = 2000
+# Minimum trigram similarity of a fuzzy match, and fuzzy terms kept per token
+FUZZY_THRESHOLD = 0.4
+FUZZY_TERMS = 20
+# Static export: terms are split by their first PREFIX_LENGTH characters,
+# records in chunks of RECORD_CHUNK_SIZE
+PREFIX_LENGTH = 2
+RECORD_CHUNK_SIZE = 500
+RECORD_FIELDS = ('ident', 'name', 'country', 'type', 'municipality', 'iata_code', 'lat', 'lon', 'index')
+# Also kept by the index, to match codes
+STORED_FIELDS = RECORD_FIELDS + ('gps_code', 'local_code')
+
+_SEPARATORS = re.compile(r'[^a-z0-9]+')
+
+
+class SearchResult(NamedTuple):
+    """An airport returned by a search"""
+    ident: str
+    name: str
+    country: str
+    type: str
+    municipality: str
+    iata_code: str
+    lat: Optional[float]
+    lon: Optional[float]
+    # Position of the airport in its country file, 'index' in the record files
+    position: int
+
+
+def normalize(text: str) -> str:
+    """Lowercase ASCII words separated by single spaces, accents removed"""
+    decomposed = unicodedata.normalize('NFKD', text)
+    ascii_text = ''.join(c for c in decomposed if not unicodedata.combining(c)).lower()
+    return _SEPARATORS.sub(' ', ascii_text).strip()
+
+
+def tokenize(text: str) -> List[str]:
+    return normalize(text).split()
+
+
+def trigrams(term: str) -> Set[str]:
+    """Trigrams of a term padded with a space on both sides"""
+    padded = f' {term} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def intersect(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Common values of two sorted arrays of distinct ids, looking up the smaller in the larger"""
+    if len(a) > len(b):
+        a, b = b, a
+    if not len(a):
+        return a
+    positions = np.minimum(np.searchsorted(b, a), len(b) - 1)
+    return a[b[positions] == a]
+
+
+def _rank(record: Dict) -> Tuple:
+    return TYPE_RANK.get(record['type'], len(TYPE_RANK)), record['name'].lower(), record['ident']
+
+
+class SearchIndex:
+    """Prefix and trigram index over airport codes, names and places.
+
+    Records are numbered by rank (airport type, then name), so that the
+    best matches of any query are its smallest record ids. Every distinct
+    term is kept in a sorted list with the sorted ids of its records: the
+    terms starting with a prefix are a contiguous slice found by bisection.
+    Fuzzy matches go through a trigram index of the terms, built on first
+    use.
+    """
+
+    def __init__(self, records: Dict[str, List], terms: List[str],
+                 offsets: np.ndarray, postings: np.ndarray):
+        self.records = records
+        self.terms = terms
+        self.offsets = offsets
+        self.postings = postings
+        # Records of every normalized code, for exact code matches
+        self.codes: Dict[str, List[int]] = {}
+        for field in CODE_FIELDS:
+            for record_id, code in enumerate(records[field]):
+                if code:
+                    ids = self.codes.setdefault(normalize(code).replace(' ', ''), [])
+                    if not ids or ids[-1] != record_id:
+                        ids.append(record_id)
+        self._common_prefixes: Dict[str, np.ndarray] = {}
+        self._trigrams: Optional[Dict[str, np.ndarray]] = None
+        self._term_lengths: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self.records['ident'])
+
+    @classmethod
+    def from_records(cls, records: Iterable[Tuple[str, int, Mapping[str, Any]]]) -> 'SearchIndex':
+        """Index (country, position, airport) tuples; airports without an ident are skipped"""
+        rows = []
+        for country, position, airport in records:
+            if not airport.get('ident'):
+                continue
+            lat, lon = airport_position(airport)
+            rows.append({
+                'ident': airport['ident'],
+                'name': airport.get('name') or '',
+                'country': country,
+                'type': airport.get('type') or '',
+                'municipality': airport.get('municipality') or '',
+                'iata_code': airport.get('iata_code') or '',
+                'gps_code': airport.get('gps_code') or '',
+                'local_code': airport.get('local_code') or '',
+                'keywords': airport.get('keywords') or '',
+                'lat': round(lat, 6) if lat is not None else None,
+                'lon': round(lon, 6) if lon is not None else None,
+                'index': position,
+            })
+        rows.sort(key=_rank)
+
+        term_ids: Dict[str, List[int]] = {}
+        for record_id, row in enumerate(rows):
+            words = set()
+            for field in CODE_FIELDS:
+                words.update(tokenize(row[field]))
+            for field in TEXT_FIELDS:
+                words.update(tokenize(row[field]))
+            for word in words:
+                term_ids.setdefault(word, []).append(record_id)
+
+        terms = sorted(term_ids)
+        lengths = np.array([len(term_ids[term]) for term in terms], dtype=np.int64)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        postings = np.fromiter(
+            (record_id for term in terms for record_id in term_ids[term]),
+            dtype=np.int32, count=int(offsets[-1]),
+        )
+        columns = {field: [row[field] for row in rows] for field in STORED_FIELDS}
+        return cls(columns, terms, offsets, postings)
+
+    @classmethod
+    def from_data_dir(cls, data_dir: Path) -> 'SearchIndex':
+        """Index every airport of a generated data/ tree"""
+        return cls.from_records(iter_country_records(data_dir))
+
+    def save(self, path: Path, signature: str = '') -> None:
+        """Persist the index as a single JSON file.
+
+        signature identifies the data the index was built from (see
+        reader.data_signature).
+        """
+        path.parent.mkdir(exist_ok=True, parents=True)
+        write_if_changed(path, dumps_compact({
+            'version': INDEX_VERSION,
+            'signature': signature,
+            'records': self.records,
+            'terms': self.terms,
+            'offsets': self.offsets.tolist(),
+            'postings': self.postings.tolist(),
+        }), new_write_stats())
+
+    @classmethod
+    def load(cls, path: Path, signature: Optional[str] = None) -> Optional['SearchIndex']:
+        """Load a saved index, or None if missing, from another version or,
+        when signature is given, built from other data"""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+            if saved.get('version') != INDEX_VERSION:
+                return None
+            if signature is not None and saved.get('signature') != signature:
+                return None
+            return cls(
+                saved['records'], saved['terms'],
+                np.array(saved['offsets'], dtype=np.int64),
+                np.array(saved['postings'], dtype=np.int32),
+            )
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _term_range(self, prefix: str) -> Tuple[int, int]:
+        """Slice of the sorted terms starting with prefix"""
+        return bisect_left(self.terms, prefix), bisect_left(self.terms, prefix + '\x7f')
+
+    def _ids(self, lo: int, hi: int) -> np.ndarray:
+        """Sorted distinct records of the terms lo to hi - 1"""
+        ids = self.postings[self.offsets[lo]:self.offsets[hi]]
+        return ids if hi - lo == 1 else np.unique(ids)
+
+    def prefix_ids(self, prefix: str) -> np.ndarray:
+        """Sorted ids of the records with a term starting with prefix"""
+        cached = self._common_prefixes.get(prefix)
+        if cached is not None:
+            return cached
+        lo, hi = self._term_range(prefix)
+        ids = self._ids(lo, hi)
+        if self.offsets[hi] - self.offsets[lo] > COMMON_PREFIX_IDS:
+            self._common_prefixes[prefix] = ids
+        return ids
+
+    def _build_trigrams(self) -> Tuple[Dict[str, np.ndarray], np.ndarray]:
+        index: Dict[str, List[int]] = {}
+        for term_id, term in enumerate(self.terms):
+            for trigram in trigrams(term):
+                index.setdefault(trigram, []).append(term_id)
+        # A padded term of n characters has n trigrams, repeats aside. Set
+        # first: concurrent queries only wait for _trigrams.
+        self._term_lengths = np.array([len(trigrams(term)) for term in self.terms], dtype=np.int32)
+        self._trigrams = {key: np.array(ids, dtype=np.int32) for key, ids in index.items()}
+        return self._trigrams, self._term_lengths
+
+    def warm(self) -> None:
+        """Build the trigram index now rather than on the first fuzzy query"""
+        if self._trigrams is None:
+            self._build_trigrams()
+
+    def similar_terms(self, token: str, limit: int = FUZZY_TERMS,
+                      threshold: float = FUZZY_THRESHOLD) -> List[str]:
+        """Terms sharing most trigrams with token, most similar first"""
+        # _term_lengths is set before _trigrams, so both are set when it is
+        index, lengths = self._trigrams, self._term_lengths
+        if index is None or lengths is None:
+            index, lengths = self._build_trigrams()
+        wanted = trigrams(token)
+        found = [index[t] for t in wanted if t in index]
+        if not found:
+            return []
+        term_ids, shared = np.unique(np.concatenate(found), return_counts=True)
+        similarity = shared / (len(wanted) + lengths[term_ids] - shared)
+        keep = similarity >= threshold
+        term_ids, similarity = term_ids[keep], similarity[keep]
+        best = np.argsort(-similarity, kind='stable')[:limit]
+        return [self.terms[i] for i in term_ids[best]]
+
+    def fuzzy_ids(self, token: str, candidates: Optional[np.ndarray] = None) -> np.ndarray:
+        """Sorted ids of the records with a term starting with or similar to token.
+
+        With candidates, only those of the candidate ids, which avoids
+        merging the long id lists of common words.
+        """
+        ranges = [self._term_range(term) for term in self.similar_terms(token)]
+        parts = [self.prefix_ids(token)] + [self._ids(lo, lo + 1) for lo, _ in ranges]
+        if candidates is not None:
+            parts = [intersect(candidates, part) for part in parts]
+        return np.unique(np.concatenate(parts))
+
+    def _result(self, record_id: int) -> SearchResult:
+        return SearchResult(*(self.records[field][record_id] for field in RECORD_FIELDS))
+
+    def search(self, query: str, limit: int = 10, fuzzy: bool = True) -> List[SearchResult]:
+        """Airports matching every word of query, best first.
+
+        Airports with a code equal to the query come first, then those with
+        a word starting with each query word. When these are fewer than
+        limit, airports whose words are similar to the query words follow.
+        """
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        found: List[int] = list(self.codes.get(''.join(tokens), []))[:limit]
+        seen = set(found)
+
+        def extend(ids: np.ndarray) -> None:
+            for record_id in ids:
+                if len(found) >= limit:
+                    return
+                record_id = int(record_id)
+                if record_id not in seen:
+                    seen.add(record_id)
+                    found.append(record_id)
+
+        ids = self.prefix_ids(tokens[0])
+        for token in tokens[1:]:
+            ids = intersect(ids, self.prefix_ids(token))
+        extend(ids)
+
+        if fuzzy and len(found) < limit:
+            # Most selective words first, the others only filter their matches
+            tokens.sort(key=lambda token: len(self.prefix_ids(token)))
+            ids = self.fuzzy_ids(tokens[0])
+            for token in tokens[1:]:
+                ids = self.fuzzy_ids(token, candidates=ids)
+            extend(ids)
+        return [self._result(record_id) for record_id in found]
+
+
+def load_or_build(data_dir: Path, index_path: Path = DEFAULT_INDEX_PATH,
+                  rebuild: bool = False) -> SearchIndex:
+    """Load the persisted index, building and saving it if missing or stale.
+
+    The index is rebuilt when the files of data_dir changed since it was saved.
+    """
+    signature = data_signature(data_dir)
+    index = None if rebuild else SearchIndex.load(index_path, signature)
+    if index is None:
+        index = SearchIndex.from_data_dir(data_dir)
+        index.save(index_path, signature)
+    return index
+
+
+def write_search_export(search_dir: Path, index: SearchIndex) -> Dict[str, int]:
+    """Write the static search files loaded by the map, leaving unchanged files untouched.
+
+    terms/<prefix>.json holds the terms and codes starting with a
+    two-character prefix (shorter ones have their own file) with the ids
+    of their records; records/<n>.json holds records n * RECORD_CHUNK_SIZE
+    onwards as columns. Returns the write statistics, with the number of
+    stale files removed.
+    """
+    stats = new_write_stats()
+    written: Set[Path] = set()
+
+    def write(path: Path, data: Dict) -> None:
+        path.parent.mkdir(exist_ok=True, parents=True)
+        write_if_changed(path, dumps_compact(data), stats)
+        written.add(path)
+
+    shards: Dict[str, Dict] = {}
+
+    def shard(key: str) -> Dict:
+        return shards.setdefault(key[:PREFIX_LENGTH], {'terms': [], 'ids': [], 'codes': {}})
+
+    for term_id, term in enumerate(index.terms):
+        entry = shard(term)
+        entry['terms'].append(term)
+        entry['ids'].append(index.postings[index.offsets[term_id]:index.offsets[term_id + 1]].tolist())
+    for code, ids in sorted(index.codes.items()):
+        shard(code)['codes'][code] = ids
+    for prefix, entry in sorted(shards.items()):
+        write(search_dir / 'terms' / f'{prefix}.json', entry)
+
+    for start in range(0, len(index), RECORD_CHUNK_SIZE):
+        write(search_dir / 'records' / f'{start // RECORD_CHUNK_SIZE}.json', {
+            field: index.records[field][start:start + RECORD_CHUNK_SIZE] for field in RECORD_FIELDS
+        })
+
+    write(search_dir / 'index.json', {
+        'version': INDEX_VERSION,
+        'total_airports': len(index),
+        'prefix_length': PREFIX_LENGTH,
+        'record_chunk_size': RECORD_CHUNK_SIZE,
+        'details_chunk_size': DETAILS_CHUNK_SIZE,
+    })
+    stats['removed'] = sum(
+        remove_stale(search_dir / name, written) for name in ('terms', 'records')
+    )
+    return stats
+
+
+def write_data_dir_search(data_dir: Path, search_dir: Path) -> Dict[str, int]:
+    """Index every airport in the data directory and write the static search files"""
+    return write_search_export(search_dir, SearchIndex.from_data_dir(data_dir))
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Search airports by code, name or place")
+    parser.add_argument('query', nargs='+', help="ident, IATA/GPS/local code, name or municipality")
+    parser.add_argument('-n', '--limit', type=int, default=10, help="number of airports to return")
+    parser.add_argument('--exact', action='store_true', help="no fuzzy matches")
+    parser.add_argument('--data', type=Path, default=Path(__file__).parent.parent / 'data')
+    parser.add_argument('--index', type=Path, default=DEFAULT_INDEX_PATH)
+    parser.add_argument('--rebuild', action='store_true', help="rebuild the index from --data")
+    args = parser.parse_args(argv)
+
+    index = load_or_build(args.data, args.index, rebuild=args.rebuild)
+    for result in index.search(' '.join(args.query), limit=args.limit, fuzzy=not args.exact):
+        print(f"{result.ident:<8} {result.iata_code or '':<4} {result.country:<3} "
+              f"{result.name} ({result.municipality or result.type})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,462 @@
+import argparse
+import gzip
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, Hashable, List, NamedTuple, Optional, Tuple
+from urllib.parse import parse_qsl, urlparse
+
+import numpy as np
+
+from .export import dumps_compact
+from .models import Airport, to_airports
+from .reader import data_signature, iter_countries
+from .search import RECORD_FIELDS, TYPE_RANK, SearchIndex
+
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8000
+# Encoded responses kept in memory
+DEFAULT_CACHE_SIZE = 1024
+# Seconds between two checks of the data directory for changes
+DEFAULT_RELOAD_INTERVAL = 2.0
+DEFAULT_BBOX_LIMIT = 1000
+MAX_BBOX_LIMIT = 20000
+DEFAULT_SEARCH_LIMIT = 10
+MAX_SEARCH_LIMIT = 100
+# Smaller responses are sent uncompressed
+GZIP_MIN_SIZE = 1024
+
+
+class QueryError(ValueError):
+    """Invalid request parameters, answered with a 400"""
+
+
+class Response(NamedTuple):
+    status: int
+    body: bytes
+    etag: str
+    gzipped: bool = False
+
+
+def accepts_gzip(accept_encoding: str) -> bool:
+    """Whether an Accept-Encoding header allows gzip, honouring q-values"""
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.split(','):
+        coding, _, params = part.partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        weight = 1.0
+        for param in params.split(';'):
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[coding] = weight
+    # An unlisted gzip is covered by *
+    return weights.get('gzip', weights.get('x-gzip', weights.get('*', 0.0))) > 0
+
+
+def make_response(status: int, data: Any) -> Response:
+    body = dumps_compact(data)
+    return Response(status, body, f'"{hashlib.blake2b(body, digest_size=8).hexdigest()}"')
+
+
+def gzip_response(response: Response) -> Response:
+    """The gzip-encoded variant of a response, with its own ETag"""
+    return Response(
+        response.status, gzip.compress(response.body, mtime=0),
+        response.etag[:-1] + '-gzip"', gzipped=True,
+    )
+
+
+class LRUCache:
+    """Thread-safe mapping keeping the max_entries most recently used entries"""
+
+    def __init__(self, max_entries: int = DEFAULT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: 'OrderedDict[Hashable, Any]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class Dataset:
+    """The airports of a generated data/ tree, loaded once and indexed in memory.
+
+    Airports are kept as typed records per country, with an ident lookup,
+    the search index and positions sorted by latitude for bounding box
+    queries.
+    """
+
+    def __init__(self, data_dir: Path):
+        self.signature = data_signature(data_dir)
+        self.loaded_at = time.time()
+        try:
+            with open(data_dir / 'countries.json', 'r', encoding='utf-8') as f:
+                self.countries_index: List[Dict] = json.load(f)
+        except (OSError, ValueError):
+            self.countries_index = []
+
+        self.headers: Dict[str, Dict] = {}
+        self.airports: Dict[str, List[Airport]] = {}
+        self.idents: Dict[str, Tuple[str, int]] = {}
+        for country, header in iter_countries(data_dir):
+            airports = to_airports(header.pop('airports', []))
+            self.headers[country] = header
+            self.airports[country] = airports
+            for position, airport in enumerate(airports):
+                if airport.ident:
+                    self.idents.setdefault(airport.ident.upper(), (country, position))
+
+        records = [
+            (country, position, airport)
+            for country, airports in self.airports.items()
+            for position, airport in enumerate(airports)
+        ]
+        self.search = SearchIndex.from_records(records)
+        self.search.warm()
+
+        located = [(record, record[2].position) for record in records]
+        located = [(record, position) for record, position in located if position[0] is not None]
+        lat = np.array([position[0] for _, position in located], dtype=np.float64)
+        order = np.argsort(lat, kind='stable')
+        self.lat = lat[order]
+        self.lon = np.array([position[1] for _, position in located], dtype=np.float64)[order]
+        self.rank = np.array(
+            [TYPE_RANK.get(record[2].type, len(TYPE_RANK)) for record, _ in located], dtype=np.int8,
+        )[order]
+        self.refs = [located[i][0] for i in order.tolist()]
+
+    def __len__(self) -> int:
+        return len(self.idents)
+
+    def country(self, code: str) -> Optional[Dict]:
+        code = code.upper()
+        if code not in self.headers:
+            return None
+        return {**self.headers[code], 'airports': self.airports[code]}
+
+    def airport(self, ident: str) -> Optional[Dict]:
+        match = self.idents.get(ident.upper())
+        if match is None:
+            return None
+        country, position = match
+        return {'country_code': country, 'index': position, 'airport': self.airports[country][position]}
+
+    def bbox(self, south: float, west: float, north: float, east: float,
+             limit: int = DEFAULT_BBOX_LIMIT) -> Dict:
+        """Markers of the airports in a box, larger airports first when over limit.
+
+        A box with west greater than east crosses the antimeridian.
+        """
+        lo = int(np.searchsorted(self.lat, south, side='left'))
+        hi = int(np.searchsorted(self.lat, north, side='right'))
+        lon = self.lon[lo:hi]
+        if west <= east:
+            inside = (lon >= west) & (lon <= east)
+        else:
+            inside = (lon >= west) | (lon <= east)
+        indices = np.flatnonzero(inside) + lo
+        count = len(indices)
+        if count > limit:
+            indices = indices[np.argsort(self.rank[indices], kind='stable')[:limit]]
+
+        markers: Dict[str, List] = {field: [] for field in ('ident', 'lat', 'lon', 'type', 'country', 'index')}
+        for i in indices.tolist():
+            country, position, airport = self.refs[i]
+            markers['ident'].append(airport.ident)
+            markers['lat'].append(round(float(self.lat[i]), 6))
+            markers['lon'].append(round(float(self.lon[i]), 6))
+            markers['type'].append(airport.type)
+            markers['country'].append(country)
+            markers['index'].append(position)
+        return {'count': count, 'truncated': count > limit, 'markers': markers}
+
+
+def _number(params: Dict[str, str], name: str, default: Optional[float] = None,
+            low: float = -180.0, high: float = 180.0) -> float:
+    value = params.get(name)
+    if value is None:
+        if default is None:
+            raise QueryError(f"missing parameter {name}")
+        return default
+    try:
+        number = float(value)
+    except ValueError:
+        raise QueryError(f"{name} is not a number: {value}")
+    if not low <= number <= high:
+        raise QueryError(f"{name} must be between {low:g} and {high:g}")
+    return number
+
+
+class AirportService:
+    """Answers the query endpoints from the current dataset.
+
+    Encoded responses are kept in an LRU cache keyed by the dataset
+    generation, so a reload never serves stale entries. The dataset is
+    rebuilt in the background when the files of data_dir change, once
+    they have been stable for a reload interval, and swapped atomically.
+
+    Endpoints:
+      /countries                  countries.json
+      /countries/<cc>             airports.json of a country
+      /airports/<ident>           an airport, its country and file position
+      /bbox?south=&west=&north=&east=[&limit=]
+      /search?q=[&limit=][&exact=1]
+      /health                     dataset size, reloads and cache hits
+    """
+
+    def __init__(self, data_dir: Path, cache_size: int = DEFAULT_CACHE_SIZE,
+                 reload_interval: float = DEFAULT_RELOAD_INTERVAL):
+        self.data_dir = data_dir
+        self.reload_interval = reload_interval
+        self.cache = LRUCache(cache_size)
+        # The dataset and its generation, swapped together by reload so
+        # that a request never pairs a dataset with another's cache keys
+        self._state: Tuple[Dataset, int] = (Dataset(data_dir), 0)
+        self.reloads = 0
+        self._pending: Optional[str] = None
+        self._stop = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
+
+    @property
+    def dataset(self) -> Dataset:
+        return self._state[0]
+
+    @property
+    def generation(self) -> int:
+        return self._state[1]
+
+    def _route(self, dataset: Dataset, path: str, params: Dict[str, str]) -> Response:
+        parts = [part for part in path.split('/') if part]
+        if parts == ['countries']:
+            return make_response(200, dataset.countries_index)
+        if len(parts) == 2 and parts[0] == 'countries':
+            data = dataset.country(parts[1])
+        elif len(parts) == 2 and parts[0] == 'airports':
+            data = dataset.airport(parts[1])
+        elif parts == ['bbox']:
+            south = _number(params, 'south', low=-90.0, high=90.0)
+            north = _number(params, 'north', low=-90.0, high=90.0)
+            if south > north:
+                raise QueryError("south must not be greater than north")
+            limit = _number(params, 'limit', DEFAULT_BBOX_LIMIT, low=1, high=MAX_BBOX_LIMIT)
+            data = dataset.bbox(south, _number(params, 'west'), north, _number(params, 'east'),
+                                limit=int(limit))
+        elif parts == ['search']:
+            query = params.get('q', '').strip()
+            if not query:
+                raise QueryError("missing parameter q")
+            limit = _number(params, 'limit', DEFAULT_SEARCH_LIMIT, low=1, high=MAX_SEARCH_LIMIT)
+            results = dataset.search.search(query, limit=int(limit), fuzzy=params.get('exact') != '1')
+            data = {'query': query, 'results': [dict(zip(RECORD_FIELDS, result)) for result in results]}
+        else:
+            data = None
+        if data is None:
+            return make_response(404, {'error': f"not found: {path}"})
+        return make_response(200, data)
+
+    def health(self) -> Dict:
+        dataset = self.dataset
+        return {
+            'airports': len(dataset),
+            'countries': len(dataset.headers),
+            'loaded_at': dataset.loaded_at,
+            'reloads': self.reloads,
+            'cache': {'entries': len(self.cache), 'hits': self.cache.hits, 'misses': self.cache.misses},
+        }
+
+    def get(self, target: str, accept_gzip: bool = False) -> Response:
+        """The response to a GET of target, gzip-encoded if accepted and worth it"""
+        url = urlparse(target)
+        params = dict(parse_qsl(url.query))
+        if url.path.strip('/') == 'health':
+            return make_response(200, self.health())
+
+        dataset, generation = self._state
+        key = (generation, url.path.rstrip('/'), tuple(sorted(params.items())))
+        response = self.cache.get(key)
+        if response is None:
+            try:
+                response = self._route(dataset, url.path, params)
+            except QueryError as e:
+                return make_response(400, {'error': str(e)})
+            self.cache.put(key, response)
+        if not accept_gzip or len(response.body) < GZIP_MIN_SIZE:
+            return response
+        gzipped = self.cache.get(key + ('gzip',))
+        if gzipped is None:
+            gzipped = gzip_response(response)
+            self.cache.put(key + ('gzip',), gzipped)
+        return gzipped
+
+    def reload(self) -> None:
+        """Load the data directory again and serve it from now on"""
+        dataset = Dataset(self.data_dir)
+        self._state = (dataset, self.generation + 1)
+        self.cache.clear()
+        self.reloads += 1
+        print(f"Reloaded {len(dataset)} airports from {self.data_dir}")
+
+    def check_reload(self) -> bool:
+        """Reload if the data files changed and were unchanged since the previous check"""
+        signature = data_signature(self.data_dir)
+        if signature == self.dataset.signature:
+            self._pending = None
+            return False
+        if signature != self._pending:
+            # Still being written by an update run
+            self._pending = signature
+            return False
+        self._pending = None
+        self.reload()
+        return True
+
+    def _watch(self) -> None:
+        while not self._stop.wait(self.reload_interval):
+            try:
+                self.check_reload()
+            except Exception as e:
+                print(f"Reload failed, still serving the previous data: {e}")
+
+    def start_watching(self) -> None:
+        if self._watcher is None and self.reload_interval > 0:
+            self._watcher = threading.Thread(target=self._watch, daemon=True)
+            self._watcher.start()
+
+    def stop_watching(self) -> None:
+        self._stop.set()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: 'AirportServer'
+    # Keep-alive connections: every response has a Content-Length
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in one segment instead of waiting for the
+    # delayed ACK of the headers
+    disable_nagle_algorithm = True
+    wbufsize = -1
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+    def _respond(self, send_body: bool) -> None:
+        accept_gzip = accepts_gzip(self.headers.get('Accept-Encoding', ''))
+        response = self.server.service.get(self.path, accept_gzip=accept_gzip)
+        if response.status == 200 and response.etag in self.headers.get('If-None-Match', ''):
+            self.send_response(304)
+            self.send_header('ETag', response.etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(response.status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(response.body)))
+        self.send_header('ETag', response.etag)
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Vary', 'Accept-Encoding')
+        if response.gzipped:
+            self.send_header('Content-Encoding', 'gzip')
+        self.end_headers()
+        if send_body:
+            self.wfile.write(response.body)
+
+    def do_GET(self):
+        self._respond(send_body=True)
+
+    def do_HEAD(self):
+        self._respond(send_body=False)
+
+
+class AirportServer(ThreadingHTTPServer):
+    """Threaded HTTP server of an AirportService; port 0 picks a free port"""
+    daemon_threads = True
+
+    def __init__(self, service: AirportService, host: str = DEFAULT_HOST,
+                 port: int = DEFAULT_PORT, quiet: bool = False):
+        super().__init__((host, port), _Handler)
+        self.service = service
+        self.quiet = quiet
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def __enter__(self) -> 'AirportServer':
+        self.service.start_watching()
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.service.stop_watching()
+        self.shutdown()
+        self.server_close()
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Serve read-only airport queries over the generated data")
+    parser.add_argument('--data', type=Path, default=Path(__file__).parent.parent / 'data')
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_CACHE_SIZE,
+                        help="encoded responses kept in memory (0 disables the cache)")
+    parser.add_argument('--reload-interval', type=float, default=DEFAULT_RELOAD_INTERVAL,
+                        help="seconds between checks of --data for changes (0 disables hot reload)")
+    parser.add_argument('--quiet', action='store_true', help="do not log requests")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    service = AirportService(args.data, cache_size=args.cache_size, reload_interval=args.reload_interval)
+    print(f"Loaded {len(service.dataset)} airports in {time.perf_counter() - started:.1f}s")
+    server = AirportServer(service, args.host, args.port, quiet=args.quiet)
+    service.start_watching()
+    print(f"Serving {args.data} on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.stop_watching()
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
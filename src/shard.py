@@ -0,0 +1,127 @@
+import hashlib
+import json
+import zlib
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Iterable, List, NamedTuple
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+SHARD_MANIFEST_VERSION = 1
+DEFAULT_SHARD_DIR = Path(__file__).parent.parent / '.cache' / 'shards'
+
+
+def shard_index(country: str, count: int) -> int:
+    """0-based shard of a country code: crc32 of the code modulo count"""
+    return zlib.crc32(country.upper().encode('utf-8')) % count
+
+
+def source_fingerprint(df: 'pd.DataFrame') -> str:
+    """Identify the source rows, so that shards of different downloads are not merged"""
+    import pandas as pd
+
+    hashes = pd.util.hash_pandas_object(df['ident'].astype(str), index=False)
+    return hashlib.sha256(hashes.values.tobytes()).hexdigest()
+
+
+class Shard(NamedTuple):
+    """Shard number (1-based) out of total, owning the countries hashed to it"""
+    number: int
+    total: int
+
+    @classmethod
+    def parse(cls, text: str) -> 'Shard':
+        """Parse 'i/N', e.g. '1/4' for the first of four shards"""
+        try:
+            number, count = (int(part) for part in text.split('/'))
+        except ValueError:
+            raise ValueError(f"invalid shard {text!r}, expected i/N") from None
+        if count < 1 or not 1 <= number <= count:
+            raise ValueError(f"invalid shard {text!r}, expected 1 <= i <= N")
+        return cls(number, count)
+
+    def __str__(self) -> str:
+        return f'{self.number}/{self.total}'
+
+    @property
+    def name(self) -> str:
+        return f'shard-{self.number}-of-{self.total}'
+
+    def contains(self, country: str) -> bool:
+        return shard_index(country, self.total) == self.number - 1
+
+    def mask(self, df: 'pd.DataFrame') -> 'pd.Series':
+        """Boolean mask of the rows of df whose country belongs to the shard"""
+        countries = df['iso_country'].astype(object)
+        owned = [country for country in countries.dropna().unique() if self.contains(country)]
+        return countries.isin(owned)
+
+    def suffixed(self, path: Path) -> Path:
+        """path with the shard name inserted, for state files kept per shard"""
+        return path.with_name(f'{path.stem}.{self.name}{path.suffix}')
+
+
+def manifest_path(shard_dir: Path, shard: Shard) -> Path:
+    return shard_dir / f'{shard.name}.json'
+
+
+def write_shard_manifest(shard_dir: Path, shard: Shard, source: str,
+                         countries: Iterable[str], index: List[Dict]) -> Path:
+    """Record what a shard run produced: the countries it owns and their index entries"""
+    path = manifest_path(shard_dir, shard)
+    shard_dir.mkdir(exist_ok=True, parents=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'version': SHARD_MANIFEST_VERSION,
+            'shard': shard.number,
+            'count': shard.total,
+            'source': source,
+            'countries': sorted(countries),
+            'index': index,
+        }, f, indent=2, ensure_ascii=False)
+    return path
+
+
+def merge_shard_manifests(shard_dir: Path, count: int, data_dir: Path) -> List[Dict]:
+    """Validate the manifests of the count shards of a run and merge their index entries.
+
+    Every shard must have a manifest computed from the same source data,
+    with an index entry and a country file for each country it owns.
+    Raises ValueError otherwise. Returns the entries sorted by name.
+    """
+    sources = set()
+    entries: List[Dict] = []
+    for number in range(1, count + 1):
+        shard = Shard(number, count)
+        try:
+            with open(manifest_path(shard_dir, shard), 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            raise ValueError(f"shard {shard} has no manifest in {shard_dir}") from None
+        if manifest.get('version') != SHARD_MANIFEST_VERSION or manifest.get('count') != count:
+            raise ValueError(f"the manifest of shard {shard} is from another sharding")
+        sources.add(manifest.get('source'))
+
+        owned = set(manifest['countries'])
+        foreign = {country for country in owned if not shard.contains(country)}
+        if foreign:
+            raise ValueError(f"shard {shard} processed countries of other shards: {sorted(foreign)}")
+        indexed = {entry['code'] for entry in manifest['index']}
+        missing = owned - indexed
+        if missing:
+            raise ValueError(f"shard {shard} is missing countries: {sorted(missing)}")
+        unwritten = [c for c in owned if not (data_dir / c.lower() / 'airports.json').exists()]
+        if unwritten:
+            raise ValueError(f"shard {shard} did not write countries: {sorted(unwritten)}")
+        entries.extend(entry for entry in manifest['index'] if entry['code'] in owned)
+
+    if len(sources) > 1:
+        raise ValueError("shards were run on different source data")
+    entries.sort(key=lambda entry: entry['name'])
+    return entries
+
+
+def remove_shard_manifests(shard_dir: Path, count: int) -> None:
+    for number in range(1, count + 1):
+        manifest_path(shard_dir, Shard(number, count)).unlink(missing_ok=True)
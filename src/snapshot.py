@@ -0,0 +1,196 @@
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # the snapshot is optional, the JSON files are always written
+    pa = None
+    pq = None
+
+from .export import (
+    airport_position, merge_write_stats, new_write_stats, to_flag, to_number, write_if_changed,
+)
+from .reader import iter_country_records
+
+
+# Column types: 'str', 'float', 'int' or 'bool'
+AIRPORT_COLUMNS = [
+    ('ident', 'str'), ('type', 'str'), ('name', 'str'), ('elevation_ft', 'float'),
+    ('continent', 'str'), ('iso_country', 'str'), ('iso_region', 'str'),
+    ('municipality', 'str'), ('gps_code', 'str'), ('iata_code', 'str'),
+    ('icao_code', 'str'), ('local_code', 'str'), ('scheduled_service', 'str'),
+    ('latitude_deg', 'float'), ('longitude_deg', 'float'), ('metar_available', 'bool'),
+    ('nearest_metar_ident', 'str'), ('nearest_metar_km', 'float'),
+]
+RUNWAY_COLUMNS = [
+    ('airport_ident', 'str'), ('id', 'int'), ('length_ft', 'float'), ('width_ft', 'float'),
+    ('surface', 'str'), ('lighted', 'bool'), ('closed', 'bool'),
+] + [
+    (f'{end}_{field}', kind)
+    for end in ('le', 'he')
+    for field, kind in (
+        ('ident', 'str'), ('latitude_deg', 'float'), ('longitude_deg', 'float'),
+        ('elevation_ft', 'float'), ('heading_degT', 'float'), ('displaced_threshold_ft', 'float'),
+    )
+]
+NAVAID_COLUMNS = [
+    ('airport_ident', 'str'), ('id', 'int'), ('ident', 'str'), ('name', 'str'),
+    ('type', 'str'), ('frequency_khz', 'float'), ('latitude_deg', 'float'),
+    ('longitude_deg', 'float'), ('elevation_ft', 'float'), ('iso_country', 'str'),
+    ('dme_frequency_khz', 'float'), ('dme_channel', 'str'), ('dme_latitude_deg', 'float'),
+    ('dme_longitude_deg', 'float'), ('dme_elevation_ft', 'float'),
+    ('slaved_variation_deg', 'float'), ('magnetic_variation_deg', 'float'),
+    ('usageType', 'str'), ('power', 'str'), ('associated_airport', 'str'),
+]
+FREQUENCY_COLUMNS = [
+    ('airport_ident', 'str'), ('id', 'int'), ('type', 'str'), ('description', 'str'),
+    ('frequency_mhz', 'float'),
+]
+TABLES = {
+    'airports': AIRPORT_COLUMNS,
+    'runways': RUNWAY_COLUMNS,
+    'navaids': NAVAID_COLUMNS,
+    'frequencies': FREQUENCY_COLUMNS,
+}
+# Nested lists of an airport record feeding each child table
+CHILD_KEYS = {'runways': 'runways', 'navaids': 'navaids', 'frequencies': 'freqs'}
+
+
+def available() -> bool:
+    """Whether pyarrow is installed"""
+    return pa is not None
+
+
+def _convert(value: Any, kind: str) -> Any:
+    if kind == 'str':
+        if value is None or value == '':
+            return None
+        return value if isinstance(value, str) else str(value)
+    if kind == 'bool':
+        value = to_flag(value)
+        return value if isinstance(value, bool) else None
+    value = to_number(value)
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    if kind == 'int':
+        return int(value) if float(value).is_integer() else None
+    return float(value)
+
+
+def _schema(columns: Sequence[Tuple[str, str]]) -> 'pa.Schema':
+    types = {'str': pa.string(), 'float': pa.float64(), 'int': pa.int64(), 'bool': pa.bool_()}
+    return pa.schema([(name, types[kind]) for name, kind in columns])
+
+
+def _flat_airport(airport: Mapping[str, Any]) -> Dict:
+    lat, lon = airport_position(airport)
+    nearest = airport.get('nearest_metar') or {}
+    return {
+        **airport,
+        'latitude_deg': lat,
+        'longitude_deg': lon,
+        'nearest_metar_ident': nearest.get('ident'),
+        'nearest_metar_km': nearest.get('distance_km'),
+    }
+
+
+class SnapshotBuilder:
+    """Accumulate airport records into the columns of the snapshot tables"""
+
+    def __init__(self):
+        self.columns = {
+            table: {name: [] for name, _ in columns} for table, columns in TABLES.items()
+        }
+
+    def _append(self, table: str, record: Dict) -> None:
+        for name, kind in TABLES[table]:
+            self.columns[table][name].append(_convert(record.get(name), kind))
+
+    def add(self, airport: Mapping[str, Any]) -> None:
+        ident = airport.get('ident')
+        if not ident:
+            return
+        self._append('airports', _flat_airport(airport))
+        for table, key in CHILD_KEYS.items():
+            for child in airport.get(key) or []:
+                self._append(table, {**child, 'airport_ident': ident})
+
+    def tables(self) -> Dict[str, 'pa.Table']:
+        return {
+            table: pa.table(self.columns[table], schema=_schema(columns))
+            for table, columns in TABLES.items()
+        }
+
+
+def build_tables(airports: Iterable[Mapping[str, Any]]) -> Dict[str, 'pa.Table']:
+    """Normalize airport records into the airports, runways, navaids and frequencies tables"""
+    builder = SnapshotBuilder()
+    for airport in airports:
+        builder.add(airport)
+    return builder.tables()
+
+
+def write_snapshot(snapshot_dir: Path, airports: Iterable[Mapping[str, Any]]) -> Dict[str, int]:
+    """Write <table>.parquet files, leaving unchanged files untouched.
+
+    Returns the write statistics.
+    """
+    stats = new_write_stats()
+    snapshot_dir.mkdir(exist_ok=True, parents=True)
+    for table, data in build_tables(airports).items():
+        sink = pa.BufferOutputStream()
+        pq.write_table(data, sink, compression='zstd')
+        file_stats = new_write_stats()
+        write_if_changed(snapshot_dir / f'{table}.parquet', sink.getvalue().to_pybytes(), file_stats)
+        merge_write_stats(stats, file_stats)
+    return stats
+
+
+def write_data_dir_snapshot(data_dir: Path, snapshot_dir: Path) -> Dict[str, int]:
+    """Snapshot every airport of a generated data/ tree"""
+    return write_snapshot(snapshot_dir, (airport for _, _, airport in iter_country_records(data_dir)))
+
+
+def read_table(snapshot_dir: Path, table: str, columns: Optional[List[str]] = None,
+               filters: Optional[List[Tuple]] = None) -> 'pa.Table':
+    """Read a snapshot table memory-mapped, with column projection and row filters.
+
+    filters use the pyarrow.parquet syntax, e.g. [('iso_country', '=', 'FR')].
+    """
+    return pq.read_table(
+        snapshot_dir / f'{table}.parquet', columns=columns, filters=filters, memory_map=True,
+    )
+
+
+def metar_stations(snapshot_dir: Path, exclude_countries: Iterable[str] = (),
+                   countries: Optional[Iterable[str]] = None
+                   ) -> Optional[Tuple[List[str], List[float], List[float]]]:
+    """Idents and positions of the airports reporting METAR, None without a snapshot.
+
+    Only the stations of countries are kept, all of them when None.
+    """
+    if pa is None or not (snapshot_dir / 'airports.parquet').exists():
+        return None
+    try:
+        table = read_table(
+            snapshot_dir, 'airports',
+            columns=['ident', 'iso_country', 'latitude_deg', 'longitude_deg'],
+            filters=[('metar_available', '=', True)],
+        )
+    except (OSError, ValueError, pa.ArrowException):
+        return None
+    exclude = set(exclude_countries)
+    include = None if countries is None else set(countries)
+    stations = table.to_pydict()
+    keep = [
+        i for i, country in enumerate(stations['iso_country'])
+        if country not in exclude and (include is None or country in include)
+        and stations['latitude_deg'][i] is not None
+        and stations['longitude_deg'][i] is not None
+    ]
+    return (
+        [stations['ident'][i] for i in keep],
+        [stations['latitude_deg'][i] for i in keep],
+        [stations['longitude_deg'][i] for i in keep],
+    )
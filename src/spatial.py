@@ -0,0 +1,352 @@
+import argparse
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+import numpy.typing as npt
+
+from .export import airport_position
+from .reader import data_signature, iter_country_records
+
+
+EARTH_RADIUS_KM = 6371.0088
+# Side of a grid cell, in degrees
+DEFAULT_CELL_DEG = 1.0
+INDEX_VERSION = 1
+DEFAULT_INDEX_PATH = Path(__file__).parent.parent / '.cache' / 'spatial.npz'
+# Point/reference pairs compared per block by nearest_points
+DEFAULT_BLOCK_SIZE = 4_000_000
+
+# metar_available encoded as int8
+METAR_UNKNOWN = -1
+METAR_FALSE = 0
+METAR_TRUE = 1
+
+
+class Neighbor(NamedTuple):
+    """An airport returned by a spatial query"""
+    ident: str
+    distance_km: float
+    latitude: float
+    longitude: float
+    type: str
+    iso_country: str
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in km, broadcasting over NumPy arrays (degrees)"""
+    lat1, lon1, lat2, lon2 = (np.radians(v) for v in (lat1, lon1, lat2, lon2))
+    a = (np.sin((lat2 - lat1) / 2) ** 2
+         + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def _unit_vectors(lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+    lat, lon = np.radians(lat), np.radians(lon)
+    cos_lat = np.cos(lat)
+    return np.column_stack([cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)])
+
+
+def nearest_points(lat: npt.ArrayLike, lon: npt.ArrayLike, ref_lat: npt.ArrayLike,
+                   ref_lon: npt.ArrayLike, block_size: int = DEFAULT_BLOCK_SIZE) -> Tuple[np.ndarray, np.ndarray]:
+    """Index of and distance in km to the nearest reference of every point.
+
+    On the unit sphere the nearest reference has the largest dot product,
+    so each block of points is matched with a single matrix product. Blocks
+    keep the pairwise matrix under block_size entries.
+    """
+    lat, lon = np.asarray(lat, dtype=np.float64), np.asarray(lon, dtype=np.float64)
+    ref_lat, ref_lon = np.asarray(ref_lat, dtype=np.float64), np.asarray(ref_lon, dtype=np.float64)
+    if not len(ref_lat):
+        raise ValueError("no reference points")
+    points = _unit_vectors(lat, lon)
+    refs = _unit_vectors(ref_lat, ref_lon).T
+    nearest = np.empty(len(lat), dtype=np.int64)
+    rows = max(1, block_size // len(ref_lat))
+    for start in range(0, len(lat), rows):
+        nearest[start:start + rows] = np.argmax(points[start:start + rows] @ refs, axis=1)
+    # Exact distances from the haversine formula rather than the dot product
+    return nearest, haversine_km(lat, lon, ref_lat[nearest], ref_lon[nearest])
+
+
+def _encode_metar(value) -> int:
+    if value is True:
+        return METAR_TRUE
+    if value is False:
+        return METAR_FALSE
+    return METAR_UNKNOWN
+
+
+class SpatialIndex:
+    """Uniform lat/lon grid over airports, queried with haversine distances.
+
+    Points are stored sorted by grid cell, with the offset of every cell, so
+    the candidates of a query are a few contiguous slices per grid row.
+    Distances and filters are then computed on those slices with NumPy.
+    """
+
+    def __init__(self, idents: np.ndarray, lat: np.ndarray, lon: np.ndarray,
+                 type_codes: np.ndarray, type_names: Sequence[str],
+                 metar: np.ndarray, countries: np.ndarray,
+                 cell_deg: float = DEFAULT_CELL_DEG,
+                 offsets: Optional[np.ndarray] = None):
+        self.cell_deg = float(cell_deg)
+        self.rows = int(np.ceil(180 / self.cell_deg))
+        self.cols = int(np.ceil(360 / self.cell_deg))
+        self.type_names = list(type_names)
+
+        if offsets is None:
+            # Sort the points by cell and record where each cell starts
+            order = np.argsort(self._cells(lat, lon), kind='stable')
+            idents, lat, lon = idents[order], lat[order], lon[order]
+            type_codes, metar, countries = type_codes[order], metar[order], countries[order]
+            cells = self._cells(lat, lon)
+            offsets = np.searchsorted(cells, np.arange(self.rows * self.cols + 1))
+
+        self.idents = idents
+        self.lat = lat
+        self.lon = lon
+        self.type_codes = type_codes
+        self.metar = metar
+        self.countries = countries
+        self.offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self.idents)
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict],
+                     cell_deg: float = DEFAULT_CELL_DEG) -> 'SpatialIndex':
+        """Index airport records; records without a position are skipped"""
+        idents, lats, lons, types, metar, countries = [], [], [], [], [], []
+        for airport in records:
+            lat, lon = airport_position(airport)
+            if lat is None or not airport.get('ident'):
+                continue
+            idents.append(airport['ident'])
+            lats.append(lat)
+            lons.append(lon)
+            types.append(airport.get('type') or '')
+            metar.append(_encode_metar(airport.get('metar_available')))
+            countries.append(airport.get('iso_country') or '')
+
+        type_names = sorted(set(types))
+        lookup = {name: code for code, name in enumerate(type_names)}
+        return cls(
+            np.array(idents, dtype=str),
+            np.array(lats, dtype=np.float64),
+            np.array(lons, dtype=np.float64),
+            np.array([lookup[t] for t in types], dtype=np.int16),
+            type_names,
+            np.array(metar, dtype=np.int8),
+            np.array(countries, dtype=str),
+            cell_deg=cell_deg,
+        )
+
+    @classmethod
+    def from_data_dir(cls, data_dir: Path, cell_deg: float = DEFAULT_CELL_DEG) -> 'SpatialIndex':
+        """Index every airport of a generated data/ tree"""
+        airports = (airport for _, _, airport in iter_country_records(data_dir))
+        return cls.from_records(airports, cell_deg=cell_deg)
+
+    def save(self, path: Path, signature: str = '') -> None:
+        """Persist the index as an uncompressed .npz file.
+
+        signature identifies the data the index was built from (see
+        reader.data_signature).
+        """
+        path.parent.mkdir(exist_ok=True, parents=True)
+        with open(path, 'wb') as f:
+            np.savez(
+                f,
+                version=np.array(INDEX_VERSION),
+                signature=np.array(signature),
+                cell_deg=np.array(self.cell_deg),
+                idents=self.idents,
+                lat=self.lat,
+                lon=self.lon,
+                type_codes=self.type_codes,
+                type_names=np.array(self.type_names, dtype=str),
+                metar=self.metar,
+                countries=self.countries,
+                offsets=self.offsets,
+            )
+
+    @classmethod
+    def load(cls, path: Path, signature: Optional[str] = None) -> Optional['SpatialIndex']:
+        """Load a saved index, or None if missing, from another version or,
+        when signature is given, built from other data"""
+        try:
+            with np.load(path, allow_pickle=False) as saved:
+                if int(saved['version']) != INDEX_VERSION:
+                    return None
+                if signature is not None and str(saved['signature']) != signature:
+                    return None
+                arrays = {name: saved[name] for name in saved.files}
+        except (OSError, ValueError, KeyError):
+            return None
+        return cls(
+            arrays['idents'], arrays['lat'], arrays['lon'],
+            arrays['type_codes'], arrays['type_names'].tolist(),
+            arrays['metar'], arrays['countries'],
+            cell_deg=float(arrays['cell_deg']),
+            offsets=arrays['offsets'],
+        )
+
+    def _cells(self, lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+        row = np.clip(((lat + 90) // self.cell_deg).astype(np.int64), 0, self.rows - 1)
+        col = ((lon + 180) // self.cell_deg).astype(np.int64) % self.cols
+        return row * self.cols + col
+
+    def _candidates(self, lat: float, lon: float, radius_km: float) -> np.ndarray:
+        """Indices of the points in the cells overlapping a query circle"""
+        angle = radius_km / EARTH_RADIUS_KM
+        if angle >= np.pi:
+            return np.arange(len(self))
+        lat_min = lat - np.degrees(angle)
+        lat_max = lat + np.degrees(angle)
+        if lat_min <= -90 or lat_max >= 90:
+            # The circle covers a pole: every longitude
+            lon_span = 180.0
+        else:
+            # Longitude half-width of the circle's bounding box
+            lon_span = np.degrees(np.arcsin(min(1.0, np.sin(angle) / np.cos(np.radians(lat)))))
+
+        row_lo = max(0, int((max(lat_min, -90) + 90) // self.cell_deg))
+        row_hi = min(self.rows - 1, int((min(lat_max, 90) + 90) // self.cell_deg))
+        if lon_span >= 180:
+            col_ranges = [(0, self.cols - 1)]
+        else:
+            col_lo = int((lon - lon_span + 180) // self.cell_deg)
+            col_hi = int((lon + lon_span + 180) // self.cell_deg)
+            if col_hi - col_lo + 1 >= self.cols:
+                col_ranges = [(0, self.cols - 1)]
+            elif col_lo < 0:
+                col_ranges = [(0, col_hi), (col_lo % self.cols, self.cols - 1)]
+            elif col_hi >= self.cols:
+                col_ranges = [(col_lo, self.cols - 1), (0, col_hi % self.cols)]
+            else:
+                col_ranges = [(col_lo, col_hi)]
+
+        slices = []
+        for row in range(row_lo, row_hi + 1):
+            base = row * self.cols
+            for lo, hi in col_ranges:
+                start, stop = self.offsets[base + lo], self.offsets[base + hi + 1]
+                if stop > start:
+                    slices.append(np.arange(start, stop))
+        if not slices:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate(slices)
+
+    def _filter(self, indices: np.ndarray, types: Optional[Iterable[str]],
+                metar_available: Optional[bool]) -> np.ndarray:
+        if types is not None:
+            types = set(types)
+            codes = [code for code, name in enumerate(self.type_names) if name in types]
+            indices = indices[np.isin(self.type_codes[indices], codes)]
+        if metar_available is not None:
+            wanted = METAR_TRUE if metar_available else METAR_FALSE
+            indices = indices[self.metar[indices] == wanted]
+        return indices
+
+    def _neighbors(self, indices: np.ndarray, distances: np.ndarray) -> List[Neighbor]:
+        return [
+            Neighbor(
+                str(self.idents[i]), float(d), float(self.lat[i]), float(self.lon[i]),
+                self.type_names[self.type_codes[i]], str(self.countries[i]),
+            )
+            for i, d in zip(indices, distances)
+        ]
+
+    def within(self, lat: float, lon: float, radius_km: float,
+               types: Optional[Iterable[str]] = None,
+               metar_available: Optional[bool] = None) -> List[Neighbor]:
+        """Airports within radius_km of a point, nearest first"""
+        indices = self._filter(self._candidates(lat, lon, radius_km), types, metar_available)
+        distances = haversine_km(lat, lon, self.lat[indices], self.lon[indices])
+        keep = distances <= radius_km
+        indices, distances = indices[keep], distances[keep]
+        order = np.argsort(distances, kind='stable')
+        return self._neighbors(indices[order], distances[order])
+
+    def nearest(self, lat: float, lon: float, k: int = 1,
+                types: Optional[Iterable[str]] = None,
+                metar_available: Optional[bool] = None,
+                max_distance_km: Optional[float] = None) -> List[Neighbor]:
+        """The k airports nearest to a point, nearest first.
+
+        The search radius starts at one grid cell and doubles until k
+        matches lie within it, so the result is exact.
+        """
+        limit = np.pi * EARTH_RADIUS_KM if max_distance_km is None else max_distance_km
+        radius = min(limit, self.cell_deg * 111.2)
+        while True:
+            indices = self._filter(self._candidates(lat, lon, radius), types, metar_available)
+            distances = haversine_km(lat, lon, self.lat[indices], self.lon[indices])
+            keep = distances <= radius
+            if keep.sum() >= k or radius >= limit:
+                indices, distances = indices[keep], distances[keep]
+                if len(distances) > k:
+                    top = np.argpartition(distances, k - 1)[:k]
+                    indices, distances = indices[top], distances[top]
+                order = np.argsort(distances, kind='stable')
+                return self._neighbors(indices[order], distances[order])
+            radius = min(limit, radius * 2)
+
+    def position(self, ident: str) -> Optional[Tuple[float, float]]:
+        """Latitude and longitude of an indexed airport"""
+        match = np.flatnonzero(self.idents == ident)
+        if not len(match):
+            return None
+        return float(self.lat[match[0]]), float(self.lon[match[0]])
+
+
+def load_or_build(data_dir: Path, index_path: Path = DEFAULT_INDEX_PATH,
+                  rebuild: bool = False) -> SpatialIndex:
+    """Load the persisted index, building and saving it if missing or stale.
+
+    The index is rebuilt when the files of data_dir changed since it was saved.
+    """
+    signature = data_signature(data_dir)
+    index = None if rebuild else SpatialIndex.load(index_path, signature)
+    if index is None:
+        index = SpatialIndex.from_data_dir(data_dir)
+        index.save(index_path, signature)
+    return index
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Query airports near a point or another airport")
+    parser.add_argument('target', nargs='+', help="airport ident, or latitude and longitude")
+    parser.add_argument('-k', type=int, default=5, help="number of airports to return")
+    parser.add_argument('--radius', type=float, help="return every airport within this many km")
+    parser.add_argument('--types', help="comma-separated airport types")
+    parser.add_argument('--metar', action='store_true', help="only airports with METAR reports")
+    parser.add_argument('--data', type=Path, default=Path(__file__).parent.parent / 'data')
+    parser.add_argument('--index', type=Path, default=DEFAULT_INDEX_PATH)
+    parser.add_argument('--rebuild', action='store_true', help="rebuild the index from --data")
+    args = parser.parse_args(argv)
+
+    index = load_or_build(args.data, args.index, rebuild=args.rebuild)
+    if len(args.target) == 2:
+        lat, lon = (float(value) for value in args.target)
+    else:
+        position = index.position(args.target[0].upper())
+        if position is None:
+            parser.error(f"unknown airport {args.target[0]}")
+        lat, lon = position
+
+    types = args.types.split(',') if args.types else None
+    metar = True if args.metar else None
+    if args.radius is not None:
+        results = index.within(lat, lon, args.radius, types=types, metar_available=metar)
+    else:
+        results = index.nearest(lat, lon, args.k, types=types, metar_available=metar)
+    for neighbor in results:
+        print(f"{neighbor.ident:<8} {neighbor.distance_km:9.1f} km  "
+              f"{neighbor.iso_country:<3} {neighbor.type}")
+
+
+if __name__ == '__main__':
+    main()
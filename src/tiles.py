@@ -0,0 +1,228 @@
+import json
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Mapping, NamedTuple, Optional, Set, Tuple
+
+import numpy as np
+
+from .export import (
+    DETAILS_CHUNK_SIZE, airport_position, dumps_compact, new_write_stats, remove_stale,
+    write_if_changed,
+)
+from .reader import iter_country_records
+
+
+TILES_VERSION = 1
+# Zoom of the tiles holding individual markers; lower zooms hold clusters
+DEFAULT_MAX_ZOOM = 7
+# Clusters per tile side: a tile of zoom z is split into the cells of zoom
+# z + CLUSTER_BITS, 32 pixels wide on 256 pixel map tiles
+CLUSTER_BITS = 3
+# Latitude limit of the web mercator projection
+MAX_LATITUDE = 85.0511287798
+INDEX_NAME = 'index.json'
+
+
+class TilePoints(NamedTuple):
+    """Airports with a position, in data directory order"""
+    ident: List[Optional[str]]
+    lat: np.ndarray
+    lon: np.ndarray
+    type: List[Optional[str]]
+    country: List[str]
+    # Position of the airport in its country file, locating its details chunk
+    position: np.ndarray
+
+
+def mercator(lat, lon) -> Tuple[np.ndarray, np.ndarray]:
+    """Web mercator position in [0, 1) of points in degrees, y growing southwards"""
+    lat = np.clip(np.asarray(lat, dtype=np.float64), -MAX_LATITUDE, MAX_LATITUDE)
+    lon = np.asarray(lon, dtype=np.float64)
+    x = (lon + 180.0) / 360.0
+    sin = np.sin(np.radians(lat))
+    y = 0.5 - np.log((1 + sin) / (1 - sin)) / (4 * np.pi)
+    limit = np.nextafter(1.0, 0.0)
+    return np.clip(x, 0.0, limit), np.clip(y, 0.0, limit)
+
+
+def tile_of(lat: float, lon: float, zoom: int) -> Tuple[int, int]:
+    """x and y of the slippy map tile of zoom holding a point"""
+    x, y = mercator([lat], [lon])
+    scale = 1 << zoom
+    return int(x[0] * scale), int(y[0] * scale)
+
+
+def tile_path(tiles_dir: Path, zoom: int, x: int, y: int) -> Path:
+    return tiles_dir / str(zoom) / str(x) / f'{y}.json'
+
+
+def points_from_records(records: Iterable[Tuple[str, int, Mapping[str, Any]]]) -> TilePoints:
+    """Tile points of (country, position, airport) tuples; airports without a position are skipped"""
+    idents, lats, lons, types, countries, indices = [], [], [], [], [], []
+    for country, position, airport in records:
+        lat, lon = airport_position(airport)
+        if lat is None:
+            continue
+        idents.append(airport.get('ident'))
+        lats.append(lat)
+        lons.append(lon)
+        types.append(airport.get('type'))
+        countries.append(country)
+        indices.append(position)
+    return TilePoints(
+        idents, np.array(lats, dtype=np.float64), np.array(lons, dtype=np.float64),
+        types, countries, np.array(indices, dtype=np.int64),
+    )
+
+
+def load_points(data_dir: Path) -> TilePoints:
+    """Airports of every data/<cc>/airports.json file; those without a position are skipped"""
+    return points_from_records(iter_country_records(data_dir))
+
+
+def _cell_keys(x: np.ndarray, y: np.ndarray, zoom: int) -> np.ndarray:
+    """Single int64 key per cell of zoom: x in the high bits, y in the low ones"""
+    scale = 1 << zoom
+    return ((x * scale).astype(np.int64) << 32) | (y * scale).astype(np.int64)
+
+
+def build_clusters(points: TilePoints, max_zoom: int = DEFAULT_MAX_ZOOM
+                   ) -> Dict[int, Dict[Tuple[int, int], Dict[str, List]]]:
+    """Cluster centroids and counts of every tile of zooms 0 to max_zoom - 1.
+
+    Points are counted and summed per cell of the finest cluster zoom, then
+    each level of the quadtree is built from the one below by merging the
+    four children of every cell. Centroids are the mean of the positions.
+    Returns the cluster columns keyed by zoom and tile.
+    """
+    pyramid: Dict[int, Dict[Tuple[int, int], Dict[str, List]]] = {}
+    if max_zoom < 1 or not len(points.lat):
+        return pyramid
+    x, y = mercator(points.lat, points.lon)
+    level = max_zoom - 1 + CLUSTER_BITS
+    keys, inverse = np.unique(_cell_keys(x, y, level), return_inverse=True)
+    counts = np.bincount(inverse).astype(np.int64)
+    lat_sums = np.bincount(inverse, weights=points.lat)
+    lon_sums = np.bincount(inverse, weights=points.lon)
+
+    for zoom in range(max_zoom - 1, -1, -1):
+        if zoom < max_zoom - 1:
+            # Parent cells of the level below
+            cell_x, cell_y = keys >> 33, (keys & 0xFFFFFFFF) >> 1
+            keys, inverse = np.unique((cell_x << 32) | cell_y, return_inverse=True)
+            counts = np.bincount(inverse, weights=counts).astype(np.int64)
+            lat_sums = np.bincount(inverse, weights=lat_sums)
+            lon_sums = np.bincount(inverse, weights=lon_sums)
+
+        tiles: Dict[Tuple[int, int], Dict[str, List]] = {}
+        tile_x = (keys >> 32) >> CLUSTER_BITS
+        tile_y = (keys & 0xFFFFFFFF) >> CLUSTER_BITS
+        lat = np.round(lat_sums / counts, 4)
+        lon = np.round(lon_sums / counts, 4)
+        for i in range(len(keys)):
+            clusters = tiles.setdefault((int(tile_x[i]), int(tile_y[i])),
+                                        {'lat': [], 'lon': [], 'count': []})
+            clusters['lat'].append(float(lat[i]))
+            clusters['lon'].append(float(lon[i]))
+            clusters['count'].append(int(counts[i]))
+        pyramid[zoom] = tiles
+    return pyramid
+
+
+def build_leaves(points: TilePoints, max_zoom: int = DEFAULT_MAX_ZOOM
+                 ) -> Dict[Tuple[int, int], Dict[str, List]]:
+    """Compact marker columns of every tile of max_zoom holding airports"""
+    leaves: Dict[Tuple[int, int], Dict[str, List]] = {}
+    if not len(points.lat):
+        return leaves
+    x, y = mercator(points.lat, points.lon)
+    keys = _cell_keys(x, y, max_zoom)
+    # Stable: markers of a tile keep the data directory order
+    order = np.argsort(keys, kind='stable')
+    for i in order:
+        key = int(keys[i])
+        markers = leaves.setdefault((key >> 32, key & 0xFFFFFFFF), {
+            'ident': [], 'lat': [], 'lon': [], 'type': [], 'country': [], 'index': [],
+        })
+        markers['ident'].append(points.ident[i])
+        markers['lat'].append(round(float(points.lat[i]), 6))
+        markers['lon'].append(round(float(points.lon[i]), 6))
+        markers['type'].append(points.type[i])
+        markers['country'].append(points.country[i])
+        markers['index'].append(int(points.position[i]))
+    return leaves
+
+
+def _remove_stale(tiles_dir: Path, written: Set[Path]) -> int:
+    """Delete the tiles of a previous run that hold no airport anymore"""
+    return sum(
+        remove_stale(zoom_dir, written, '*/*.json')
+        for zoom_dir in tiles_dir.iterdir()
+        if zoom_dir.is_dir() and zoom_dir.name.isdigit()
+    )
+
+
+def write_tiles(tiles_dir: Path, points: TilePoints,
+                max_zoom: int = DEFAULT_MAX_ZOOM) -> Dict[str, int]:
+    """Write the tile pyramid of points, leaving unchanged tiles untouched.
+
+    Tiles are written to <z>/<x>/<y>.json: clusters below max_zoom and
+    markers at max_zoom, only for tiles holding airports. index.json
+    describes the pyramid. Returns the write statistics, with the number
+    of stale tiles removed.
+    """
+    stats = new_write_stats()
+    written: Set[Path] = set()
+
+    def write(zoom: int, x: int, y: int, key: str, columns: Dict[str, List]) -> None:
+        path = tile_path(tiles_dir, zoom, x, y)
+        path.parent.mkdir(exist_ok=True, parents=True)
+        write_if_changed(path, dumps_compact({'z': zoom, 'x': x, 'y': y, key: columns}), stats)
+        written.add(path)
+
+    tile_counts = {}
+    for zoom, tiles in sorted(build_clusters(points, max_zoom).items()):
+        for (x, y), clusters in sorted(tiles.items()):
+            write(zoom, x, y, 'clusters', clusters)
+        tile_counts[str(zoom)] = len(tiles)
+    leaves = build_leaves(points, max_zoom)
+    for (x, y), markers in sorted(leaves.items()):
+        write(max_zoom, x, y, 'markers', markers)
+    tile_counts[str(max_zoom)] = len(leaves)
+
+    index = {
+        'version': TILES_VERSION,
+        'max_zoom': max_zoom,
+        'cluster_bits': CLUSTER_BITS,
+        'details_chunk_size': DETAILS_CHUNK_SIZE,
+        'total_airports': len(points.lat),
+        'tiles': tile_counts,
+    }
+    tiles_dir.mkdir(exist_ok=True, parents=True)
+    write_if_changed(tiles_dir / INDEX_NAME, dumps_compact(index), stats)
+    stats['removed'] = _remove_stale(tiles_dir, written)
+    return stats
+
+
+def write_data_dir_tiles(data_dir: Path, tiles_dir: Path,
+                         max_zoom: int = DEFAULT_MAX_ZOOM) -> Dict[str, int]:
+    """Write the tile pyramid of every airport in the data directory"""
+    return write_tiles(tiles_dir, load_points(data_dir), max_zoom)
+
+
+def read_tile(tiles_dir: Path, zoom: int, x: int, y: int) -> Optional[Dict]:
+    """Content of a tile, None when it holds no airport"""
+    try:
+        with open(tile_path(tiles_dir, zoom, x, y), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except OSError:
+        return None
+
+
+def tiles_in_view(south: float, west: float, north: float, east: float,
+                  zoom: int) -> Iterable[Tuple[int, int]]:
+    """Tiles of zoom covering a bounding box, as the map fetches them"""
+    x0, y0 = tile_of(north, west, zoom)
+    x1, y1 = tile_of(south, east, zoom)
+    for x in range(x0, x1 + 1):
+        for y in range(y0, y1 + 1):
+            yield x, y
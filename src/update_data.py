@@ -1,15 +1,55 @@
+import argparse
+import hashlib
 import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import (
+    FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait,
+)
+from datetime import datetime
+from urllib.parse import urlparse
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - not available on Windows
+    resource = None
 
-import pandas as pd
-from io import StringIO
 import json
-import requests
 from pathlib import Path
-from tqdm import tqdm
-from typing import Dict, List, Optional
-from dotenv import load_dotenv
+from typing import (
+    TYPE_CHECKING, AbstractSet, Any, Dict, List, Mapping, MutableMapping, Optional, Set, Tuple,
+)
+
+from .cache import DEFAULT_MAX_ENTRIES, EnrichmentCache
+from .checkpoint import DEFAULT_CHECKPOINT_DIR, Checkpoint
+from .countries import COUNTRY_CONTINENTS_URL, COUNTRY_NAMES_URL, CountryMetadata
+from .export import (
+    airport_position, dumps_pretty, merge_write_stats, new_write_stats, save_country,
+    write_if_changed,
+)
+from .http_client import HttpClient, TokenBucket
+from .instrumentation import RunRecorder, profiled
+from .manifest import (
+    diff_rows, hash_rows, load_manifest, load_unresolved, save_manifest, scope_fingerprint,
+)
+from .models import Airport, to_airports
+from .scheduler import BudgetScheduler, Task
+from .reader import iter_countries, read_airports
+from .scope import EnrichmentScope
+from .shard import (
+    DEFAULT_SHARD_DIR, Shard, merge_shard_manifests, remove_shard_manifests, source_fingerprint,
+    write_shard_manifest,
+)
 
-load_dotenv()
+if TYPE_CHECKING:
+    # pandas, requests, tqdm and the NumPy/Arrow outputs are imported where
+    # they are used, so that importing this module stays fast
+    import pandas as pd
+    import requests
 
 
 AIRPORTDB_API = "https://airportdb.io/api/v1/airport/"
@@ -19,93 +59,723 @@ WESTERN_EUROPE = {
     "FR", "GB", "IE", "DE", "NL", "BE", "LU", "CH", "AT", "ES", "PT", "IT",
     "AD", "LI", "MC"
 }
+DEFAULT_SCOPE = EnrichmentScope(countries=WESTERN_EUROPE, types=PRIORITIZED_TYPES)
+# Source columns copied into each airport record
+AIRPORT_COLUMNS = [
+    'ident', 'type', 'name', 'elevation_ft', 'continent',
+    'iso_country', 'iso_region', 'municipality', 'gps_code',
+    'iata_code', 'local_code', 'coordinates'
+]
+# Maximum number of simultaneous requests sent to a single API host
+DEFAULT_MAX_PER_HOST = 4
+# Requests per second allowed to each API (aviationweather.gov asks for
+# at most 100 requests per minute)
+AIRPORTDB_RATE = 10.0
+METAR_RATE = 1.5
+# Number of station ids sent in a single METAR query
+METAR_BATCH_SIZE = 100
+# Fields of the previous country files used by airports that are not
+# enriched, and by the nearest METAR mapping
+EXISTING_FIELDS = ('runways', 'metar_available')
+STATION_FIELDS = ('metar_available', 'latitude_deg', 'longitude_deg', 'coordinates')
+MAPPING_FIELDS = STATION_FIELDS + ('nearest_metar',)
+# Fields of a previous record that come from AirportDB and are seeded into
+# the cache; the source columns and METAR fields are rebuilt on every run
+AIRPORTDB_FIELDS = (
+    'icao_code', 'scheduled_service', 'home_link', 'wikipedia_link', 'keywords',
+    'country', 'region', 'station', 'runways', 'freqs', 'navaids',
+)
+# Airports built, enriched and stored at a time by process_airports
+PROCESS_BATCH_SIZE = 5000
+# Processes writing the country files
+DEFAULT_SAVE_WORKERS = min(8, os.cpu_count() or 1)
+# Compact dtypes used when parsing the source CSV
+SOURCE_DTYPES = {
+    'type': 'category',
+    'iso_country': 'category',
+    'continent': 'category',
+    'elevation_ft': 'float32',
+}
+DOWNLOAD_CHUNK_SIZE = 1 << 20
+DEFAULT_CACHE_DIR = Path(__file__).parent.parent / '.cache'
+DEFAULT_CACHE_PATH = DEFAULT_CACHE_DIR / 'enrichment.sqlite'
+DEFAULT_MANIFEST_PATH = DEFAULT_CACHE_DIR / 'source_manifest.json'
+DEFAULT_SCHEDULER_STATE_PATH = DEFAULT_CACHE_DIR / 'scheduler_state.json'
+DEFAULT_REPORT_PATH = Path(__file__).parent.parent / 'run_report.json'
+# Seconds the end of a run waits for the country metadata refresh
+METADATA_REFRESH_TIMEOUT = 30.0
+
+
+def default_rate_limits(airportdb_rate: float = AIRPORTDB_RATE,
+                        metar_rate: float = METAR_RATE,
+                        airportdb_api: str = AIRPORTDB_API,
+                        metar_api: str = METAR_API) -> Dict[str, TokenBucket]:
+    """Token buckets of the enrichment APIs, keyed by host"""
+    return {
+        urlparse(airportdb_api).netloc: TokenBucket(airportdb_rate, capacity=max(1.0, airportdb_rate)),
+        urlparse(metar_api).netloc: TokenBucket(metar_rate, capacity=5),
+    }
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of the process in megabytes"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def previous_details(existing: Mapping[str, Any]) -> Dict[str, Any]:
+    """AirportDB and METAR fields of a previous record, without its source columns"""
+    return {
+        field: existing[field] for field in AIRPORTDB_FIELDS + ('metar_available',)
+        if field in existing
+    }
+
+
+def reporting_stations(airports) -> Dict[str, Tuple[float, float]]:
+    """Positions of the airports reporting METAR, keyed by ident"""
+    stations = {}
+    for airport in airports:
+        if airport.get('metar_available') is True and airport.get('ident'):
+            lat, lon = airport_position(airport)
+            if lat is not None and lon is not None:
+                stations[airport['ident']] = (lat, lon)
+    return stations
 
 
 class AirportDataUpdater:
-    def __init__(self, source_url: str, data_dir: Path):
+    def __init__(self, source_url: str, data_dir: Path,
+                 max_per_host: int = DEFAULT_MAX_PER_HOST,
+                 metar_batch_size: int = METAR_BATCH_SIZE,
+                 cache: Optional[EnrichmentCache] = None,
+                 manifest_path: Optional[Path] = None,
+                 incremental: bool = False,
+                 source_cache_dir: Optional[Path] = None,
+                 scope: Optional[EnrichmentScope] = None,
+                 scheduler: Optional[BudgetScheduler] = None,
+                 http: Optional[HttpClient] = None,
+                 compact_export: bool = True,
+                 save_workers: int = DEFAULT_SAVE_WORKERS,
+                 snapshot_dir: Optional[Path] = None,
+                 tiles_dir: Optional[Path] = None,
+                 search_dir: Optional[Path] = None,
+                 recorder: Optional[RunRecorder] = None,
+                 report_path: Optional[Path] = None,
+                 profile_path: Optional[Path] = None,
+                 checkpoint: Optional[Checkpoint] = None,
+                 resume: bool = False,
+                 shard: Optional[Shard] = None,
+                 shard_dir: Path = DEFAULT_SHARD_DIR,
+                 metadata: Optional[CountryMetadata] = None,
+                 refresh_metadata: bool = False):
         self.source_url = source_url
         self.data_dir = data_dir
-        self.countries_data: Dict[str, List[Dict]] = {}
+        self.countries_data: MutableMapping[str, List[Airport]] = {}
         self.total_airports = 0
         self.country_names = {}
         # Cache for airport details to avoid hitting the API repeatedly
         self._airport_cache: Dict[str, Dict] = {}
+        # Optional persistent cache shared across runs
+        self.cache = cache
         self.api_key = os.getenv("AIRPORTDB_API_KEY")
+        # API endpoints, overridden to run against local stubs
+        self.airportdb_api = AIRPORTDB_API
+        self.metar_api = METAR_API
+        self.country_names_url = COUNTRY_NAMES_URL
+        self.country_continents_url = COUNTRY_CONTINENTS_URL
+        # Local table of country names, optionally refreshed from country.io
+        # in the background for the next runs
+        self.metadata = metadata or CountryMetadata()
+        self.refresh_metadata = refresh_metadata
         # Track API usage statistics per country
         self.api_stats: Dict[str, Dict[str, int]] = {}
+        # Airport types per country, computed once from the source rows
+        self.types_distribution: Dict[str, Dict[str, int]] = {}
+        # Enrichment lookups run on a thread pool; the shared HTTP client
+        # pools connections and throttles requests per API host
+        self.max_per_host = max(1, max_per_host)
+        # Stage timings and request metrics, written to report_path as the
+        # run report at the end of update()
+        self.recorder = recorder or RunRecorder()
+        self.report_path = report_path
+        self.http = http or HttpClient(
+            max_per_host=self.max_per_host,
+            rate_limits=default_rate_limits(),
+        )
+        if self.http.recorder is None:
+            self.http.recorder = self.recorder
+        self.metar_batch_size = max(1, metar_batch_size)
+        # Row-hash manifest of the last processed source CSV. In incremental
+        # mode only the countries whose rows changed are rebuilt.
+        self.manifest_path = manifest_path
+        self.incremental = incremental
+        self.refreshed_countries: Optional[set] = None
+        # Countries gone from the source, their files deleted
+        self.removed_countries: Set[str] = set()
+        # Airports to process and enrich, and the per-run API call budget
+        self.scope = scope or DEFAULT_SCOPE
+        # Countries with source rows in the scope, the ones a full run maps
+        # and writes; set by update(), None when unknown
+        self.scope_countries: Optional[Set[str]] = None
+        self.scheduler = scheduler or BudgetScheduler()
+        # Directory keeping the last downloaded source CSV and its validators
+        self.source_cache_dir = source_cache_dir
+        # Idents whose source row was added or changed; their AirportDB
+        # details are refetched instead of reused
+        self.changed_idents: set = set()
+        # Also write the minified markers.json and details chunks for the map
+        self.compact_export = compact_export
+        # Processes serializing the country files, and what they wrote
+        self.save_workers = max(1, save_workers)
+        self.write_stats = new_write_stats()
+        # Directory of the Parquet snapshot of the whole dataset, None to skip it
+        self.snapshot_dir = snapshot_dir
+        self.snapshot_stats = new_write_stats()
+        # Directory of the map tile pyramid over the whole dataset, None to skip it
+        self.tiles_dir = tiles_dir
+        self.tile_stats = new_write_stats()
+        # Directory of the static search index files, None to skip them
+        self.search_dir = search_dir
+        self.search_stats = new_write_stats()
+        # File receiving the cProfile stats of process_airports, None to skip profiling
+        self.profile_path = profile_path
+        # Journal of enrichment results and processed countries. update()
+        # keeps the processed countries in its store rather than in memory,
+        # and with resume picks up the work of an interrupted run.
+        self.checkpoint = checkpoint
+        self.resume = resume
+        # Slice of the countries processed by this run. Shard runs write
+        # their country files and a manifest to shard_dir; merge_shards
+        # then builds countries.json, the tiles, the search index and the
+        # snapshot.
+        self.shard = shard
+        self.shard_dir = shard_dir
+        self.shard_countries: Set[str] = set()
+        self.shard_entries: List[Dict] = []
+        self.source_fingerprint: Optional[str] = None
 
     def load_country_names(self) -> None:
-        """Load country names from country.io"""
-        try:
-            print("Loading country names...")
-            response = requests.get("https://country.io/names.json")
-            response.raise_for_status()
-            self.country_names = response.json()
-            print(f"Loaded {len(self.country_names)} country names")
-        except Exception as e:
-            print(f"Warning: Could not load country names: {str(e)}")
-            self.country_names = {}
+        """Load country names from the local country metadata table"""
+        self.country_names = self.metadata.names()
+        print(
+            f"Loaded {len(self.country_names)} country names "
+            f"(metadata version {self.metadata.version})"
+        )
+
+    def start_metadata_refresh(self) -> Optional[threading.Thread]:
+        """Refresh the country metadata from country.io in the background, if enabled"""
+        if not self.refresh_metadata:
+            return None
+        return self.metadata.refresh_in_background(
+            self.http, self.country_names_url, self.country_continents_url
+        )
 
     def get_country_name(self, code: str) -> str:
         """Get full country name from code"""
         return self.country_names.get(code, code)
 
-    def download_source_data(self) -> Optional[pd.DataFrame]:
+    def _stream_to_file(self, response: 'requests.Response', path: Path) -> int:
+        """Write a streamed response body to path atomically, returning its size"""
+        size = 0
+        tmp_path = path.with_name(path.name + '.part')
+        with open(tmp_path, 'wb') as f:
+            for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                f.write(chunk)
+                size += len(chunk)
+        os.replace(tmp_path, path)
+        return size
+
+    def _fetch_source_csv(self, directory: Path) -> Path:
+        """Download the source CSV into directory unless the local copy is current.
+
+        The ETag and Last-Modified validators of the last download are sent
+        back, and a 304 response keeps the local copy.
+        """
+        csv_path = directory / 'airport-codes.csv'
+        meta_path = directory / 'airport-codes.meta.json'
+        headers = {}
+        if csv_path.exists() and meta_path.exists():
+            try:
+                with open(meta_path, 'r', encoding='utf-8') as f:
+                    meta = json.load(f)
+                if meta.get('url') == self.source_url:
+                    if meta.get('etag'):
+                        headers['If-None-Match'] = meta['etag']
+                    if meta.get('last_modified'):
+                        headers['If-Modified-Since'] = meta['last_modified']
+            except Exception:
+                headers = {}
+
+        with self.http.get(self.source_url, headers=headers, stream=True, timeout=60) as response:
+            if response.status_code == 304:
+                print("Source data not modified, using local copy")
+                return csv_path
+            response.raise_for_status()
+            size = self._stream_to_file(response, csv_path)
+            print(f"Downloaded {size / (1024 * 1024):.1f} MB")
+            with open(meta_path, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'url': self.source_url,
+                    'etag': response.headers.get('ETag'),
+                    'last_modified': response.headers.get('Last-Modified'),
+                }, f, indent=2)
+        return csv_path
+
+    @staticmethod
+    def _read_source_csv(path: Path) -> 'pd.DataFrame':
+        """Parse only the used columns of the source CSV with compact dtypes"""
+        import pandas as pd
+
+        wanted = set(AIRPORT_COLUMNS)
+        header = pd.read_csv(path, nrows=0).columns
+        dtypes = {col: dtype for col, dtype in SOURCE_DTYPES.items() if col in header}
+        # Only empty fields are missing: "NA" is Namibia's country code and
+        # North America's continent code
+        return pd.read_csv(
+            path, usecols=lambda col: col in wanted, dtype=dtypes,
+            keep_default_na=False, na_values=[''],
+        )
+
+    def download_source_data(self) -> Optional['pd.DataFrame']:
         try:
             print("Downloading airport data...")
-            response = requests.get(self.source_url)
-            response.raise_for_status()
-            df = pd.read_csv(StringIO(response.text))
+            started = time.perf_counter()
+            if self.source_cache_dir is not None:
+                self.source_cache_dir.mkdir(exist_ok=True, parents=True)
+                df = self._read_source_csv(self._fetch_source_csv(self.source_cache_dir))
+            else:
+                with tempfile.TemporaryDirectory() as tmp_dir:
+                    df = self._read_source_csv(self._fetch_source_csv(Path(tmp_dir)))
+            elapsed = time.perf_counter() - started
             self.total_airports = len(df)
-            print(f"Downloaded {self.total_airports} airports")
+            peak = peak_rss_mb()
+            print(
+                f"Downloaded {self.total_airports} airports in {elapsed:.1f}s"
+                + (f" (peak RSS {peak:.0f} MB)" if peak is not None else "")
+            )
             return df
         except Exception as e:
             print(f"Error downloading data: {str(e)}")
             return None
 
-    def fetch_airport_details(self, ident: str) -> Dict:
-        """Fetch additional airport information from airportdb.io"""
+    def fetch_airport_details(self, ident: str, refresh: bool = False) -> Optional[Dict]:
+        """Fetch additional airport information from airportdb.io
+
+        Returns an empty dict when AirportDB has no details for ident, and
+        None when the lookup failed and the details are unknown; only the
+        former is cached. With refresh, cached details are ignored and
+        replaced.
+        """
         if not self.api_key:
             return {}
-        if ident in self._airport_cache:
+        if ident in self._airport_cache and not refresh:
             return self._airport_cache[ident]
+        if self.cache is not None and not refresh:
+            cached = self.cache.get('airportdb', ident)
+            if cached is not None:
+                self._airport_cache[ident] = cached
+                return cached
         try:
             params = {"apiToken": self.api_key}
-            response = requests.get(f"{AIRPORTDB_API}{ident}", params=params, timeout=10)
-            response.raise_for_status()
-            data = response.json()
+            response = self.http.get(f"{self.airportdb_api}{ident}", params=params)
+            if response.status_code == 404:
+                data = {}
+            else:
+                response.raise_for_status()
+                data = response.json()
             if isinstance(data, dict):
                 self._airport_cache[ident] = data
+                if self.cache is not None:
+                    self.cache.set('airportdb', ident, data)
                 return data
         except Exception:
             pass
-        return {}
+        return None
+
+    def check_metar_available(self, ident: str) -> Optional[bool]:
+        """Check if METAR data is available for the airport, None if unknown"""
+        return self.check_metar_available_many([ident]).get(ident)
 
-    def check_metar_available(self, ident: str) -> bool:
-        """Check if METAR data is available for the airport"""
+    def _check_metar_batch(self, idents: List[str]) -> Dict[str, bool]:
+        """Query METAR availability for one chunk of station ids.
+
+        The API answers 204 with an empty body when none of the stations has
+        a report: they are all unavailable. Returns an empty dict when the
+        query fails, so that nothing is cached for stations whose
+        availability could not be determined.
+        """
+        results = {ident: False for ident in idents}
         try:
-            params = {"ids": ident, "format": "json"}
-            response = requests.get(METAR_API, params=params, timeout=10)
+            params = {"ids": ",".join(idents), "format": "json"}
+            response = self.http.get(self.metar_api, params=params)
             response.raise_for_status()
-            data = response.json()
+            if response.status_code == 204 or not response.content.strip():
+                data = []
+            else:
+                data = response.json()
             if isinstance(data, dict):
-                return bool(data)
+                data = [data]
             if isinstance(data, list):
-                return len(data) > 0
-            return False
+                wanted = {ident.upper(): ident for ident in idents}
+                for report in data:
+                    if not isinstance(report, dict):
+                        continue
+                    station = str(report.get('icaoId', '')).upper()
+                    if station in wanted:
+                        results[wanted[station]] = True
+            if self.cache is not None:
+                for ident, available in results.items():
+                    self.cache.set('metar', ident, available)
+            if self.checkpoint is not None:
+                self.checkpoint.record('metar', results)
+            return results
+        except Exception:
+            return {}
+
+    def check_metar_available_many(self, idents: List[str]) -> Dict[str, Optional[bool]]:
+        """Check METAR availability for many airports using multi-station queries.
+
+        Idents are deduplicated and sent in chunks of metar_batch_size; the
+        response is split back out per station. Stations of a failed query
+        are reported as None (unknown).
+        """
+        unique = list(dict.fromkeys(ident for ident in idents if ident))
+        results: Dict[str, Optional[bool]] = {}
+        if self.cache is not None:
+            for ident in unique:
+                cached = self.cache.get('metar', ident)
+                if cached is not None:
+                    results[ident] = cached
+            unique = [ident for ident in unique if ident not in results]
+        chunks = [
+            unique[i:i + self.metar_batch_size]
+            for i in range(0, len(unique), self.metar_batch_size)
+        ]
+        if len(chunks) <= 1:
+            for chunk in chunks:
+                results.update(self._check_metar_batch(chunk))
+        else:
+            with ThreadPoolExecutor(max_workers=min(len(chunks), self.max_per_host)) as executor:
+                for chunk_results in executor.map(self._check_metar_batch, chunks):
+                    results.update(chunk_results)
+        for ident in unique:
+            results.setdefault(ident, None)
+        return results
+
+    def _should_enrich(self, airport_data: Airport) -> bool:
+        """Whether an airport is in the AirportDB/METAR enrichment scope"""
+        return self.scope.contains(airport_data)
+
+    def _enrichable(self, df: 'pd.DataFrame') -> 'pd.DataFrame':
+        """Rows of the source data within the enrichment scope"""
+        return df[self.scope.mask(df)]
+
+    @staticmethod
+    def _build_records(frame: 'pd.DataFrame') -> List[Airport]:
+        """Build the base airport records of frame, one record per row.
+
+        Missing values are masked column by column and each column is
+        converted to Python objects once, elevation_ft being cast to float.
+        The records are filled from the columns, missing values being left
+        out of them.
+        """
+        columns = [col for col in AIRPORT_COLUMNS if col in frame.columns]
+        values = []
+        for col in columns:
+            series = frame[col]
+            if col == 'elevation_ft':
+                series = series.astype('float64')
+            values.append(series.astype(object).where(series.notna(), None).tolist())
+        return Airport.from_columns(dict(zip(columns, values)))
+
+    @staticmethod
+    def _count_types(frame: 'pd.DataFrame') -> Dict[str, Dict[str, int]]:
+        """Count airport types per country, in order of first appearance"""
+        types = frame['type'].astype(object).fillna('unknown')
+        sizes = types.groupby(frame['iso_country'], sort=False, observed=True).value_counts(sort=False)
+        distribution: Dict[str, Dict[str, int]] = {}
+        for (country, airport_type), count in sizes.items():
+            distribution.setdefault(country, {})[airport_type] = int(count)
+        return distribution
+
+    def _types_distribution(self, country_code: str, airports: List[Airport]) -> Dict[str, int]:
+        """Types distribution of a country, counted from its records if not known"""
+        if country_code in self.types_distribution:
+            return self.types_distribution[country_code]
+        types_count: Dict[str, int] = {}
+        for airport in airports:
+            airport_type = airport.get('type', 'unknown')
+            types_count[airport_type] = types_count.get(airport_type, 0) + 1
+        return types_count
+
+    def _load_existing_airports(self, country: str, fields: Optional[Tuple[str, ...]] = None,
+                                idents: Optional[Set[str]] = None,
+                                full: AbstractSet[str] = frozenset()) -> Dict[str, Dict]:
+        """Load the previously written airports of a country keyed by ident.
+
+        The file is streamed: only the airports in idents are kept, with
+        just fields unless they are in full (see reader.read_airports).
+        """
+        country_file = self.data_dir / country.lower() / 'airports.json'
+        if not country_file.exists():
+            return {}
+        try:
+            return read_airports(country_file, fields=fields, idents=idents, full=full)
         except Exception:
+            return {}
+
+    def _reusable_details(self, ident: str, existing: Dict) -> bool:
+        """Whether the previously written AirportDB details of ident can be reused.
+
+        With a persistent cache, details whose cache entry has expired are
+        refetched; details not yet in the cache are seeded into it, without
+        the source columns and METAR fields of the previous record.
+        """
+        if not existing.get('runways') or ident in self.changed_idents:
+            return False
+        if self.cache is not None:
+            if self.cache.is_expired('airportdb', ident):
+                return False
+            self.cache.seed('airportdb', ident, {
+                field: existing[field] for field in AIRPORTDB_FIELDS if field in existing
+            })
+        return True
+
+    def _reusable_metar(self, ident: str, existing: Dict) -> bool:
+        """Whether the previously written METAR availability of ident can be reused.
+
+        None records an availability that is still unknown.
+        """
+        if existing.get('metar_available') is None:
             return False
+        if self.cache is not None:
+            if self.cache.is_expired('metar', ident):
+                return False
+            self.cache.seed('metar', ident, existing['metar_available'])
+        return True
+
+    def _pending_task(self, source: str, ident: str, country: str,
+                      airport_type: Optional[str]) -> Task:
+        fetched_at = None
+        if self.cache is not None:
+            fetched_at = self.cache.fetched_at(source, ident)
+        return Task(ident, country, airport_type, fetched_at)
+
+    def _answered_without_call(self, source: str, ident: str) -> bool:
+        """Whether a lookup is answered by the checkpoint journal or the caches"""
+        if self.checkpoint is not None and ident in self.checkpoint.results.get(source, {}):
+            return True
+        if source == 'airportdb':
+            if ident in self.changed_idents:
+                return False
+            if ident in self._airport_cache:
+                return True
+        return self.cache is not None and self.cache.has(source, ident)
+
+    def _plan_lookups(self, groups) -> Tuple[Dict[str, Set[str]], Dict[str, Set[str]]]:
+        """Pick the AirportDB and METAR lookups of the run, one country at a time.
+
+        Airports whose previous data can be reused need no lookup. Lookups
+        answered by the checkpoint journal or the caches cost no API call;
+        the scheduler picks the others that fit in this run's budget and
+        defers the rest. Only idents are kept, so that the countries do not
+        stay in memory. Returns the idents to look up and the deferred
+        idents, per source.
+        """
+        sources = (('airportdb', self._reusable_details), ('metar', self._reusable_metar))
+        tasks: Dict[str, Dict[str, Task]] = {source: {} for source, _ in sources}
+        lookups: Dict[str, Set[str]] = {source: set() for source, _ in sources}
+        for country, frame in groups:
+            frame = frame[self.scope.mask(frame) & frame['ident'].notna()]
+            idents = frame['ident'].astype(str).tolist()
+            types = frame['type'].astype(object).where(frame['type'].notna(), None).tolist()
+            existing_airports = self._load_existing_airports(country, idents=set(idents))
+            for ident, airport_type in zip(idents, types):
+                existing = existing_airports.get(ident, {})
+                for source, reusable in sources:
+                    if ident in tasks[source] or ident in lookups[source] or reusable(ident, existing):
+                        continue
+                    if self._answered_without_call(source, ident):
+                        lookups[source].add(ident)
+                    else:
+                        tasks[source][ident] = self._pending_task(source, ident, country, airport_type)
+
+        selected = {
+            'airportdb': self.scheduler.select('airportdb', list(tasks['airportdb'].values())),
+            'metar': self.scheduler.select(
+                'metar', list(tasks['metar'].values()), per_call=self.metar_batch_size
+            ),
+        }
+        deferred = {}
+        for source, _ in sources:
+            lookups[source].update(selected[source])
+            deferred[source] = set(tasks[source]) - set(selected[source])
+        return lookups, deferred
+
+    def _lookup_details(self, ident: str) -> Optional[Dict]:
+        """AirportDB details of ident, from the checkpoint journal if recorded there"""
+        if self.checkpoint is not None:
+            journaled = self.checkpoint.results.get('airportdb', {})
+            if ident in journaled:
+                return journaled[ident]
+        details = self.fetch_airport_details(ident, ident in self.changed_idents)
+        if self.checkpoint is not None and details is not None:
+            self.checkpoint.record('airportdb', {ident: details})
+        return details
+
+    def _lookup_metar(self, idents: List[str]) -> Dict[str, Optional[bool]]:
+        """METAR availability of idents, from the checkpoint journal if recorded there"""
+        results: Dict[str, Optional[bool]] = {}
+        if self.checkpoint is not None:
+            journaled = self.checkpoint.results.get('metar', {})
+            results.update((ident, journaled[ident]) for ident in idents if ident in journaled)
+        missing = [ident for ident in idents if ident not in results]
+        if missing:
+            results.update(self.check_metar_available_many(missing))
+        return results
+
+    def _merge_country(self, country: str, records: List[Airport], existing_airports: Dict[str, Dict],
+                       details: Dict[str, Optional[Dict]], metar: Dict[str, Optional[bool]],
+                       deferred: Dict[str, Set[str]]) -> None:
+        """Merge the lookup results into the records of a country and store them"""
+        airports = []
+        stats = {
+            'metar_fetched': 0,
+            'metar_skipped': 0,
+            'airportdb_fetched': 0,
+            'airportdb_skipped': 0,
+            'metar_deferred': 0,
+            'airportdb_deferred': 0,
+            'metar_failed': 0,
+            'airportdb_failed': 0,
+        }
+
+        for airport_data in records:
+            ident = airport_data.get('ident')
+            existing = existing_airports.get(ident, {}) if ident else {}
+            if ident:
+                if self._should_enrich(airport_data):
+                    if ident in details:
+                        airport_details = details[ident]
+                        if airport_details:
+                            airport_data.update(airport_details)
+                            if airport_details.get('runways'):
+                                airport_data['runways'] = airport_details['runways']
+                        elif existing.get('runways'):
+                            # A failed refresh keeps the previous details
+                            airport_data.update(previous_details(existing))
+                        if airport_details is None:
+                            stats['airportdb_failed'] += 1
+                        stats['airportdb_fetched'] += 1
+                    elif existing.get('runways'):
+                        airport_data.update(previous_details(existing))
+                        stats['airportdb_skipped'] += 1
+                    if ident in deferred['airportdb']:
+                        stats['airportdb_deferred'] += 1
+                    if ident in metar:
+                        available = metar[ident]
+                        if available is None:
+                            # Unknown after a failed check: keep the previous value
+                            available = existing.get('metar_available')
+                            stats['metar_failed'] += 1
+                        airport_data['metar_available'] = available
+                        stats['metar_fetched'] += 1
+                    else:
+                        # Deferred checks keep the previous value, None if unknown
+                        airport_data['metar_available'] = existing.get('metar_available')
+                        if ident in deferred['metar']:
+                            stats['metar_deferred'] += 1
+                        else:
+                            stats['metar_skipped'] += 1
+                else:
+                    if 'metar_available' in existing:
+                        airport_data['metar_available'] = existing['metar_available']
+                    else:
+                        airport_data['metar_available'] = False
+                    if 'runways' in existing and existing['runways']:
+                        airport_data['runways'] = existing['runways']
+                    stats['metar_skipped'] += 1
+                    stats['airportdb_skipped'] += 1
+
+            airports.append(airport_data)
+
+        self.countries_data[country] = airports
+        self.api_stats[country] = stats
+        if self.checkpoint is not None:
+            self.checkpoint.country_done(country, stats)
+        print(
+            f"{self.get_country_name(country)}: METAR fetched {stats['metar_fetched']}, "
+            f"skipped {stats['metar_skipped']} | AirportDB fetched {stats['airportdb_fetched']}, "
+            f"skipped {stats['airportdb_skipped']}"
+            + (
+                f" | deferred METAR {stats['metar_deferred']}, "
+                f"AirportDB {stats['airportdb_deferred']}"
+                if stats['metar_deferred'] or stats['airportdb_deferred'] else ""
+            )
+            + (
+                f" | unknown after failure METAR {stats['metar_failed']}, "
+                f"AirportDB {stats['airportdb_failed']}"
+                if stats['metar_failed'] or stats['airportdb_failed'] else ""
+            )
+        )
+
+    def _process_batch(self, batch: List[Tuple[str, 'pd.DataFrame']], lookups: Dict[str, Set[str]],
+                       deferred: Dict[str, Set[str]], executor: ThreadPoolExecutor,
+                       metar_future, pbar) -> None:
+        """Build, enrich and store a batch of countries.
+
+        The AirportDB lookups of the batch run concurrently. Results are
+        keyed by ident so that they are merged back in the original row
+        order, independently of completion order.
+        """
+        plans = []
+        for country, frame in batch:
+            records = self._build_records(frame)
+            # Enriched airports reuse their whole previous record, the
+            # others only their runways and METAR availability
+            idents = {r['ident'] for r in records if r.get('ident')}
+            enriched = {r['ident'] for r in records if r.get('ident') and self._should_enrich(r)}
+            existing = self._load_existing_airports(
+                country, fields=EXISTING_FIELDS, idents=idents, full=enriched
+            )
+            plans.append((country, records, existing))
+
+        wanted = dict.fromkeys(
+            r['ident'] for _, records, _ in plans for r in records
+            if r.get('ident') in lookups['airportdb']
+        )
+        futures = {executor.submit(self._lookup_details, ident): ident for ident in wanted}
+        details: Dict[str, Optional[Dict]] = {}
+        for future in as_completed(futures):
+            details[futures[future]] = future.result()
+            pbar.update(1)
+        metar = metar_future.result()
+
+        for country, records, existing in plans:
+            self._merge_country(country, records, existing, details, metar, deferred)
+        # Details of the stored countries are not needed any more
+        self._airport_cache.clear()
+
+    def process_airports(self, df: 'pd.DataFrame') -> None:
+        """Build, enrich and store the airports of every country in scope.
+
+        The lookups of the whole run are planned first, one country at a
+        time, so that the budget is spent across all countries and the
+        METAR checks go out as a few batched queries. Countries are then
+        enriched and stored in batches of about PROCESS_BATCH_SIZE
+        airports, each journaled in the checkpoint once stored, so that
+        memory follows a batch rather than the whole world.
+        """
+        from tqdm import tqdm
 
-    def process_airports(self, df: pd.DataFrame) -> None:
         print("\nProcessing airports...")
 
-        # Only keep airports that are likely to be enrichable. This avoids
-        # iterating over the ~82k world airports when only a small subset is
-        # actually supported by AirportDB.
-        enrichable = df[
-            df['iso_country'].isin(WESTERN_EUROPE)
-            & df['type'].isin(PRIORITIZED_TYPES)
-        ].copy()
+        # Only keep airports within the configured scope. This avoids
+        # iterating over the ~82k world airports when only a subset is
+        # meant to be enriched.
+        enrichable = self._enrichable(df)
 
         if enrichable.empty:
             print("No enrichable airports found")
@@ -113,184 +783,852 @@ class AirportDataUpdater:
 
         self.total_airports = len(enrichable)
 
-        possible_columns = [
-            'ident', 'type', 'name', 'elevation_ft', 'continent',
-            'iso_country', 'iso_region', 'municipality', 'gps_code',
-            'iata_code', 'local_code', 'coordinates'
-        ]
+        self.types_distribution.update(self._count_types(enrichable))
 
-        pbar = tqdm(total=self.total_airports, desc="Processing airports")
+        if self.checkpoint is not None and self.checkpoint.processed:
+            # Countries completed by the interrupted run are not processed again
+            self.api_stats.update(self.checkpoint.processed)
+            enrichable = enrichable[~enrichable['iso_country'].isin(list(self.checkpoint.processed))]
+            print(f"Resuming after {len(self.checkpoint.processed)} processed countries")
 
-        if 'continent' in enrichable.columns:
-            unique_countries = (
-                enrichable[['iso_country', 'continent']]
-                .dropna(subset=['iso_country'])
-                .drop_duplicates()
-            )
-        else:
-            unique_countries = (
-                enrichable[['iso_country']]
-                .dropna()
-                .drop_duplicates()
-            )
-            unique_countries['continent'] = None
+        # Rows are partitioned by country in a single pass, in order of
+        # first appearance; each pass over groups yields one country at a time
+        groups = enrichable.groupby('iso_country', sort=False, observed=True)
+        lookups, deferred = self._plan_lookups(groups)
+
+        # Two API hosts, each allowed max_per_host requests in flight. The
+        # METAR checks run in the background while the first batches are
+        # looked up in AirportDB.
+        total = len(lookups['airportdb']) + len(lookups['metar'])
+        with ThreadPoolExecutor(max_workers=2 * self.max_per_host) as executor, \
+                tqdm(total=total, desc="Fetching enrichment") as pbar:
+            metar_future = executor.submit(self._lookup_metar, sorted(lookups['metar']))
+            metar_future.add_done_callback(lambda _: pbar.update(len(lookups['metar'])))
+            batch, size = [], 0
+            for country, frame in groups:
+                batch.append((country, frame))
+                size += len(frame)
+                if size >= PROCESS_BATCH_SIZE:
+                    self._process_batch(batch, lookups, deferred, executor, metar_future, pbar)
+                    batch, size = [], 0
+            if batch:
+                self._process_batch(batch, lookups, deferred, executor, metar_future, pbar)
+
+    def _in_scope(self, country: str) -> bool:
+        """Whether a full run maps and writes country"""
+        if self.scope_countries is not None:
+            return country in self.scope_countries
+        return self.scope.countries is None or country in self.scope.countries
+
+    def _untouched_countries(self) -> List[str]:
+        """Countries in scope whose previous file is kept by this run"""
+        countries = []
+        for country_file in sorted(self.data_dir.glob('*/airports.json')):
+            country = country_file.parent.name.upper()
+            if (country not in self.countries_data and country not in self.removed_countries
+                    and self._in_scope(country)):
+                countries.append(country)
+        return countries
+
+    def _metar_stations(self) -> Tuple[List[str], List[float], List[float]]:
+        """Idents and positions of the airports known to report METAR.
 
-        ordered_countries = list(unique_countries['iso_country'])
+        The stations are those of the countries in scope, as on a full run:
+        on incremental and shard runs the countries that were not rebuilt
+        contribute the stations of their previously written files.
+        """
+        idents, lats, lons = [], [], []
 
-        for country in ordered_countries:
-            if pd.isna(country):
+        def add(airports):
+            for ident, (lat, lon) in reporting_stations(airports).items():
+                idents.append(ident)
+                lats.append(lat)
+                lons.append(lon)
+
+        for airports in self.countries_data.values():
+            add(airports)
+        if self.refreshed_countries is not None or self.shard is not None:
+            if self.snapshot_dir is not None:
+                from . import snapshot
+
+                # The snapshot of the previous run holds the untouched countries
+                stations = snapshot.metar_stations(
+                    self.snapshot_dir, set(self.countries_data) | self.removed_countries,
+                    countries=(self.scope_countries if self.scope_countries is not None
+                               else self.scope.countries),
+                )
+                if stations is not None:
+                    return idents + stations[0], lats + stations[1], lons + stations[2]
+            for country in self._untouched_countries():
+                add(self._load_existing_airports(country, fields=STATION_FIELDS).values())
+        return idents, lats, lons
+
+    def _changed_stations(self) -> Tuple[Set[str], Dict[str, Tuple[float, float]]]:
+        """Stations lost and gained by the countries rebuilt or removed by this run.
+
+        The rebuilt countries are compared with their previous files, which
+        are only rewritten after the mapping. A station that moved is both
+        lost and gained.
+        """
+        before: Dict[str, Tuple[float, float]] = {}
+        after: Dict[str, Tuple[float, float]] = {}
+        for country in set(self.countries_data) | self.removed_countries:
+            before.update(reporting_stations(
+                self._load_existing_airports(country, fields=STATION_FIELDS).values()
+            ))
+        for airports in self.countries_data.values():
+            after.update(reporting_stations(airports))
+        lost = {ident for ident, position in before.items() if after.get(ident) != position}
+        gained = {ident: position for ident, position in after.items() if before.get(ident) != position}
+        return lost, gained
+
+    def _stale_neighbours(self) -> List[str]:
+        """Countries not rebuilt by an incremental run whose mapping a changed station affects.
+
+        Only countries in scope are considered, as a full run only maps
+        those. An airport is affected when its nearest station stopped
+        reporting or when a new station is closer than it. Shard runs only
+        look at the countries of their shard: the others are settled by
+        their own shard.
+        """
+        if self.refreshed_countries is None:
+            # Full runs rebuild, and map, every country
+            return []
+        lost, gained = self._changed_stations()
+        if not lost and not gained:
+            return []
+        from .spatial import nearest_points
+
+        gained_lats = [lat for lat, _ in gained.values()]
+        gained_lons = [lon for _, lon in gained.values()]
+        stale = []
+        for country in self._untouched_countries():
+            if self.shard is not None and not self.shard.contains(country):
                 continue
+            affected = False
+            lats, lons, distances = [], [], []
+            for airport in self._load_existing_airports(country, fields=MAPPING_FIELDS).values():
+                lat, lon = airport_position(airport)
+                if lat is None or lon is None or airport.get('metar_available') is True:
+                    continue
+                nearest = airport.get('nearest_metar')
+                if (not isinstance(nearest, dict) or nearest.get('ident') in lost
+                        or nearest.get('distance_km') is None):
+                    affected = True
+                    break
+                lats.append(lat)
+                lons.append(lon)
+                distances.append(nearest['distance_km'])
+            if not affected and gained and lats:
+                _, to_gained = nearest_points(lats, lons, gained_lats, gained_lons)
+                affected = bool((to_gained < distances).any())
+            if affected:
+                stale.append(country)
+        return stale
 
-            country_data = enrichable[enrichable['iso_country'] == country]
-            country_dir = self.data_dir / country.lower()
-            existing_airports = {}
-            country_file = country_dir / 'airports.json'
-            if country_file.exists():
-                try:
-                    with open(country_file, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
-                        existing_airports = {
-                            a.get('ident'): a for a in data.get('airports', []) if a.get('ident')
-                        }
-                except Exception:
-                    existing_airports = {}
-
-            airports = []
-            stats = {
-                'metar_fetched': 0,
-                'metar_skipped': 0,
-                'airportdb_fetched': 0,
-                'airportdb_skipped': 0,
-            }
-
-            for _, row in country_data.iterrows():
-                airport_data = {}
-                for col in possible_columns:
-                    if col in row.index and pd.notna(row[col]):
-                        value = row[col]
-                        if col == 'elevation_ft':
-                            value = float(value)
-                        airport_data[col] = value
-
-                ident = airport_data.get('ident')
-                iso_country = airport_data.get('iso_country')
-                airport_type = airport_data.get('type')
-                existing = existing_airports.get(ident, {}) if ident else {}
-                if ident:
-                    should_enrich = (
-                        airport_type in PRIORITIZED_TYPES and
-                        iso_country in WESTERN_EUROPE
-                    )
-                    if should_enrich:
-                        if 'runways' in existing and existing['runways']:
-                            airport_data.update(existing)
-                            stats['airportdb_skipped'] += 1
-                        else:
-                            details = self.fetch_airport_details(ident)
-                            if details:
-                                airport_data.update(details)
-                                if details.get('runways'):
-                                    airport_data['runways'] = details['runways']
-                            stats['airportdb_fetched'] += 1
-                        if 'metar_available' in existing:
-                            airport_data['metar_available'] = existing['metar_available']
-                            stats['metar_skipped'] += 1
-                        else:
-                            airport_data['metar_available'] = self.check_metar_available(ident)
-                            stats['metar_fetched'] += 1
-                    else:
-                        if 'metar_available' in existing:
-                            airport_data['metar_available'] = existing['metar_available']
-                        else:
-                            airport_data['metar_available'] = False
-                        if 'runways' in existing and existing['runways']:
-                            airport_data['runways'] = existing['runways']
-                        stats['metar_skipped'] += 1
-                        stats['airportdb_skipped'] += 1
+    def _map_country(self, airports: List[Airport], station_idents: List[str],
+                     station_lats: List[float], station_lons: List[float]) -> int:
+        """Set the nearest METAR station of the airports of a country, returns the number mapped"""
+        from .spatial import nearest_points
 
-                airports.append(airport_data)
-                pbar.update(1)
+        located, lats, lons = [], [], []
+        for airport in airports:
+            lat, lon = airport_position(airport)
+            if lat is not None and lon is not None:
+                located.append(airport)
+                lats.append(lat)
+                lons.append(lon)
+        if not located:
+            return 0
 
-            self.countries_data[country] = airports
-            self.api_stats[country] = stats
-            print(
-                f"{self.get_country_name(country)}: METAR fetched {stats['metar_fetched']}, "
-                f"skipped {stats['metar_skipped']} | AirportDB fetched {stats['airportdb_fetched']}, "
-                f"skipped {stats['airportdb_skipped']}"
-            )
+        nearest, distances = nearest_points(lats, lons, station_lats, station_lons)
+        for airport, station, distance in zip(located, nearest.tolist(), distances.tolist()):
+            if airport.get('metar_available') is True:
+                airport['nearest_metar'] = {'ident': airport['ident'], 'distance_km': 0.0}
+            else:
+                airport['nearest_metar'] = {
+                    'ident': station_idents[station],
+                    'distance_km': round(distance, 1),
+                }
+        return len(located)
 
-        pbar.close()
+    def assign_nearest_metar(self) -> None:
+        """Add the nearest METAR-reporting airport and its distance to every airport.
+
+        Airports reporting METAR point to themselves. The airports of each
+        country are matched against the stations in one vectorized pass.
+        On incremental runs, countries that were not rebuilt but whose
+        nearest stations changed are mapped again and rewritten too.
+        """
+        station_idents, station_lats, station_lons = self._metar_stations()
+        if not station_idents:
+            print("No METAR stations known, skipping the nearest METAR mapping")
+            return
+
+        neighbours = self._stale_neighbours()
+        mapped = 0
+        for country in list(self.countries_data):
+            airports = self.countries_data[country]
+            mapped += self._map_country(airports, station_idents, station_lats, station_lons)
+            # Written back when the countries are kept in the checkpoint store
+            self.countries_data[country] = airports
+        for country in neighbours:
+            with open(self.data_dir / country.lower() / 'airports.json', 'r', encoding='utf-8') as f:
+                airports = to_airports(json.load(f).get('airports', []))
+            mapped += self._map_country(airports, station_idents, station_lats, station_lons)
+            self.countries_data[country] = airports
+        if neighbours:
+            # Rewritten like the rebuilt countries, index entry included
+            self.refreshed_countries = set(self.refreshed_countries or ()) | set(neighbours)
+            print(f"Nearest METAR stations changed in {len(neighbours)} countries not rebuilt")
+        print(f"Mapped {mapped} airports to {len(station_idents)} METAR stations")
 
     def generate_countries_index(self) -> None:
         print("\nGenerating countries index...")
         countries = []
         for country_code, airports in self.countries_data.items():
-            types_count = {}
-            for airport in airports:
-                airport_type = airport.get('type', 'unknown')
-                types_count[airport_type] = types_count.get(airport_type, 0) + 1
-
             countries.append({
                 'code': country_code,
                 'name': self.get_country_name(country_code),
                 'airport_count': len(airports),
-                'types_distribution': types_count
+                'types_distribution': self._types_distribution(country_code, airports)
             })
 
+        if self.refreshed_countries is not None:
+            # Incremental run: keep the index entries of untouched countries
+            countries.extend(
+                entry for entry in self._load_countries_index()
+                if entry.get('code') not in self.refreshed_countries
+                and (self.shard is None or entry.get('code') in self.shard_countries)
+            )
+
         countries.sort(key=lambda x: x['name'])
 
-        with open(self.data_dir / 'countries.json', 'w', encoding='utf-8') as f:
-            json.dump(countries, f, ensure_ascii=False, indent=2)
+        if self.shard is not None:
+            # Written to the shard manifest, merged by merge_shards
+            self.shard_entries = countries
+            return
+
+        write_if_changed(self.data_dir / 'countries.json', dumps_pretty(countries), new_write_stats())
 
-    def save_country_data(self) -> None:
-        print("\nSaving country data...")
+    def _load_countries_index(self) -> List[Dict]:
+        """Load the previously written countries index"""
+        try:
+            with open(self.data_dir / 'countries.json', 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception:
+            return []
 
-        for country_code, airports in tqdm(self.countries_data.items(), desc="Saving countries"):
-            country_dir = self.data_dir / country_code.lower()
-            country_dir.mkdir(exist_ok=True, parents=True)
+    def save_country_data(self) -> None:
+        from tqdm import tqdm
 
-            types_distribution = {}
-            for airport in airports:
-                airport_type = airport.get('type', 'unknown')
-                types_distribution[airport_type] = types_distribution.get(airport_type, 0) + 1
+        print("\nSaving country data...")
 
-            with open(country_dir / 'airports.json', 'w', encoding='utf-8') as f:
-                json.dump({
+        def jobs():
+            # Countries are loaded one at a time from the checkpoint store
+            for country_code in list(self.countries_data):
+                airports = self.countries_data[country_code]
+                header = {
                     'country_code': country_code,
                     'country_name': self.get_country_name(country_code),
                     'total_airports': len(airports),
-                    'last_updated': pd.Timestamp.now().isoformat(),
-                    'types_distribution': types_distribution,
-                    'airports': airports
-                }, f, ensure_ascii=False, indent=2)
+                    'last_updated': datetime.now().isoformat(),
+                    'types_distribution': self._types_distribution(country_code, airports),
+                }
+                yield self.data_dir / country_code.lower(), header, airports, self.compact_export
+
+        # Serializing with indent=2 is CPU bound: spread countries over
+        # processes, with a bounded number of countries in flight
+        totals = new_write_stats()
+        count = len(self.countries_data)
+        workers = min(self.save_workers, count)
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as pool, \
+                    tqdm(total=count, desc="Saving countries") as pbar:
+                pending = set()
+                for job in jobs():
+                    if len(pending) >= 2 * workers:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            merge_write_stats(totals, future.result())
+                            pbar.update(1)
+                    pending.add(pool.submit(save_country, *job))
+                for future in as_completed(pending):
+                    merge_write_stats(totals, future.result())
+                    pbar.update(1)
+        else:
+            for job in tqdm(jobs(), total=count, desc="Saving countries"):
+                merge_write_stats(totals, save_country(*job))
+        self.write_stats = totals
+        print(
+            f"Files written: {totals['written']} ({totals['bytes_written'] / 1e6:.1f} MB), "
+            f"unchanged: {totals['skipped']} ({totals['bytes_skipped'] / 1e6:.1f} MB not rewritten)"
+        )
+
+    def writes_dataset_files(self) -> bool:
+        """Whether the run writes the tiles, search index or snapshot of the whole data directory"""
+        if self.shard is not None:
+            # Shard runs leave them to merge_shards
+            return False
+        return any(path is not None for path in (self.tiles_dir, self.search_dir, self.snapshot_dir))
+
+    def load_data_records(self) -> List[Tuple[str, int, Airport]]:
+        """Country, file position and record of every airport in the data directory.
+
+        Read once at the end of a run for the tiles, search index and snapshot.
+        """
+        return [
+            (country, position, airport)
+            for country, content in iter_countries(self.data_dir)
+            for position, airport in enumerate(to_airports(content.get('airports', [])))
+        ]
+
+    def save_tiles(self, records: Optional[List[Tuple[str, int, Airport]]] = None) -> None:
+        """Write the cluster and marker tiles of every airport in the data directory"""
+        if self.tiles_dir is None or self.shard is not None:
+            # Shard runs leave the tiles to merge_shards
+            return
+        from . import tiles
+
+        print("\nWriting map tiles...")
+        if records is None:
+            records = self.load_data_records()
+        stats = tiles.write_tiles(self.tiles_dir, tiles.points_from_records(records))
+        self.tile_stats = stats
+        print(
+            f"Tiles written: {stats['written']}, unchanged: {stats['skipped']}, "
+            f"removed: {stats['removed']}"
+        )
+
+    def save_search_index(self, records: Optional[List[Tuple[str, int, Airport]]] = None) -> None:
+        """Write the static search files of every airport in the data directory"""
+        if self.search_dir is None or self.shard is not None:
+            # Shard runs leave the search index to merge_shards
+            return
+        from . import search
+
+        print("\nWriting search index...")
+        if records is None:
+            records = self.load_data_records()
+        stats = search.write_search_export(self.search_dir, search.SearchIndex.from_records(records))
+        self.search_stats = stats
+        print(
+            f"Search files written: {stats['written']}, unchanged: {stats['skipped']}, "
+            f"removed: {stats['removed']}"
+        )
+
+    def save_snapshot(self, records: Optional[List[Tuple[str, int, Airport]]] = None) -> None:
+        """Write the Parquet snapshot of every airport in the data directory"""
+        if self.snapshot_dir is None or self.shard is not None:
+            # Shard runs leave the snapshot to merge_shards
+            return
+        from . import snapshot
+
+        if not snapshot.available():
+            print("pyarrow is not installed, skipping the Parquet snapshot")
+            return
+        print("\nWriting Parquet snapshot...")
+        if records is None:
+            records = self.load_data_records()
+        stats = snapshot.write_snapshot(self.snapshot_dir, (airport for _, _, airport in records))
+        self.snapshot_stats = stats
+        print(f"Snapshot tables written: {stats['written']}, unchanged: {stats['skipped']}")
+
+    def _select_changed_countries(self, df: 'pd.DataFrame', rows: Dict[str, List[str]],
+                                  scope: str, manifest_path: Path) -> 'pd.DataFrame':
+        """Restrict df to the countries whose rows changed since the last run.
+
+        Added and changed rows are re-enriched. Countries with lookups
+        deferred by the budget, with unknown values after failed lookups or
+        with expired cache entries are processed again too. Falls back to
+        the full data when there is no manifest for the current scope.
+        """
+        previous = load_manifest(manifest_path, scope)
+        if previous is None:
+            print("No source manifest for the current scope, running a full update")
+            self.refreshed_countries = None
+            return df
+        changes = diff_rows(previous, rows)
+        print(f"Incremental update: {changes.summary()}")
+        pending = self.scheduler.pending_countries() - changes.countries
+        unresolved = load_unresolved(manifest_path, scope) - changes.countries
+        expired = self._expired_countries(rows) - changes.countries
+        for count, reason in ((len(pending), "deferred enrichment"),
+                              (len(unresolved), "failed lookups"),
+                              (len(expired), "expired cache entries")):
+            if count:
+                print(f"Refreshing {count} unchanged countries with {reason}")
+        self.refreshed_countries = changes.countries | pending | unresolved | expired
+        self.changed_idents = set(changes.added) | set(changes.changed)
+        # Countries still in the source keep their files, even without rows
+        # in the scope, as on a full run
+        current = set(df['iso_country'].dropna().astype(object).unique())
+        self.removed_countries = {country for country in changes.countries if country not in current}
+        return df[df['iso_country'].isin(self.refreshed_countries)]
+
+    def _expired_countries(self, rows: Dict[str, List[str]]) -> Set[str]:
+        """Countries of the rows whose AirportDB or METAR cache entry expired"""
+        if self.cache is None:
+            return set()
+        expired = self.cache.expired('airportdb') | self.cache.expired('metar')
+        return {rows[ident][1] for ident in expired if ident in rows}
+
+    def _unresolved_countries(self) -> Set[str]:
+        """Countries processed by this run with failed lookups"""
+        return {
+            country for country, stats in self.api_stats.items()
+            if stats.get('airportdb_failed') or stats.get('metar_failed')
+        }
+
+    def remove_country_files(self) -> None:
+        """Delete the files of the countries whose source rows were all removed"""
+        for country in sorted(self.removed_countries):
+            if self.shard is not None and not self.shard.contains(country):
+                continue
+            country_dir = self.data_dir / country.lower()
+            if (country_dir / 'airports.json').exists():
+                shutil.rmtree(country_dir)
+                print(f"Removed {self.get_country_name(country)}: no airports left in the source")
+
+    def _select_shard(self, df: 'pd.DataFrame') -> 'pd.DataFrame':
+        """Restrict df to the countries of this shard"""
+        shard = self.shard
+        if shard is None:
+            return df
+        self.source_fingerprint = source_fingerprint(df)
+        df = df[shard.mask(df)]
+        self.shard_countries = set(self._enrichable(df)['iso_country'].astype(object).unique())
+        print(f"Shard {shard}: {len(self.shard_countries)} countries, {len(df)} airports")
+        return df
+
+    def merge_shards(self, count: int) -> bool:
+        """Build countries.json, tiles, search index and snapshot from count shard runs.
+
+        Fails, leaving the previous countries.json in place, when a shard is
+        missing or incomplete.
+        """
+        try:
+            countries = merge_shard_manifests(self.shard_dir, count, self.data_dir)
+        except ValueError as e:
+            print(f"Cannot merge the shards: {str(e)}")
+            return False
+        write_if_changed(self.data_dir / 'countries.json', dumps_pretty(countries), new_write_stats())
+        records = self.load_data_records() if self.writes_dataset_files() else None
+        self.save_tiles(records)
+        self.save_search_index(records)
+        self.save_snapshot(records)
+        remove_shard_manifests(self.shard_dir, count)
+        print(f"Merged {count} shards: {len(countries)} countries")
+        return True
+
+    def _run_fingerprint(self, df: 'pd.DataFrame', scope: str) -> str:
+        """Identify the rows a run enriches, so that a checkpoint only resumes the same work"""
+        rows = hash_rows(self._enrichable(df), AIRPORT_COLUMNS)
+        digest = hashlib.sha256(scope.encode('utf-8'))
+        digest.update(json.dumps(rows, sort_keys=True).encode('utf-8'))
+        return digest.hexdigest()
+
+    def _start_checkpoint(self, df: 'pd.DataFrame', scope: str) -> None:
+        """Open the checkpoint journal and keep the processed countries in its store"""
+        checkpoint = self.checkpoint
+        if checkpoint is None:
+            return
+        resumed = checkpoint.start(self._run_fingerprint(df, scope), resume=self.resume)
+        if resumed:
+            results = sum(len(values) for values in checkpoint.results.values())
+            print(
+                f"Resuming from the checkpoint: {len(checkpoint.processed)} countries "
+                f"processed, {results} enrichment results"
+            )
+        elif self.resume:
+            print("No checkpoint of a run over the same data, starting from scratch")
+        self.countries_data = checkpoint.countries
+
+    def run_statistics(self, success: bool, error: Optional[str] = None) -> Dict:
+        """Outcome and statistics of the run, for the run report"""
+        totals: Dict[str, int] = {}
+        for stats in self.api_stats.values():
+            for key, value in stats.items():
+                totals[key] = totals.get(key, 0) + value
+        peak = peak_rss_mb()
+        return {
+            'success': success,
+            'error': error,
+            'airports': self.total_airports,
+            'countries': len(self.countries_data),
+            'enrichment': totals,
+            'enrichment_per_country': self.api_stats,
+            'cache': self.cache.stats if self.cache is not None else None,
+            'writes': {
+                'country_files': self.write_stats,
+                'tiles': self.tile_stats,
+                'search': self.search_stats,
+                'snapshot': self.snapshot_stats,
+            },
+            'peak_rss_mb': round(peak, 1) if peak is not None else None,
+        }
+
+    def write_run_report(self, success: bool, error: Optional[str] = None) -> None:
+        """Write the run report to report_path, if set"""
+        if self.report_path is None:
+            return
+        try:
+            self.recorder.write(self.report_path, **self.run_statistics(success, error))
+            print(f"Run report written to {self.report_path}")
+        except Exception as e:
+            print(f"Warning: Could not write the run report: {str(e)}")
 
     def update(self) -> bool:
+        success = False
+        error = None
+        stage = self.recorder.stage
+        refresh = self.start_metadata_refresh()
         try:
-            self.load_country_names()
+            with stage('load_country_names'):
+                self.load_country_names()
 
-            df = self.download_source_data()
+            with stage('download_source_data'):
+                df = self.download_source_data()
             if df is None:
+                error = "source data could not be downloaded"
                 return False
+            self.scope_countries = set(self._enrichable(df)['iso_country'].astype(object).unique())
+            if self.shard is not None:
+                df = self._select_shard(df)
 
             self.data_dir.mkdir(exist_ok=True, parents=True)
 
-            self.process_airports(df)
-            self.generate_countries_index()
-            self.save_country_data()
+            with stage('select_changes'):
+                scope = scope_fingerprint(self.scope.fingerprint(), AIRPORT_COLUMNS)
+                manifest_path, manifest_rows = self.manifest_path, None
+                if manifest_path is not None:
+                    manifest_rows = hash_rows(self._enrichable(df), AIRPORT_COLUMNS)
+                    if self.incremental:
+                        df = self._select_changed_countries(df, manifest_rows, scope, manifest_path)
+                if self.checkpoint is not None:
+                    self._start_checkpoint(df, scope)
+
+            with stage('process_airports'), profiled(self.profile_path):
+                self.process_airports(df)
+            with stage('assign_nearest_metar'):
+                self.assign_nearest_metar()
+            with stage('generate_countries_index'):
+                self.generate_countries_index()
+            with stage('save_country_data'):
+                self.save_country_data()
+                self.remove_country_files()
+            records = None
+            if self.writes_dataset_files():
+                with stage('load_data_records'):
+                    records = self.load_data_records()
+            with stage('save_tiles'):
+                self.save_tiles(records)
+            with stage('save_search_index'):
+                self.save_search_index(records)
+            with stage('save_snapshot'):
+                self.save_snapshot(records)
+            del records
+            if self.cache is not None:
+                print(self.cache.report())
+            if self.scheduler.limited:
+                print(f"Budget: {self.scheduler.report()}")
+            with stage('save_state'):
+                self.scheduler.save()
+                if manifest_path is not None and manifest_rows is not None:
+                    save_manifest(manifest_path, manifest_rows, scope,
+                                  unresolved=self._unresolved_countries())
+                # The source fingerprint is set along with the shard
+                shard, fingerprint = self.shard, self.source_fingerprint
+                if shard is not None and fingerprint is not None:
+                    write_shard_manifest(
+                        self.shard_dir, shard, fingerprint,
+                        self.shard_countries, self.shard_entries,
+                    )
+                if self.checkpoint is not None:
+                    self.checkpoint.clear()
 
+            success = True
             return True
 
         except Exception as e:
             print(f"An error occurred during update: {str(e)}")
+            error = str(e)
             return False
 
+        finally:
+            if not success and self.checkpoint is not None:
+                self.checkpoint.flush()
+            if refresh is not None:
+                refresh.join(METADATA_REFRESH_TIMEOUT)
+            self.write_run_report(success, error)
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Update the airport data files")
+    parser.add_argument(
+        '--max-per-host', type=int, default=DEFAULT_MAX_PER_HOST,
+        help="maximum concurrent requests per API host (1 runs lookups one at a time per host)"
+    )
+    parser.add_argument(
+        '--airportdb-rate', type=float, default=AIRPORTDB_RATE,
+        help="maximum AirportDB requests per second"
+    )
+    parser.add_argument(
+        '--metar-rate', type=float, default=METAR_RATE,
+        help="maximum METAR requests per second"
+    )
+    parser.add_argument(
+        '--metar-batch-size', type=int, default=METAR_BATCH_SIZE,
+        help="number of station ids sent in a single METAR query"
+    )
+    parser.add_argument(
+        '--cache', type=Path, default=DEFAULT_CACHE_PATH,
+        help="SQLite file caching enrichment results across runs"
+    )
+    parser.add_argument(
+        '--no-cache', action='store_true',
+        help="do not use the persistent enrichment cache"
+    )
+    parser.add_argument(
+        '--cache-max-entries', type=int, default=DEFAULT_MAX_ENTRIES,
+        help="least recently used entries beyond this size are evicted"
+    )
+    parser.add_argument(
+        '--incremental', action='store_true',
+        help="only rebuild the countries whose source rows changed since the last run"
+    )
+    parser.add_argument(
+        '--manifest', type=Path, default=DEFAULT_MANIFEST_PATH,
+        help="row-hash manifest of the last processed source CSV"
+    )
+    parser.add_argument(
+        '--countries',
+        help="comma-separated ISO country codes to enrich, or 'all' (default: Western Europe)"
+    )
+    parser.add_argument(
+        '--continents',
+        help="comma-separated continent codes to enrich, or 'all' (default: all)"
+    )
+    parser.add_argument(
+        '--types',
+        help="comma-separated airport types to enrich, or 'all' (default: large and medium airports)"
+    )
+    parser.add_argument(
+        '--airportdb-budget', type=int,
+        help="maximum number of AirportDB calls per run (default: unlimited)"
+    )
+    parser.add_argument(
+        '--metar-budget', type=int,
+        help="maximum number of METAR queries per run (default: unlimited)"
+    )
+    parser.add_argument(
+        '--scheduler-state', type=Path, default=DEFAULT_SCHEDULER_STATE_PATH,
+        help="file keeping the budget scheduler rotation between runs"
+    )
+    parser.add_argument(
+        '--source-cache', type=Path, default=DEFAULT_CACHE_DIR,
+        help="directory keeping the last downloaded source CSV for conditional requests"
+    )
+    parser.add_argument(
+        '--save-workers', type=int, default=DEFAULT_SAVE_WORKERS,
+        help="processes writing the country files (1 writes them in the main process)"
+    )
+    parser.add_argument(
+        '--snapshot', type=Path,
+        help="directory of the Parquet snapshot (default: data/snapshot)"
+    )
+    parser.add_argument(
+        '--no-snapshot', action='store_true',
+        help="do not write the Parquet snapshot"
+    )
+    parser.add_argument(
+        '--tiles', type=Path,
+        help="directory of the map tile pyramid (default: data/tiles)"
+    )
+    parser.add_argument(
+        '--no-tiles', action='store_true',
+        help="do not write the map tiles"
+    )
+    parser.add_argument(
+        '--search', type=Path,
+        help="directory of the static search index (default: data/search)"
+    )
+    parser.add_argument(
+        '--no-search', action='store_true',
+        help="do not write the search index"
+    )
+    parser.add_argument(
+        '--no-compact', action='store_true',
+        help="only write airports.json, without the compact markers.json and details chunks"
+    )
+    parser.add_argument(
+        '--checkpoint', type=Path, default=DEFAULT_CHECKPOINT_DIR,
+        help="directory journaling enrichment results and processed countries during a run"
+    )
+    parser.add_argument(
+        '--no-checkpoint', action='store_true',
+        help="keep the processed countries in memory, without a journal"
+    )
+    parser.add_argument(
+        '--resume', action='store_true',
+        help="reuse the checkpoint of an interrupted run over the same source data"
+    )
+    parser.add_argument(
+        '--refresh-country-metadata', action='store_true',
+        help="update the local country metadata from country.io in the background for the next runs"
+    )
+    parser.add_argument(
+        '--shard', type=Shard.parse,
+        help="process only shard i of N (i/N), the countries being split by a hash of their code"
+    )
+    parser.add_argument(
+        '--workers', type=int, default=1,
+        help="run the update as this many shard processes, then merge them"
+    )
+    parser.add_argument(
+        '--merge-shards', type=int, metavar='N',
+        help="only merge the output of N shard runs into countries.json, the tiles, "
+             "the search index and the snapshot"
+    )
+    parser.add_argument(
+        '--shard-dir', type=Path, default=DEFAULT_SHARD_DIR,
+        help="directory receiving the manifests of the shard runs"
+    )
+    parser.add_argument(
+        '--report', type=Path, default=DEFAULT_REPORT_PATH,
+        help="JSON file receiving the run report (stage timings, API latencies, statistics)"
+    )
+    parser.add_argument(
+        '--no-report', action='store_true',
+        help="do not write the run report"
+    )
+    parser.add_argument(
+        '--profile', type=Path,
+        help="profile process_airports with cProfile and dump the stats to this file"
+    )
+    return parser.parse_args(argv)
+
+
+def shard_command(argv: List[str], args: argparse.Namespace, shard: Shard) -> List[str]:
+    """Command line of the process running shard.
+
+    The rate limits, budgets and save processes are split between the
+    shards, which run on the same host.
+    """
+    count = shard.total
+    command = [
+        sys.executable, '-m', 'src.update_data', *argv,
+        '--shard', str(shard), '--workers', '1',
+        '--airportdb-rate', str(args.airportdb_rate / count),
+        '--metar-rate', str(args.metar_rate / count),
+        '--save-workers', str(max(1, args.save_workers // count)),
+    ]
+    for option, budget in (('--airportdb-budget', args.airportdb_budget),
+                           ('--metar-budget', args.metar_budget)):
+        if budget is not None:
+            share = budget // count + (1 if shard.number <= budget % count else 0)
+            command += [option, str(share)]
+    return command
 
-def main():
+
+def run_shards(argv: List[str], args: argparse.Namespace) -> bool:
+    """Run args.workers shard processes in parallel, returning whether all succeeded"""
+    count = args.workers
+    remove_shard_manifests(args.shard_dir, count)
+    processes = [
+        subprocess.Popen(shard_command(argv, args, Shard(number, count)),
+                         cwd=Path(__file__).parent.parent)
+        for number in range(1, count + 1)
+    ]
+    failed = [str(number) for number, process in enumerate(processes, 1) if process.wait() != 0]
+    if failed:
+        print(f"Shards {', '.join(failed)} of {count} failed")
+    return not failed
+
+
+def main(argv: Optional[List[str]] = None):
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    argv = list(sys.argv[1:] if argv is None else argv)
+    args = parse_args(argv)
     source_url = "https://raw.githubusercontent.com/datasets/airport-codes/main/data/airport-codes.csv"
     data_dir = Path(__file__).parent.parent / 'data'
+    snapshot_dir = None if args.no_snapshot else (args.snapshot or data_dir / 'snapshot')
+    tiles_dir = None if args.no_tiles else (args.tiles or data_dir / 'tiles')
+    search_dir = None if args.no_search else (args.search or data_dir / 'search')
+
+    if args.merge_shards or (args.workers > 1 and args.shard is None):
+        count = args.merge_shards or args.workers
+        success = args.merge_shards is not None or run_shards(argv, args)
+        if success:
+            merger = AirportDataUpdater(
+                source_url, data_dir, snapshot_dir=snapshot_dir, tiles_dir=tiles_dir,
+                search_dir=search_dir, shard_dir=args.shard_dir,
+            )
+            success = merger.merge_shards(count)
+        if success:
+            print("\nUpdate completed successfully!")
+        else:
+            print("\nUpdate failed!")
+            exit(1)
+        return
+
+    if args.shard is not None:
+        # State kept between runs is per shard
+        args.manifest = args.shard.suffixed(args.manifest)
+        args.scheduler_state = args.shard.suffixed(args.scheduler_state)
+        args.checkpoint = args.shard.suffixed(args.checkpoint)
+        args.report = args.shard.suffixed(args.report)
+        args.source_cache = args.source_cache / args.shard.name
+
+    cache = None
+    if not args.no_cache:
+        cache = EnrichmentCache(args.cache, max_entries=args.cache_max_entries)
+
+    scope = EnrichmentScope.parse(
+        args.countries, args.continents, args.types, default=DEFAULT_SCOPE
+    )
+    scheduler = BudgetScheduler(
+        {'airportdb': args.airportdb_budget, 'metar': args.metar_budget},
+        state_path=args.scheduler_state,
+    )
+
+    http = HttpClient(
+        max_per_host=args.max_per_host,
+        rate_limits=default_rate_limits(args.airportdb_rate, args.metar_rate),
+    )
 
-    updater = AirportDataUpdater(source_url, data_dir)
-    success = updater.update()
+    updater = AirportDataUpdater(
+        source_url, data_dir,
+        max_per_host=args.max_per_host,
+        metar_batch_size=args.metar_batch_size,
+        cache=cache,
+        manifest_path=args.manifest,
+        incremental=args.incremental,
+        source_cache_dir=args.source_cache,
+        scope=scope,
+        scheduler=scheduler,
+        http=http,
+        compact_export=not args.no_compact,
+        save_workers=args.save_workers,
+        snapshot_dir=snapshot_dir,
+        tiles_dir=tiles_dir,
+        search_dir=search_dir,
+        report_path=None if args.no_report else args.report,
+        profile_path=args.profile,
+        checkpoint=None if args.no_checkpoint else Checkpoint(args.checkpoint),
+        resume=args.resume,
+        shard=args.shard,
+        shard_dir=args.shard_dir,
+        refresh_metadata=args.refresh_country_metadata,
+    )
+    try:
+        success = updater.update()
+    finally:
+        http.close()
+        if cache is not None:
+            cache.close()
 
     if success:
         print("\nUpdate completed successfully!")
@@ -0,0 +1,16 @@
+import pytest
+
+
+class FakeClock:
+    """Time source advanced by hand through now"""
+
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
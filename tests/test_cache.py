@@ -0,0 +1,107 @@
+import pytest
+from src.cache import EnrichmentCache
+
+
+@pytest.fixture
+def cache(tmp_path, clock):
+    """Create a cache with short TTLs and no jitter."""
+    cache = EnrichmentCache(
+        tmp_path / 'cache.sqlite',
+        ttls={'airportdb': 100, 'metar': 10},
+        jitter=0,
+        clock=clock,
+    )
+    yield cache
+    cache.close()
+
+
+class TestEnrichmentCache:
+
+    def test_get_and_set(self, cache):
+        """Stored values are returned and counted as hits."""
+        assert cache.get('airportdb', 'LFPG') is None
+        cache.set('airportdb', 'LFPG', {'ident': 'LFPG', 'runways': [{'id': 1}]})
+        assert cache.get('airportdb', 'LFPG') == {'ident': 'LFPG', 'runways': [{'id': 1}]}
+        cache.set('metar', 'LFPG', False)
+        assert cache.get('metar', 'LFPG') is False
+
+        assert cache.stats['airportdb'] == {'hits': 1, 'misses': 1, 'expired': 0, 'stored': 1}
+        assert cache.stats['metar']['hits'] == 1
+
+    def test_ttl_per_source(self, cache, clock):
+        """Entries expire according to the TTL of their source."""
+        cache.set('airportdb', 'LFPG', {'ident': 'LFPG'})
+        cache.set('metar', 'LFPG', True)
+
+        clock.now += 50
+        assert cache.is_expired('metar', 'LFPG')
+        assert not cache.is_expired('airportdb', 'LFPG')
+        assert cache.expired('metar') == {'LFPG'} and cache.expired('airportdb') == set()
+        assert not cache.has('metar', 'LFPG') and cache.has('airportdb', 'LFPG')
+        assert cache.get('metar', 'LFPG') is None
+        assert cache.get('airportdb', 'LFPG') == {'ident': 'LFPG'}
+        assert cache.stats['metar']['expired'] == 1
+
+        # Refreshing resets the TTL
+        cache.set('metar', 'LFPG', True)
+        assert cache.get('metar', 'LFPG') is True
+
+    def test_unknown_entry_is_not_expired(self, cache):
+        """Missing entries are not reported as expired."""
+        assert not cache.is_expired('airportdb', 'XXXX')
+        assert cache.fetched_at('airportdb', 'XXXX') is None
+
+    def test_seed_does_not_overwrite(self, cache, clock):
+        """Seeding keeps an existing entry and its fetch time."""
+        cache.set('metar', 'EGLL', True)
+        fetched_at = cache.fetched_at('metar', 'EGLL')
+        clock.now += 5
+        cache.seed('metar', 'EGLL', False)
+        cache.seed('metar', 'LFPG', False)
+        assert cache.get('metar', 'EGLL') is True
+        assert cache.fetched_at('metar', 'EGLL') == fetched_at
+        assert cache.get('metar', 'LFPG') is False
+
+    def test_lru_eviction(self, tmp_path, clock):
+        """The least recently used entries are evicted beyond max_entries."""
+        cache = EnrichmentCache(tmp_path / 'lru.sqlite', max_entries=2, clock=clock)
+        for ident in ('A', 'B', 'C'):
+            clock.now += 1
+            cache.set('metar', ident, True)
+        clock.now += 1
+        cache.get('metar', 'A')
+
+        assert cache.evict() == 1
+        assert len(cache) == 2
+        assert cache.get('metar', 'B') is None
+        assert cache.get('metar', 'A') is True
+        cache.close()
+
+    def test_persistence(self, tmp_path, clock):
+        """Entries survive across cache instances."""
+        path = tmp_path / 'persist.sqlite'
+        cache = EnrichmentCache(path, clock=clock)
+        cache.set('airportdb', 'EGLL', {'ident': 'EGLL'})
+        cache.close()
+
+        reopened = EnrichmentCache(path, clock=clock)
+        assert reopened.get('airportdb', 'EGLL') == {'ident': 'EGLL'}
+        reopened.close()
+
+    def test_jitter_staggers_expiry(self, tmp_path, clock):
+        """Jitter makes entries written together expire at different times."""
+        cache = EnrichmentCache(tmp_path / 'jitter.sqlite', ttls={'metar': 100},
+                                jitter=0.5, clock=clock)
+        idents = [f'ID{i}' for i in range(50)]
+        for ident in idents:
+            cache.set('metar', ident, True)
+        clock.now += 75
+        expired = [ident for ident in idents if cache.is_expired('metar', ident)]
+        assert 0 < len(expired) < len(idents)
+        cache.close()
+
+    def test_report(self, cache):
+        """The report lists counters per source."""
+        assert cache.report() == "Cache: no lookups"
+        cache.get('metar', 'LFPG')
+        assert cache.report() == "Cache metar: 0 hits, 1 misses, 0 expired, 0 stored"
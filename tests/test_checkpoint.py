@@ -0,0 +1,98 @@
+from src.checkpoint import Checkpoint, CountryStore
+
+
+class TestCountryStore:
+
+    def test_round_trip(self, tmp_path):
+        """Countries are written on assignment and read back on access."""
+        store = CountryStore(tmp_path / 'countries')
+        store['FR'] = [{'ident': 'LFPG'}]
+        store['NA'] = [{'ident': 'FYWH'}]
+
+        assert list(store) == ['FR', 'NA']
+        assert 'FR' in store and 'GB' not in store
+        assert store['FR'] == [{'ident': 'LFPG'}]
+        assert (tmp_path / 'countries' / 'na.json').exists()
+
+        del store['FR']
+        assert len(store) == 1
+        assert not (tmp_path / 'countries' / 'fr.json').exists()
+
+    def test_restore(self, tmp_path):
+        CountryStore(tmp_path)['FR'] = [{'ident': 'LFPG'}]
+        store = CountryStore(tmp_path)
+        assert store.restore('FR')
+        assert not store.restore('GB')
+        assert dict(store) == {'FR': [{'ident': 'LFPG'}]}
+
+
+class TestCheckpoint:
+
+    def test_resume(self, tmp_path):
+        """Results and processed countries of an interrupted run are loaded back."""
+        checkpoint = Checkpoint(tmp_path)
+        assert checkpoint.start('abc') is False
+        checkpoint.record('airportdb', {'LFPG': {'runways': [1]}})
+        checkpoint.record('metar', {'LFPG': True, 'LFPB': False})
+        checkpoint.countries['FR'] = [{'ident': 'LFPG'}]
+        checkpoint.country_done('FR', {'airportdb_fetched': 1})
+
+        resumed = Checkpoint(tmp_path)
+        assert resumed.start('abc', resume=True) is True
+        assert resumed.results == {
+            'airportdb': {'LFPG': {'runways': [1]}},
+            'metar': {'LFPG': True, 'LFPB': False},
+        }
+        assert resumed.processed == {'FR': {'airportdb_fetched': 1}}
+        assert resumed.countries['FR'] == [{'ident': 'LFPG'}]
+
+    def test_other_input_starts_over(self, tmp_path):
+        """A checkpoint of a run over other data is discarded."""
+        checkpoint = Checkpoint(tmp_path)
+        checkpoint.start('abc')
+        checkpoint.countries['FR'] = [{'ident': 'LFPG'}]
+        checkpoint.country_done('FR', {})
+
+        other = Checkpoint(tmp_path)
+        assert other.start('def', resume=True) is False
+        assert other.processed == {}
+        assert len(other.countries) == 0
+        assert not (tmp_path / 'countries' / 'fr.json').exists()
+
+    def test_periodic_flush(self, tmp_path, clock):
+        """Results are appended every flush_every results or flush_interval seconds."""
+        checkpoint = Checkpoint(tmp_path, flush_every=3, flush_interval=10, clock=clock)
+        checkpoint.start('abc')
+
+        def journaled():
+            return len(checkpoint.journal_path.read_text().splitlines()) - 1
+
+        checkpoint.record('metar', {'A': True, 'B': True})
+        assert journaled() == 0
+        checkpoint.record('metar', {'C': True})
+        assert journaled() == 3
+        checkpoint.record('metar', {'D': False})
+        clock.now += 10
+        checkpoint.record('metar', {'E': False})
+        assert journaled() == 5
+
+    def test_truncated_journal(self, tmp_path):
+        """A line cut short by a killed run is ignored."""
+        checkpoint = Checkpoint(tmp_path, flush_every=1)
+        checkpoint.start('abc')
+        checkpoint.record('metar', {'LFPG': True})
+        with open(checkpoint.journal_path, 'a') as f:
+            f.write('{"event": "result", "sou')
+
+        resumed = Checkpoint(tmp_path)
+        assert resumed.start('abc', resume=True) is True
+        assert resumed.results == {'metar': {'LFPG': True}}
+
+    def test_clear(self, tmp_path):
+        checkpoint = Checkpoint(tmp_path / 'checkpoint')
+        checkpoint.start('abc')
+        checkpoint.countries['FR'] = []
+        checkpoint.clear()
+        assert not (tmp_path / 'checkpoint').exists()
+        assert len(checkpoint.countries) == 0
+        assert checkpoint.results == {}
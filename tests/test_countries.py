@@ -0,0 +1,74 @@
+import json
+
+import pytest
+import responses
+from src.countries import CountryMetadata, dumps_metadata
+from src.http_client import HttpClient
+
+
+@pytest.fixture
+def bundled(tmp_path):
+    path = tmp_path / 'bundled.json'
+    path.write_bytes(dumps_metadata(3, {
+        'FR': {'name': 'France', 'continent': 'EU'},
+        'NA': {'name': 'Namibia', 'continent': 'AF'},
+    }))
+    return path
+
+
+@pytest.fixture
+def metadata(tmp_path, bundled):
+    return CountryMetadata(tmp_path / 'cache' / 'country_metadata.json', bundled_path=bundled)
+
+
+def mock_country_io(rsps, names, continents):
+    rsps.add(responses.GET, "https://country.io/names.json", json=names)
+    rsps.add(responses.GET, "https://country.io/continent.json", json=continents)
+
+
+class TestCountryMetadata:
+
+    def test_lookup(self, metadata):
+        assert metadata.version == 3
+        assert metadata.name('NA') == 'Namibia'
+        assert metadata.continent('FR') == 'EU'
+        assert metadata.name('XP') == 'XP'
+        assert metadata.continent('XP') is None
+        assert metadata.names() == {'FR': 'France', 'NA': 'Namibia'}
+
+    def test_bundled_table(self, tmp_path):
+        """The shipped table covers the countries of the dataset."""
+        metadata = CountryMetadata(tmp_path / 'missing.json')
+        assert metadata.name('GB') == 'United Kingdom'
+        assert metadata.continent('US') == 'NA'
+
+    def test_dumps_metadata(self):
+        table = json.loads(dumps_metadata(1, {'FR': {'name': 'France'}, 'AD': {'name': 'Andorra'}}))
+        assert table == {'version': 1, 'countries': {'AD': {'name': 'Andorra'}, 'FR': {'name': 'France'}}}
+
+    @responses.activate
+    def test_refresh(self, metadata, bundled):
+        """A change is written as a new version, used by later loads only."""
+        mock_country_io(responses, {'FR': 'France', 'NA': 'Namibia', 'XK': 'Kosovo'}, {'XK': 'EU'})
+        assert metadata.refresh(HttpClient()) is True
+        assert metadata.name('XK') == 'XK'
+
+        refreshed = CountryMetadata(metadata.path, bundled_path=bundled)
+        assert refreshed.version == 4
+        assert refreshed.name('XK') == 'Kosovo'
+        assert refreshed.continent('FR') == 'EU'
+
+    @responses.activate
+    def test_refresh_unchanged(self, metadata):
+        mock_country_io(responses, {'FR': 'France'}, {'NA': 'AF'})
+        assert metadata.refresh(HttpClient()) is False
+        assert not metadata.path.exists()
+
+    @responses.activate
+    def test_refresh_failure(self, metadata, capsys):
+        """A failed refresh in the background keeps the table and only warns."""
+        responses.add(responses.GET, "https://country.io/names.json", status=404)
+        metadata.refresh_in_background(HttpClient(max_retries=0)).join()
+        assert "Could not refresh" in capsys.readouterr().out
+        assert not metadata.path.exists()
+        assert metadata.name('FR') == 'France'
@@ -0,0 +1,170 @@
+import gzip
+import json
+import pytest
+from src import export
+from src.export import (
+    airport_position, compact_airport, dumps_compact, dumps_pretty, marker_columns,
+    new_write_stats, save_country, to_number, write_compact_country, write_if_changed,
+)
+
+
+@pytest.fixture
+def airports():
+    """Create enriched and plain airport records as saved in airports.json."""
+    return [
+        {
+            'ident': 'LFPG',
+            'type': 'large_airport',
+            'name': 'Charles de Gaulle',
+            'elevation_ft': '392',
+            'coordinates': '49.012798, 2.55',
+            'latitude_deg': 49.012798,
+            'longitude_deg': 2.55,
+            'iata_code': 'CDG',
+            'local_code': '',
+            'runways': [{
+                'id': '1',
+                'airport_ref': '4185',
+                'airport_ident': 'LFPG',
+                'length_ft': '13829',
+                'surface': 'CON',
+                'lighted': '1',
+                'closed': '0',
+                'le_displaced_threshold_ft': '',
+            }],
+            'freqs': [{'id': '2', 'airport_ident': 'LFPG', 'type': 'TWR', 'frequency_mhz': '119.25'}],
+        },
+        {
+            'ident': 'FR-0001',
+            'type': 'heliport',
+            'name': 'Helipad',
+            'elevation_ft': None,
+            'coordinates': '48.5, -1.25',
+        },
+        {'ident': 'FR-0002', 'type': 'closed', 'name': 'Nowhere', 'coordinates': ''},
+    ]
+
+
+class TestExport:
+
+    def test_to_number(self):
+        """Numeric strings become ints or floats, empty strings None."""
+        assert to_number('12') == 12
+        assert to_number('119.25') == 119.25
+        assert to_number(' ') is None
+        assert to_number('CON') == 'CON'
+        assert to_number(3.5) == 3.5
+
+    def test_compact_airport(self, airports):
+        """Details are typed, without empty values or parent references."""
+        compact = compact_airport(airports[0])
+        assert compact['elevation_ft'] == 392
+        assert 'local_code' not in compact
+        runway = compact['runways'][0]
+        assert runway['length_ft'] == 13829
+        assert runway['lighted'] is True
+        assert runway['closed'] is False
+        assert 'airport_ref' not in runway
+        assert 'le_displaced_threshold_ft' not in runway
+        assert compact['freqs'][0]['frequency_mhz'] == 119.25
+
+    def test_airport_position(self, airports):
+        """Positions come from the lat/lon fields, then from coordinates."""
+        assert airport_position(airports[0]) == (49.012798, 2.55)
+        assert airport_position(airports[1]) == (48.5, -1.25)
+        assert airport_position(airports[2]) == (None, None)
+
+    def test_marker_columns(self, airports):
+        """Markers are stored as one array per field."""
+        columns = marker_columns(airports)
+        assert columns['ident'] == ['LFPG', 'FR-0001', 'FR-0002']
+        assert columns['lat'] == [49.012798, 48.5, None]
+        assert columns['type'] == ['large_airport', 'heliport', 'closed']
+
+    def test_write_compact_country(self, airports, tmp_path):
+        """Markers and details chunks are written with gzip copies."""
+        header = {'country_code': 'FR', 'country_name': 'France', 'total_airports': 3}
+        write_compact_country(tmp_path, header, airports, chunk_size=2)
+
+        payload = (tmp_path / 'markers.json').read_bytes()
+        assert b'\n' not in payload
+        markers = json.loads(payload)
+        assert markers['country_name'] == 'France'
+        assert markers['details_chunk_size'] == 2
+        assert gzip.decompress((tmp_path / 'markers.json.gz').read_bytes()) == payload
+
+        first = json.loads((tmp_path / 'details' / '0.json').read_text())
+        second = json.loads((tmp_path / 'details' / '1.json').read_text())
+        assert [a['ident'] for a in first] == ['LFPG', 'FR-0001']
+        assert [a['ident'] for a in second] == ['FR-0002']
+
+    def test_write_compact_country_is_deterministic(self, airports, tmp_path):
+        """Unchanged content gives identical compressed files."""
+        header = {'country_code': 'FR'}
+        write_compact_country(tmp_path, header, airports)
+        first = (tmp_path / 'markers.json.gz').read_bytes()
+        write_compact_country(tmp_path, header, airports)
+        assert (tmp_path / 'markers.json.gz').read_bytes() == first
+
+    def test_stale_chunks_are_removed(self, airports, tmp_path):
+        """Chunks beyond the current airport count are deleted."""
+        write_compact_country(tmp_path, {}, airports, chunk_size=1)
+        assert (tmp_path / 'details' / '2.json.gz').exists()
+        write_compact_country(tmp_path, {}, airports[:1], chunk_size=1)
+        assert {p.name.split('.')[0] for p in (tmp_path / 'details').iterdir()} == {'0'}
+
+    def test_stale_brotli_copies_are_removed(self, airports, tmp_path, monkeypatch):
+        """Without brotli, .br copies written by an earlier run are deleted."""
+        class FakeBrotli:
+            @staticmethod
+            def compress(payload):
+                return b'br' + payload
+
+        monkeypatch.setattr(export, 'brotli', FakeBrotli)
+        write_compact_country(tmp_path, {}, airports)
+        assert (tmp_path / 'markers.json.br').exists()
+        assert (tmp_path / 'details' / '0.json.br').exists()
+
+        monkeypatch.setattr(export, 'brotli', None)
+        write_compact_country(tmp_path, {}, airports)
+        assert not list(tmp_path.rglob('*.br'))
+        assert (tmp_path / 'details' / '0.json.gz').exists()
+
+    def test_dumps_compact(self):
+        """Output is minified UTF-8."""
+        assert dumps_compact({'name': 'Zürich', 'n': [1, 2]}) == '{"name":"Zürich","n":[1,2]}'.encode('utf-8')
+
+    def test_write_if_changed(self, tmp_path):
+        """Files are replaced atomically and only when their content differs."""
+        path = tmp_path / 'countries.json'
+        stats = new_write_stats()
+        assert write_if_changed(path, b'[1]', stats) is True
+        assert write_if_changed(path, b'[1]', stats) is False
+        assert write_if_changed(path, b'[2]', stats) is True
+        assert path.read_bytes() == b'[2]'
+        assert stats == {'written': 2, 'skipped': 1, 'bytes_written': 6, 'bytes_skipped': 3}
+        assert [p.name for p in tmp_path.iterdir()] == ['countries.json']
+        assert path.stat().st_mode & 0o777 == 0o644
+
+    def test_save_country_skips_unchanged(self, airports, tmp_path):
+        """Only last_updated differing keeps the previous files untouched."""
+        header = {'country_code': 'FR', 'country_name': 'France', 'total_airports': 3,
+                  'last_updated': '2024-01-01T00:00:00', 'types_distribution': {}}
+        first = save_country(tmp_path, header, airports)
+        assert first['skipped'] == 0
+        content = (tmp_path / 'airports.json').read_bytes()
+        assert content == dumps_pretty({**header, 'airports': airports})
+
+        header['last_updated'] = '2024-01-02T00:00:00'
+        second = save_country(tmp_path, header, airports)
+        assert second['written'] == 0
+        assert second['skipped'] == first['written']
+        assert second['bytes_skipped'] == first['bytes_written']
+        assert (tmp_path / 'airports.json').read_bytes() == content
+
+        airports[0]['name'] = 'Roissy'
+        third = save_country(tmp_path, header, airports)
+        assert third['written'] > 0
+        data = json.loads((tmp_path / 'airports.json').read_text())
+        assert data['last_updated'] == '2024-01-02T00:00:00'
+        assert data['airports'][0]['name'] == 'Roissy'
@@ -0,0 +1,142 @@
+import pytest
+import requests
+import responses
+from src.http_client import HttpClient, TokenBucket, parse_retry_after
+
+
+class FakeTime:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def clock(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def fake_time():
+    return FakeTime()
+
+
+@pytest.fixture
+def client(fake_time):
+    """Create a client that records its sleeps instead of waiting."""
+    return HttpClient(max_retries=3, backoff=1.0, sleep=fake_time.sleep)
+
+
+class TestTokenBucket:
+
+    def test_burst_then_rate(self, fake_time):
+        """A full bucket allows a burst, then requests are spaced by the rate."""
+        bucket = TokenBucket(2.0, capacity=2, clock=fake_time.clock, sleep=fake_time.sleep)
+        assert bucket.acquire() == 0
+        assert bucket.acquire() == 0
+        assert bucket.acquire() == pytest.approx(0.5)
+        assert bucket.acquire() == pytest.approx(0.5)
+
+    def test_refill(self, fake_time):
+        """Tokens are refilled over time, up to the capacity."""
+        bucket = TokenBucket(1.0, capacity=1, clock=fake_time.clock, sleep=fake_time.sleep)
+        bucket.acquire()
+        fake_time.now += 10
+        assert bucket.acquire() == 0
+        assert bucket.acquire() == pytest.approx(1.0)
+
+
+class TestHttpClient:
+
+    def test_parse_retry_after(self):
+        assert parse_retry_after('7') == 7.0
+        assert parse_retry_after(None) is None
+        assert parse_retry_after('soon') is None
+        assert parse_retry_after('Wed, 01 Oct 2000 00:00:00 GMT') == 0.0
+
+    @responses.activate
+    def test_retry_with_backoff(self, client, fake_time):
+        """Transient errors are retried with an exponential backoff."""
+        url = "https://example.com/data"
+        responses.add(responses.GET, url, status=503)
+        responses.add(responses.GET, url, status=502)
+        responses.add(responses.GET, url, json={'ok': True}, status=200)
+
+        response = client.get(url)
+
+        assert response.json() == {'ok': True}
+        assert len(responses.calls) == 3
+        assert len(fake_time.sleeps) == 2
+        assert 0 <= fake_time.sleeps[0] <= 1.0
+        assert 0 <= fake_time.sleeps[1] <= 2.0
+        assert client.retries == {'example.com': 2}
+
+    @responses.activate
+    def test_retry_after(self, client, fake_time):
+        """Retry-After is honoured on 429 responses."""
+        url = "https://example.com/data"
+        responses.add(responses.GET, url, status=429, headers={'Retry-After': '3'})
+        responses.add(responses.GET, url, status=200)
+
+        assert client.get(url).status_code == 200
+        assert fake_time.sleeps == [3.0]
+
+    @responses.activate
+    def test_retry_after_too_long(self, client, fake_time):
+        """A Retry-After beyond the limit gives up with the error response."""
+        url = "https://example.com/data"
+        responses.add(responses.GET, url, status=429, headers={'Retry-After': '3600'})
+
+        assert client.get(url).status_code == 429
+        assert len(responses.calls) == 1
+        assert fake_time.sleeps == []
+
+    @responses.activate
+    def test_retries_exhausted(self, client):
+        """The last error response is returned once retries are exhausted."""
+        url = "https://example.com/data"
+        responses.add(responses.GET, url, status=500)
+
+        assert client.get(url).status_code == 500
+        assert len(responses.calls) == 4
+
+    @responses.activate
+    def test_client_errors_not_retried(self, client):
+        """4xx responses other than 429 are returned at once."""
+        url = "https://example.com/data"
+        responses.add(responses.GET, url, status=404)
+
+        assert client.get(url).status_code == 404
+        assert len(responses.calls) == 1
+
+    @responses.activate
+    def test_connection_errors(self, client):
+        """Connection errors are retried, then re-raised."""
+        url = "https://example.com/data"
+        responses.add(responses.GET, url, body=requests.ConnectionError("refused"))
+
+        with pytest.raises(requests.ConnectionError):
+            client.get(url)
+        assert len(responses.calls) == 4
+
+    @responses.activate
+    def test_rate_limit_per_host(self, fake_time):
+        """Only hosts with a token bucket are throttled."""
+        bucket = TokenBucket(1.0, capacity=1, clock=fake_time.clock, sleep=fake_time.sleep)
+        client = HttpClient(rate_limits={'api.example.com': bucket}, sleep=fake_time.sleep)
+        responses.add(responses.GET, "https://api.example.com/a", status=200)
+        responses.add(responses.GET, "https://other.example.com/a", status=200)
+
+        for _ in range(3):
+            client.get("https://api.example.com/a")
+            client.get("https://other.example.com/a")
+
+        assert fake_time.sleeps == [pytest.approx(1.0), pytest.approx(1.0)]
+
+    def test_sessions_pooled_per_host(self, client):
+        """Each host reuses a single session."""
+        a = client.session("https://example.com/a")
+        assert client.session("https://example.com/b") is a
+        assert client.session("https://example.org/a") is not a
+        client.close()
@@ -0,0 +1,105 @@
+import json
+
+import pytest
+import requests
+import responses
+from src.http_client import HttpClient
+from src.instrumentation import RunRecorder, percentile, profiled
+
+
+class TestRunRecorder:
+
+    def test_percentile(self):
+        values = sorted(float(i) for i in range(1, 101))
+        assert percentile(values, 50) == 50.0
+        assert percentile(values, 95) == 95.0
+        assert percentile(values, 99) == 99.0
+        assert percentile([3.0], 99) == 3.0
+        assert percentile([], 50) is None
+
+    def test_stage_timings(self, clock):
+        """Stages are timed in order and marked failed when they raise."""
+        recorder = RunRecorder(clock=clock)
+        with recorder.stage('download'):
+            clock.now += 1.5
+        with pytest.raises(ValueError):
+            with recorder.stage('process'):
+                clock.now += 0.25
+                raise ValueError("boom")
+
+        report = recorder.report(success=False)
+        assert list(report['stages']) == ['download', 'process']
+        assert report['stages']['download'] == {'seconds': 1.5, 'status': 'ok'}
+        assert report['stages']['process'] == {'seconds': 0.25, 'status': 'failed'}
+        assert report['duration_seconds'] == 1.75
+        assert report['success'] is False
+
+    def test_host_metrics(self):
+        """Requests are summarized per host with latency percentiles and statuses."""
+        recorder = RunRecorder()
+        for ms in range(1, 101):
+            recorder.record_request('api.example.com', ms / 1000, 200, 10)
+        recorder.record_request('api.example.com', 12.0, None)
+        recorder.record_retry('api.example.com')
+
+        host = recorder.report()['http']['api.example.com']
+        assert host['requests'] == 101
+        assert host['statuses'] == {'200': 100, 'error': 1}
+        assert host['retries'] == 1
+        assert host['bytes_downloaded'] == 1000
+        assert host['latency_ms']['p50'] == 51.0
+        assert host['latency_ms']['max'] == 12000.0
+        assert host['latency_ms']['histogram']['<=10ms'] == 10
+        assert host['latency_ms']['histogram']['>10000ms'] == 1
+        assert sum(host['latency_ms']['histogram'].values()) == 101
+
+    def test_write(self, tmp_path):
+        recorder = RunRecorder()
+        path = tmp_path / 'reports' / 'run_report.json'
+        recorder.write(path, success=True)
+        with open(path) as f:
+            assert json.load(f)['success'] is True
+
+    def test_profiled(self, tmp_path, capsys):
+        """The profiled block dumps its stats; without a path nothing happens."""
+        path = tmp_path / 'process.prof'
+        with profiled(path):
+            sorted(range(1000))
+        assert path.stat().st_size > 0
+        assert "Profile written" in capsys.readouterr().out
+
+        with profiled(None):
+            pass
+        assert capsys.readouterr().out == ""
+
+
+class TestHttpClientRecording:
+
+    @responses.activate
+    def test_attempts_and_retries_are_recorded(self):
+        responses.add(responses.GET, "https://api.example.com/a", status=503)
+        responses.add(responses.GET, "https://api.example.com/a", body="hello", status=200)
+        recorder = RunRecorder()
+        client = HttpClient(backoff=0.0, sleep=lambda _: None, recorder=recorder)
+
+        assert client.get("https://api.example.com/a").status_code == 200
+
+        host = recorder.report()['http']['api.example.com']
+        assert host['requests'] == 2
+        assert host['statuses'] == {'200': 1, '503': 1}
+        assert host['retries'] == 1
+        assert host['bytes_downloaded'] == len("hello")
+
+    @responses.activate
+    def test_connection_errors_are_recorded(self):
+        responses.add(responses.GET, "https://api.example.com/a",
+                      body=requests.ConnectionError("refused"))
+        recorder = RunRecorder()
+        client = HttpClient(max_retries=1, backoff=0.0, sleep=lambda _: None, recorder=recorder)
+
+        with pytest.raises(requests.ConnectionError):
+            client.get("https://api.example.com/a")
+
+        host = recorder.report()['http']['api.example.com']
+        assert host['statuses'] == {'error': 2}
+        assert host['retries'] == 1
@@ -0,0 +1,79 @@
+import json
+import pandas as pd
+import pytest
+from src.manifest import (
+    diff_rows, hash_rows, load_manifest, load_unresolved, save_manifest, scope_fingerprint,
+)
+
+
+COLUMNS = ['ident', 'type', 'name', 'elevation_ft', 'iso_country']
+
+
+@pytest.fixture
+def source_rows():
+    """Create a small source frame."""
+    return pd.DataFrame({
+        'ident': ['EGLL', 'LFPG', 'LFPO'],
+        'type': ['large_airport', 'large_airport', 'medium_airport'],
+        'name': ['Heathrow', 'Charles de Gaulle', 'Orly'],
+        'elevation_ft': [83, 392, None],
+        'iso_country': ['GB', 'FR', 'FR'],
+    })
+
+
+class TestManifest:
+
+    def test_hash_rows(self, source_rows):
+        """Each ident maps to a row hash and its country."""
+        rows = hash_rows(source_rows, COLUMNS)
+        assert set(rows) == {'EGLL', 'LFPG', 'LFPO'}
+        assert rows['EGLL'][1] == 'GB'
+        assert len(rows['EGLL'][0]) == 16
+        assert hash_rows(source_rows, COLUMNS) == rows
+
+    def test_hash_rows_ignores_dtypes(self, source_rows):
+        """Hashes do not depend on the dtypes the CSV was parsed with."""
+        compact = source_rows.astype({'type': 'category', 'iso_country': 'category'})
+        assert hash_rows(compact, COLUMNS) == hash_rows(source_rows, COLUMNS)
+
+    def test_diff_rows(self, source_rows):
+        """Added, changed and removed idents are reported with their countries."""
+        previous = hash_rows(source_rows, COLUMNS)
+        updated = source_rows.copy()
+        updated.loc[updated['ident'] == 'LFPO', 'name'] = 'Paris Orly'
+        updated = updated[updated['ident'] != 'EGLL']
+        updated = pd.concat([updated, pd.DataFrame({
+            'ident': ['EDDF'], 'type': ['large_airport'], 'name': ['Frankfurt'],
+            'elevation_ft': [364], 'iso_country': ['DE'],
+        })])
+
+        changes = diff_rows(previous, hash_rows(updated, COLUMNS))
+        assert changes.added == ['EDDF']
+        assert changes.changed == ['LFPO']
+        assert changes.removed == ['EGLL']
+        assert changes.countries == {'DE', 'FR', 'GB'}
+        assert changes.summary() == "1 added, 1 changed, 1 removed across 3 countries"
+
+    def test_country_move_touches_both_countries(self, source_rows):
+        """A row moving to another country affects both countries."""
+        previous = hash_rows(source_rows, COLUMNS)
+        moved = source_rows.copy()
+        moved.loc[moved['ident'] == 'LFPO', 'iso_country'] = 'MC'
+        changes = diff_rows(previous, hash_rows(moved, COLUMNS))
+        assert changes.changed == ['LFPO']
+        assert changes.countries == {'FR', 'MC'}
+
+    def test_save_and_load(self, source_rows, tmp_path):
+        """Manifests are only reused for the scope they were built with."""
+        path = tmp_path / 'manifest.json'
+        scope = scope_fingerprint('FR,GB|*|large_airport', COLUMNS)
+        rows = hash_rows(source_rows, COLUMNS)
+        save_manifest(path, rows, scope, unresolved={'GB'})
+
+        assert load_manifest(path, scope) == rows
+        assert load_unresolved(path, scope) == {'GB'}
+        assert load_unresolved(path, scope_fingerprint('GB|*|large_airport', COLUMNS)) == set()
+        assert load_manifest(path, scope_fingerprint('GB|*|large_airport', COLUMNS)) is None
+        assert load_manifest(tmp_path / 'missing.json', scope) is None
+        with open(path) as f:
+            assert json.load(f)['version'] == 1
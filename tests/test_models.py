@@ -0,0 +1,116 @@
+import json
+import pickle
+
+from src.export import compact_airport, dumps_pretty
+from src.models import Airport, Runway, to_airports
+
+
+AIRPORT = {
+    'ident': 'LFPG',
+    'type': 'large_airport',
+    'name': 'Charles de Gaulle International Airport',
+    'elevation_ft': '392',
+    'coordinates': '49.012798, 2.55',
+    'metar_available': True,
+    'latitude_deg': '49.012798',
+    'longitude_deg': ' 2.55',
+    'runways': [{
+        'id': '236455', 'airport_ident': 'LFPG', 'length_ft': '13829', 'width_ft': '197',
+        'surface': 'CON', 'lighted': '1', 'closed': '0', 'le_heading_degT': '85.4',
+        'le_displaced_threshold_ft': '', 'he_ident': '27L', 'le_ils': {'freq': 110.1},
+    }],
+    'freqs': [{'id': '60221', 'type': 'TWR', 'frequency_mhz': '119.25'}],
+    'navaids': None,
+    'custom': [1, 2],
+}
+
+
+class TestAirport:
+
+    def test_round_trip(self):
+        """A record reads and dumps as the dict it was built from."""
+        airport = Airport(AIRPORT)
+        assert airport == AIRPORT
+        assert list(airport) == list(AIRPORT)
+        assert airport.to_dict() == AIRPORT
+        assert dumps_pretty(airport) == dumps_pretty(AIRPORT)
+        assert json.loads(dumps_pretty([airport]))[0]['runways'][0]['lighted'] == '1'
+
+        csv_airport = {'ident': 'FR-0001', 'elevation_ft': 120.0, 'coordinates': ''}
+        assert dumps_pretty(Airport(csv_airport)) == dumps_pretty(csv_airport)
+
+    def test_typed_fields(self):
+        """Numbers and flags are parsed once; absent and empty fields are None."""
+        airport = Airport(AIRPORT)
+        assert airport.elevation_ft == 392
+        assert (airport.latitude_deg, airport.longitude_deg) == (49.012798, 2.55)
+        assert airport.iata_code is None
+        (runway,) = airport.runways
+        assert isinstance(runway, Runway)
+        assert (runway.length_ft, runway.le_heading_degT) == (13829, 85.4)
+        assert (runway.lighted, runway.closed) == (True, False)
+        assert runway.le_displaced_threshold_ft is None
+        assert airport.freqs[0].frequency_mhz == 119.25
+        assert airport.position == (49.012798, 2.55)
+        assert Airport({'coordinates': '51.4706, -0.461941'}).position == (51.4706, -0.461941)
+
+    def test_mutation(self):
+        """Assigned fields are parsed and new keys appended in order."""
+        airport = Airport({'ident': 'EGLL', 'coordinates': '51.4706, -0.461941'})
+        assert airport.position == (51.4706, -0.461941)
+        airport.update({'elevation_ft': '83', 'latitude_deg': '51.47', 'longitude_deg': '-0.46'})
+        airport['nearest_metar'] = {'ident': 'EGLL', 'distance_km': 0.0}
+        assert list(airport) == ['ident', 'coordinates', 'elevation_ft', 'latitude_deg',
+                                 'longitude_deg', 'nearest_metar']
+        assert airport.elevation_ft == 83
+        assert airport.position == (51.47, -0.46)
+
+        airport['elevation_ft'] = 90.5
+        assert airport['elevation_ft'] == 90.5
+        del airport['elevation_ft']
+        assert 'elevation_ft' not in airport
+        assert airport.elevation_ft is None
+        assert airport.get('elevation_ft', 'missing') == 'missing'
+
+    def test_compact(self):
+        """The typed export matches the export of the dict."""
+        airport = Airport(AIRPORT)
+        assert compact_airport(airport) == compact_airport(AIRPORT)
+        compact = airport.compact()
+        assert compact['elevation_ft'] == 392
+        assert 'airport_ident' not in compact['runways'][0]
+        assert 'navaids' not in compact
+
+    def test_pickle(self):
+        """Records cross process boundaries, e.g. to the save workers."""
+        (airport,) = pickle.loads(pickle.dumps(to_airports([AIRPORT])))
+        assert airport == AIRPORT
+        assert airport.runways[0].lighted is True
+
+    def test_from_columns(self):
+        """Records filled from columns equal the records built row by row."""
+        columns = {
+            'ident': ['LFPG', 'EGLL', 'FR-0001'],
+            'type': ['large_airport', 'large_airport', None],
+            'elevation_ft': [392.0, None, 120.0],
+            'coordinates': ['49.012798, 2.55', '51.4706, -0.461941', None],
+        }
+        rows = [
+            {key: value for key, value in zip(columns, row) if value is not None}
+            for row in zip(*columns.values())
+        ]
+        airports = Airport.from_columns(columns)
+        assert airports == to_airports(rows)
+        assert [list(airport) for airport in airports] == [list(row) for row in rows]
+        assert airports[0].elevation_ft == 392.0
+        assert airports[1].elevation_ft is None
+        assert airports[0].iata_code is None
+        assert airports[1].position == (51.4706, -0.461941)
+        assert airports[2].position == (None, None)
+        (airport,) = pickle.loads(pickle.dumps(airports[:1]))
+        assert airport == rows[0] and airport.runways is None
+
+        # Strings of numeric fields are parsed as by the constructor
+        airports = Airport.from_columns({'ident': ['LFPG'], 'elevation_ft': ['392']})
+        assert airports[0].elevation_ft == 392
+        assert airports[0]['elevation_ft'] == '392'
@@ -0,0 +1,79 @@
+import json
+import pytest
+from src.export import dumps_compact, dumps_pretty
+from src.reader import read_airports
+
+
+@pytest.fixture
+def country():
+    """Create a country file content with enriched and plain airports."""
+    return {
+        'country_code': 'FR',
+        'country_name': 'France',
+        'total_airports': 3,
+        'last_updated': '2024-01-01T00:00:00',
+        'types_distribution': {'large_airport': 2, 'heliport': 1},
+        'airports': [
+            {
+                'ident': 'LFPG',
+                'name': 'Charles de Gaulle',
+                'runways': [{'id': '1', 'le_ident': '08L'}],
+                'navaids': [{'ident': 'CGN', 'name': 'Paris "Nord" }\n    }'}],
+                'metar_available': True,
+            },
+            {'ident': 'LFÉÉ', 'name': 'Aérodrome', 'metar_available': False},
+            {'ident': 'FR-0001', 'name': 'Helipad', 'metar_available': None},
+        ],
+    }
+
+
+@pytest.fixture(params=['pretty', 'compact'])
+def country_file(request, country, tmp_path):
+    """The country written in the airports.json layout and minified."""
+    path = tmp_path / 'airports.json'
+    dumps = dumps_pretty if request.param == 'pretty' else dumps_compact
+    path.write_bytes(dumps(country))
+    return path
+
+
+class TestReadAirports:
+
+    @pytest.mark.parametrize('block_size', [1, 7, 64, 1 << 16])
+    def test_matches_json_load(self, country_file, block_size):
+        """Streaming gives the same airports whatever the block size."""
+        with open(country_file) as f:
+            expected = {a['ident']: a for a in json.load(f)['airports']}
+        assert read_airports(country_file, block_size=block_size) == expected
+
+    @pytest.mark.parametrize('block_size', [5, 1 << 16])
+    def test_fields_and_idents(self, country_file, block_size):
+        """Only the requested airports and fields are kept."""
+        airports = read_airports(
+            country_file, fields=('runways', 'metar_available'),
+            idents={'FR-0001', 'LFÉÉ'}, block_size=block_size,
+        )
+        assert airports == {
+            'FR-0001': {'ident': 'FR-0001', 'metar_available': None},
+            'LFÉÉ': {'ident': 'LFÉÉ', 'metar_available': False},
+        }
+
+    def test_full_idents_keep_every_field(self, country_file, country):
+        airports = read_airports(
+            country_file, fields=('metar_available',), idents={'FR-0001'}, full={'LFPG'},
+        )
+        assert airports['LFPG'] == country['airports'][0]
+        assert airports['FR-0001'] == {'ident': 'FR-0001', 'metar_available': None}
+
+    def test_without_airports(self, tmp_path):
+        path = tmp_path / 'airports.json'
+        path.write_text('{"country_code": "FR"}')
+        assert read_airports(path) == {}
+
+    def test_errors(self, tmp_path):
+        """Missing and truncated files raise."""
+        with pytest.raises(OSError):
+            read_airports(tmp_path / 'missing.json')
+        path = tmp_path / 'airports.json'
+        path.write_text('{"airports": [{"ident": "LFPG", "name": ')
+        with pytest.raises(ValueError):
+            read_airports(path)
@@ -0,0 +1,62 @@
+from src.scheduler import BudgetScheduler, Task
+
+
+def make_tasks():
+    return [
+        Task('LFAA', 'FR', 'medium_airport', None),
+        Task('LFPG', 'FR', 'large_airport', 300.0),
+        Task('LFPO', 'FR', 'large_airport', None),
+        Task('EGLL', 'GB', 'large_airport', 100.0),
+        Task('EGKK', 'GB', 'large_airport', 200.0),
+        Task('EDDF', 'DE', 'large_airport', None),
+        Task('EDAA', 'DE', 'small_airport', None),
+    ]
+
+
+class TestBudgetScheduler:
+
+    def test_unlimited(self):
+        """Without a budget every task is selected in its original order."""
+        scheduler = BudgetScheduler()
+        tasks = make_tasks()
+        assert scheduler.select('airportdb', tasks) == [t.ident for t in tasks]
+        assert not scheduler.limited
+
+    def test_priority_order(self):
+        """Large airports first, oldest enrichment first, round-robin across countries."""
+        ordered = BudgetScheduler._order(make_tasks(), None)
+        assert [t.ident for t in ordered] == [
+            'EDDF', 'LFPO', 'EGLL',  # first large airport of each country
+            'LFPG', 'EGKK',          # then the next ones
+            'LFAA',                  # then medium airports
+            'EDAA',                  # then small airports
+        ]
+
+    def test_budget(self):
+        """Only the budget is spent, the rest is deferred."""
+        scheduler = BudgetScheduler({'airportdb': 3})
+        tasks = make_tasks()
+        selected = scheduler.select('airportdb', tasks)
+        # Returned in the order of the tasks
+        assert selected == ['LFPO', 'EGLL', 'EDDF']
+        assert scheduler.deferred == {'airportdb': 4}
+        assert scheduler.pending_countries() == {'DE', 'FR', 'GB'}
+        assert scheduler.report() == "airportdb: 4 deferred"
+
+    def test_batched_budget(self):
+        """A call serving several lookups multiplies the budget."""
+        scheduler = BudgetScheduler({'metar': 2})
+        assert len(scheduler.select('metar', make_tasks(), per_call=3)) == 6
+
+    def test_rotation_persists(self, tmp_path):
+        """The next run starts the round-robin after the last country served."""
+        state_path = tmp_path / 'state.json'
+        tasks = [Task(f'{c}{i}', c, 'large_airport', None) for c in 'ABC' for i in range(2)]
+
+        first = BudgetScheduler({'airportdb': 1}, state_path=state_path)
+        assert first.select('airportdb', tasks) == ['A0']
+        first.save()
+
+        second = BudgetScheduler({'airportdb': 1}, state_path=state_path)
+        remaining = [t for t in tasks if t.ident != 'A0']
+        assert second.select('airportdb', remaining) == ['B0']
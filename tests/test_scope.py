@@ -0,0 +1,57 @@
+import pandas as pd
+import pytest
+from src.scope import EnrichmentScope
+
+
+@pytest.fixture
+def airports():
+    """Create airports across several countries and continents."""
+    return pd.DataFrame({
+        'ident': ['KJFK', 'EGLL', 'LFPG', 'LFQQ', 'FYWH'],
+        'type': ['large_airport', 'large_airport', 'large_airport', 'small_airport', 'medium_airport'],
+        'continent': ['NA', 'EU', 'EU', 'EU', 'AF'],
+        'iso_country': ['US', 'GB', 'FR', 'FR', 'NA'],
+    })
+
+
+class TestEnrichmentScope:
+
+    def test_default_allows_everything(self, airports):
+        """A scope without criteria keeps every row with a country."""
+        scope = EnrichmentScope()
+        assert scope.mask(airports).all()
+        assert scope.contains({'iso_country': 'FR', 'type': 'heliport'})
+        assert not scope.contains({'type': 'heliport'})
+
+    def test_mask(self, airports):
+        """Countries, continents and types combine."""
+        scope = EnrichmentScope(continents={'EU', 'AF'}, types={'large_airport', 'medium_airport'})
+        assert list(airports[scope.mask(airports)]['ident']) == ['EGLL', 'LFPG', 'FYWH']
+        scope = EnrichmentScope(countries={'FR'})
+        assert list(airports[scope.mask(airports)]['ident']) == ['LFPG', 'LFQQ']
+
+    def test_contains_matches_mask(self, airports):
+        """Record checks agree with the vectorized mask."""
+        scope = EnrichmentScope(countries={'US', 'FR', 'NA'}, types={'large_airport', 'medium_airport'})
+        records = airports.to_dict('records')
+        assert [scope.contains(r) for r in records] == list(scope.mask(airports))
+
+    def test_parse(self):
+        """Comma-separated lists override the default, 'all' lifts a criterion."""
+        default = EnrichmentScope(countries={'FR', 'GB'}, types={'large_airport'})
+        scope = EnrichmentScope.parse(countries='de, at', default=default)
+        assert scope.countries == {'DE', 'AT'}
+        assert scope.types == {'large_airport'}
+        assert scope.continents is None
+
+        scope = EnrichmentScope.parse(countries='all', continents='eu', types='all', default=default)
+        assert scope.countries is None
+        assert scope.continents == {'EU'}
+        assert scope.types is None
+
+    def test_fingerprint(self):
+        """Fingerprints are stable and differ between scopes."""
+        a = EnrichmentScope(countries=['GB', 'FR'], types=['large_airport'])
+        b = EnrichmentScope(countries=['FR', 'GB'], types=['large_airport'])
+        assert a.fingerprint() == b.fingerprint() == 'FR,GB|*|large_airport'
+        assert EnrichmentScope().fingerprint() != a.fingerprint()
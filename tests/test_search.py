@@ -0,0 +1,129 @@
+import json
+
+import pytest
+from src.search import SearchIndex, load_or_build, normalize, write_data_dir_search
+
+
+AIRPORTS = {
+    'fr': [
+        {'ident': 'LFPG', 'type': 'large_airport', 'name': 'Charles de Gaulle International Airport',
+         'municipality': 'Paris', 'iata_code': 'CDG', 'gps_code': 'LFPG',
+         'coordinates': '49.012798, 2.55', 'keywords': 'Roissy'},
+        {'ident': 'FR-0001', 'type': 'heliport', 'name': 'Héliport de Paris', 'municipality': 'Paris',
+         'coordinates': '48.83, 2.27'},
+        {'ident': 'LFPO', 'type': 'large_airport', 'name': 'Paris-Orly Airport',
+         'municipality': 'Paris', 'iata_code': 'ORY', 'gps_code': 'LFPO',
+         'coordinates': '48.7233, 2.3794'},
+    ],
+    'gb': [
+        {'ident': 'EGLL', 'type': 'large_airport', 'name': 'London Heathrow Airport',
+         'municipality': 'London', 'iata_code': 'LHR', 'coordinates': '51.4706, -0.461941'},
+        {'ident': 'GB-0002', 'type': 'small_airport', 'name': 'Lhr Farm Strip', 'coordinates': ''},
+    ],
+    'ch': [
+        {'ident': 'LSZH', 'type': 'large_airport', 'name': 'Zürich Airport', 'municipality': 'Zurich',
+         'iata_code': 'ZRH', 'coordinates': '47.458, 8.548'},
+    ],
+}
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    for code, records in AIRPORTS.items():
+        (tmp_path / 'data' / code).mkdir(parents=True)
+        with open(tmp_path / 'data' / code / 'airports.json', 'w') as f:
+            json.dump({'airports': records}, f)
+    return tmp_path / 'data'
+
+
+@pytest.fixture
+def index(data_dir):
+    return SearchIndex.from_data_dir(data_dir)
+
+
+def idents(results):
+    return [result.ident for result in results]
+
+
+class TestSearchIndex:
+
+    def test_normalize(self):
+        assert normalize('  Zürich-Kloten (ZRH) ') == 'zurich kloten zrh'
+        assert normalize('Saint-Étienne') == 'saint etienne'
+
+    def test_codes(self, index):
+        """A code equal to the query ranks first, whatever the airport type."""
+        assert idents(index.search('cdg')) == ['LFPG']
+        assert idents(index.search('lfpo'))[0] == 'LFPO'
+        assert idents(index.search('LHR')) == ['EGLL', 'GB-0002']
+        assert idents(index.search('fr-0001')) == ['FR-0001']
+
+    def test_prefix(self, index):
+        """Every word must match, larger airports first."""
+        assert idents(index.search('par')) == ['LFPG', 'LFPO', 'FR-0001']
+        assert idents(index.search('paris orl')) == ['LFPO']
+        assert idents(index.search('heliport paris')) == ['FR-0001']
+        assert idents(index.search('zurich')) == ['LSZH']
+        assert idents(index.search('roissy')) == ['LFPG']
+        assert idents(index.search('par', limit=1)) == ['LFPG']
+
+    def test_fuzzy(self, index):
+        """Typos match similar words after the prefix matches."""
+        assert idents(index.search('heatrow')) == ['EGLL']
+        assert idents(index.search('charles de gaule')) == ['LFPG']
+        assert index.search('heatrow', fuzzy=False) == []
+        assert index.search('qqqq') == []
+
+    def test_result(self, index):
+        (result,) = index.search('orly')
+        assert result.country == 'FR'
+        assert result.position == 2
+        assert (result.lat, result.lon) == (48.7233, 2.3794)
+        assert index.search('farm')[0].lat is None
+
+    def test_save_load(self, index, tmp_path):
+        path = tmp_path / 'search.json'
+        index.save(path)
+        loaded = SearchIndex.load(path)
+        assert len(loaded) == len(index)
+        assert loaded.search('heatrow') == index.search('heatrow')
+        assert loaded.search('cdg') == index.search('cdg')
+
+        path.write_text('{"version": 0}')
+        assert SearchIndex.load(path) is None
+
+    def test_load_or_build(self, data_dir, tmp_path):
+        """The saved index is reused until the data tree changes."""
+        index_path = tmp_path / 'search.json'
+        assert len(load_or_build(data_dir, index_path)) == 6
+        mtime = index_path.stat().st_mtime_ns
+        assert len(load_or_build(data_dir, index_path)) == 6
+        assert index_path.stat().st_mtime_ns == mtime
+
+        (data_dir / 'ch' / 'airports.json').unlink()
+        index = load_or_build(data_dir, index_path)
+        assert len(index) == 5
+        assert index.search('zurich') == []
+
+    def test_export(self, data_dir, tmp_path):
+        """Terms are split by prefix; unchanged files are kept and stale ones removed."""
+        search_dir = tmp_path / 'search'
+        stats = write_data_dir_search(data_dir, search_dir)
+        assert stats['written'] > 0
+        meta = json.loads((search_dir / 'index.json').read_text())
+        assert meta['total_airports'] == 6
+
+        shard = json.loads((search_dir / 'terms' / 'pa.json').read_text())
+        assert shard['terms'] == ['paris']
+        # Large airports by name, then the heliport
+        assert shard['ids'] == [[0, 2, 5]]
+        codes = json.loads((search_dir / 'terms' / 'cd.json').read_text())['codes']
+        records = json.loads((search_dir / 'records' / '0.json').read_text())
+        assert records['ident'][codes['cdg'][0]] == 'LFPG'
+
+        assert write_data_dir_search(data_dir, search_dir)['written'] == 0
+
+        (data_dir / 'ch' / 'airports.json').unlink()
+        stats = write_data_dir_search(data_dir, search_dir)
+        assert not (search_dir / 'terms' / 'zu.json').exists()
+        assert stats['removed'] > 0
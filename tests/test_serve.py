@@ -0,0 +1,160 @@
+import gzip
+import json
+import urllib.error
+import urllib.request
+
+import pytest
+from src.serve import AirportServer, AirportService, LRUCache, accepts_gzip
+
+
+AIRPORTS = {
+    'fr': [
+        {'ident': 'LFPG', 'type': 'large_airport', 'name': 'Charles de Gaulle International Airport',
+         'municipality': 'Paris', 'iata_code': 'CDG', 'elevation_ft': '392',
+         'coordinates': '49.012798, 2.55', 'keywords': 'Roissy ' * 200},
+        {'ident': 'LFPO', 'type': 'large_airport', 'name': 'Paris-Orly Airport',
+         'municipality': 'Paris', 'iata_code': 'ORY', 'coordinates': '48.7233, 2.3794'},
+        {'ident': 'FR-0001', 'type': 'heliport', 'name': 'Héliport de Paris', 'coordinates': '48.83, 2.27'},
+    ],
+    'fj': [
+        {'ident': 'NFFN', 'type': 'large_airport', 'name': 'Nadi International Airport',
+         'coordinates': '-17.7554, 177.443'},
+        {'ident': 'NFTF', 'type': 'large_airport', 'name': 'Fua\'amotu International Airport',
+         'coordinates': '-21.2412, -175.149994'},
+    ],
+}
+
+
+def write_data_dir(data_dir, airports):
+    for code, records in airports.items():
+        (data_dir / code).mkdir(parents=True, exist_ok=True)
+        with open(data_dir / code / 'airports.json', 'w') as f:
+            json.dump({'country_code': code.upper(), 'airports': records}, f)
+    with open(data_dir / 'countries.json', 'w') as f:
+        json.dump([{'code': code.upper()} for code in airports], f)
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    write_data_dir(tmp_path / 'data', AIRPORTS)
+    return tmp_path / 'data'
+
+
+@pytest.fixture
+def service(data_dir):
+    return AirportService(data_dir, cache_size=16, reload_interval=0)
+
+
+def get_json(service, target):
+    response = service.get(target)
+    return response.status, json.loads(response.body)
+
+
+class TestAirportService:
+
+    def test_endpoints(self, service):
+        status, country = get_json(service, '/countries/fr')
+        assert status == 200
+        assert [a['ident'] for a in country['airports']] == ['LFPG', 'LFPO', 'FR-0001']
+        # Records read as they are stored in airports.json
+        assert country['airports'][0]['elevation_ft'] == '392'
+
+        status, found = get_json(service, '/airports/lfpo')
+        assert (found['country_code'], found['index']) == ('FR', 1)
+        assert found['airport']['name'] == 'Paris-Orly Airport'
+
+        (result,) = get_json(service, '/search?q=orly')[1]['results']
+        assert (result['ident'], result['index']) == ('LFPO', 1)
+        assert get_json(service, '/countries')[1] == [{'code': 'FR'}, {'code': 'FJ'}]
+        assert get_json(service, '/airports/XXXX')[0] == 404
+        assert get_json(service, '/bbox?south=1')[0] == 400
+        assert get_json(service, '/search')[0] == 400
+
+    def test_bbox(self, service):
+        """Boxes may cross the antimeridian; larger airports are kept over limit."""
+        _, found = get_json(service, '/bbox?south=48&west=2&north=50&east=3')
+        assert sorted(found['markers']['ident']) == ['FR-0001', 'LFPG', 'LFPO']
+        _, found = get_json(service, '/bbox?south=48&west=2&north=50&east=3&limit=2')
+        assert found['count'] == 3 and found['truncated']
+        assert sorted(found['markers']['ident']) == ['LFPG', 'LFPO']
+        _, found = get_json(service, '/bbox?south=-25&west=170&north=-10&east=-170')
+        assert found['markers']['ident'] == ['NFTF', 'NFFN']
+        assert found['markers']['country'] == ['FJ', 'FJ']
+
+    def test_cache(self, service):
+        """Responses are cached until the dataset is reloaded."""
+        first = service.get('/airports/LFPG')
+        assert service.get('/airports/LFPG') is first
+        assert service.get('/airports/LFPG', accept_gzip=True).gzipped
+        # Small responses are not worth compressing
+        assert not service.get('/airports/LFPO', accept_gzip=True).gzipped
+
+        cache = LRUCache(2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        cache.get('a')
+        cache.put('c', 3)
+        assert (cache.get('a'), cache.get('b'), cache.get('c')) == (1, None, 3)
+
+    def test_reload_during_request(self, service, data_dir, monkeypatch):
+        """A response computed from the previous dataset is not served after a reload."""
+        write_data_dir(data_dir, {'fr': [{'ident': 'LFPG', 'name': 'Paris CDG'}]})
+        route = AirportService._route
+
+        def reload_while_routing(self, dataset, path, params):
+            response = route(self, dataset, path, params)
+            self.reload()
+            return response
+
+        monkeypatch.setattr(AirportService, '_route', reload_while_routing)
+        assert get_json(service, '/airports/LFPG')[1]['airport']['name'] == \
+            'Charles de Gaulle International Airport'
+        monkeypatch.setattr(AirportService, '_route', route)
+        assert get_json(service, '/airports/LFPG')[1]['airport']['name'] == 'Paris CDG'
+
+    def test_accepts_gzip(self):
+        assert accepts_gzip('gzip, deflate, br')
+        assert accepts_gzip('br;q=1.0, GZIP;q=0.5')
+        assert accepts_gzip('*')
+        assert not accepts_gzip('gzip;q=0')
+        assert not accepts_gzip('gzip; q=0.000, *;q=1')
+        assert not accepts_gzip('identity, *;q=0')
+        assert not accepts_gzip('')
+
+    def test_reload(self, service, data_dir):
+        """Changed files are loaded once they are stable for a check."""
+        assert service.get('/airports/EGLL').status == 404
+        write_data_dir(data_dir, {'gb': [{'ident': 'EGLL', 'name': 'London Heathrow Airport'}]})
+
+        assert not service.check_reload()
+        assert service.check_reload()
+        assert service.get('/airports/EGLL').status == 200
+        assert not service.check_reload()
+
+
+class TestAirportServer:
+
+    def test_http(self, service):
+        """ETags answer conditional requests; gzip is sent when accepted."""
+        with AirportServer(service, port=0, quiet=True) as server:
+            url = server.url + '/countries/fr'
+            with urllib.request.urlopen(urllib.request.Request(
+                    url, headers={'Accept-Encoding': 'gzip'})) as response:
+                assert response.headers['Content-Encoding'] == 'gzip'
+                assert json.loads(gzip.decompress(response.read()))['country_code'] == 'FR'
+                etag = response.headers['ETag']
+
+            request = urllib.request.Request(
+                url, headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+            with pytest.raises(urllib.error.HTTPError) as error:
+                urllib.request.urlopen(request)
+            assert error.value.code == 304
+
+            with urllib.request.urlopen(url) as response:
+                assert response.headers['ETag'] != etag
+                assert response.headers.get('Content-Encoding') is None
+
+            refused = urllib.request.Request(url, headers={'Accept-Encoding': 'gzip;q=0'})
+            with urllib.request.urlopen(refused) as response:
+                assert response.headers.get('Content-Encoding') is None
+                assert json.loads(response.read())['country_code'] == 'FR'
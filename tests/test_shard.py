@@ -0,0 +1,110 @@
+import pandas as pd
+import pytest
+from src.shard import (
+    Shard, merge_shard_manifests, shard_index, source_fingerprint, write_shard_manifest,
+)
+
+
+COUNTRIES = ['FR', 'GB', 'DE', 'US', 'NA', 'JP', 'BR', 'AU', 'IT', 'ES']
+
+
+def entry(code):
+    return {'code': code, 'name': f'Country {code}', 'airport_count': 1, 'types_distribution': {}}
+
+
+def write_country(data_dir, code):
+    country_dir = data_dir / code.lower()
+    country_dir.mkdir(parents=True, exist_ok=True)
+    (country_dir / 'airports.json').write_text('{"airports": []}')
+
+
+@pytest.fixture
+def sharded_run(tmp_path):
+    """Manifests and country files of a complete run in three shards."""
+    data_dir, shard_dir = tmp_path / 'data', tmp_path / 'shards'
+    for number in (1, 2, 3):
+        shard = Shard(number, 3)
+        owned = [code for code in COUNTRIES if shard.contains(code)]
+        for code in owned:
+            write_country(data_dir, code)
+        write_shard_manifest(shard_dir, shard, 'source', owned, [entry(code) for code in owned])
+    return data_dir, shard_dir
+
+
+class TestShard:
+
+    def test_parse(self):
+        assert Shard.parse('2/4') == Shard(2, 4)
+        assert str(Shard(2, 4)) == '2/4'
+        assert Shard(2, 4).name == 'shard-2-of-4'
+        for text in ('0/4', '5/4', '1/0', 'a/b', '1'):
+            with pytest.raises(ValueError):
+                Shard.parse(text)
+
+    def test_partition(self):
+        """Each country belongs to exactly one shard, whatever the case of its code."""
+        shards = [Shard(number, 3) for number in (1, 2, 3)]
+        for code in COUNTRIES:
+            assert sum(shard.contains(code) for shard in shards) == 1
+            assert shard_index(code, 3) == shard_index(code.lower(), 3)
+
+    def test_mask(self):
+        df = pd.DataFrame({
+            'ident': ['A', 'B', 'C', 'D'],
+            'iso_country': pd.Categorical(['FR', 'GB', 'FR', None]),
+        })
+        first, second = Shard(1, 2), Shard(2, 2)
+        assert (first.mask(df) | second.mask(df)).tolist() == [True, True, True, False]
+        assert not (first.mask(df) & second.mask(df)).any()
+
+    def test_suffixed(self, tmp_path):
+        shard = Shard(1, 2)
+        assert shard.suffixed(tmp_path / 'manifest.json').name == 'manifest.shard-1-of-2.json'
+        assert shard.suffixed(tmp_path / 'checkpoint').name == 'checkpoint.shard-1-of-2'
+
+    def test_source_fingerprint(self):
+        df = pd.DataFrame({'ident': ['A', 'B']})
+        assert source_fingerprint(df) == source_fingerprint(df.copy())
+        assert source_fingerprint(df) != source_fingerprint(df.iloc[:1])
+
+
+class TestMerge:
+
+    def test_merge(self, sharded_run):
+        data_dir, shard_dir = sharded_run
+        entries = merge_shard_manifests(shard_dir, 3, data_dir)
+        assert sorted(e['code'] for e in entries) == sorted(COUNTRIES)
+        assert [e['name'] for e in entries] == sorted(e['name'] for e in entries)
+
+    def test_missing_shard(self, sharded_run):
+        data_dir, shard_dir = sharded_run
+        (shard_dir / 'shard-2-of-3.json').unlink()
+        with pytest.raises(ValueError, match="shard 2/3 has no manifest"):
+            merge_shard_manifests(shard_dir, 3, data_dir)
+
+    def test_other_sharding(self, sharded_run):
+        data_dir, shard_dir = sharded_run
+        with pytest.raises(ValueError):
+            merge_shard_manifests(shard_dir, 2, data_dir)
+
+    def test_different_sources(self, sharded_run):
+        data_dir, shard_dir = sharded_run
+        shard = Shard(1, 3)
+        owned = [code for code in COUNTRIES if shard.contains(code)]
+        write_shard_manifest(shard_dir, shard, 'other', owned, [entry(code) for code in owned])
+        with pytest.raises(ValueError, match="different source"):
+            merge_shard_manifests(shard_dir, 3, data_dir)
+
+    def test_incomplete_shard(self, sharded_run):
+        """Countries without an index entry or a country file fail the merge."""
+        data_dir, shard_dir = sharded_run
+        shard = Shard(1, 3)
+        owned = [code for code in COUNTRIES if shard.contains(code)]
+        write_shard_manifest(shard_dir, shard, 'source', owned, [entry(code) for code in owned[1:]])
+        with pytest.raises(ValueError, match="missing countries"):
+            merge_shard_manifests(shard_dir, 3, data_dir)
+
+        write_shard_manifest(shard_dir, shard, 'source', owned, [entry(code) for code in owned])
+        (data_dir / owned[0].lower() / 'airports.json').unlink()
+        with pytest.raises(ValueError, match="did not write"):
+            merge_shard_manifests(shard_dir, 3, data_dir)
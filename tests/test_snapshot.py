@@ -0,0 +1,96 @@
+import json
+import pytest
+from src import snapshot
+
+pa = pytest.importorskip('pyarrow')
+
+
+@pytest.fixture
+def airports():
+    """Create an enriched airport and a plain one as saved in airports.json."""
+    return [
+        {
+            'ident': 'LFPG',
+            'type': 'large_airport',
+            'name': 'Charles de Gaulle',
+            'elevation_ft': '392',
+            'continent': 'EU',
+            'iso_country': 'FR',
+            'coordinates': '49.012798, 2.55',
+            'metar_available': True,
+            'nearest_metar': {'ident': 'LFPG', 'distance_km': 0.0},
+            'runways': [
+                {'id': '1', 'airport_ident': 'LFPG', 'length_ft': '13829', 'surface': 'ASP',
+                 'lighted': '1', 'closed': '0', 'le_ident': '08L', 'le_heading_degT': ''},
+                {'id': '2', 'airport_ident': 'LFPG', 'length_ft': '8858', 'surface': 'CON',
+                 'lighted': '0', 'closed': '0'},
+            ],
+            'freqs': [{'id': '3', 'type': 'TWR', 'frequency_mhz': '119.25'}],
+            'navaids': [{'id': '4', 'ident': 'CGN', 'type': 'VOR-DME', 'frequency_khz': '115350'}],
+        },
+        {
+            'ident': 'GB-0001',
+            'type': 'heliport',
+            'name': 'Helipad',
+            'continent': 'EU',
+            'iso_country': 'GB',
+            'coordinates': '51.5, -0.1',
+            'metar_available': False,
+            'nearest_metar': {'ident': 'LFPG', 'distance_km': 301.2},
+        },
+    ]
+
+
+class TestSnapshot:
+
+    def test_build_tables(self, airports):
+        """Nested lists become child tables with numeric dtypes."""
+        tables = snapshot.build_tables(airports)
+        assert tables['airports'].num_rows == 2
+        assert tables['runways'].num_rows == 2
+        assert tables['frequencies'].num_rows == 1
+        assert tables['navaids'].num_rows == 1
+        assert tables['runways'].schema.field('length_ft').type == pa.float64()
+        assert tables['runways'].schema.field('lighted').type == pa.bool_()
+
+        runways = tables['runways'].to_pylist()
+        assert runways[0]['airport_ident'] == 'LFPG'
+        assert runways[0]['id'] == 1
+        assert runways[0]['lighted'] is True
+        assert runways[0]['le_heading_degT'] is None
+        plain = tables['airports'].to_pylist()[1]
+        assert plain['latitude_deg'] == 51.5
+        assert plain['elevation_ft'] is None
+        assert plain['nearest_metar_km'] == 301.2
+        assert tables['navaids'].to_pylist()[0]['airport_ident'] == 'LFPG'
+
+    def test_write_and_read(self, airports, tmp_path):
+        """Tables are read back with projection and filters."""
+        stats = snapshot.write_snapshot(tmp_path, airports)
+        assert stats['written'] == 4
+        assert snapshot.write_snapshot(tmp_path, airports)['skipped'] == 4
+
+        long_runways = snapshot.read_table(
+            tmp_path, 'runways', columns=['airport_ident', 'length_ft'],
+            filters=[('lighted', '=', True), ('length_ft', '>', 8000)],
+        )
+        assert long_runways.column_names == ['airport_ident', 'length_ft']
+        assert long_runways.to_pylist() == [{'airport_ident': 'LFPG', 'length_ft': 13829.0}]
+
+    def test_metar_stations(self, airports, tmp_path):
+        assert snapshot.metar_stations(tmp_path) is None
+        snapshot.write_snapshot(tmp_path, airports)
+        assert snapshot.metar_stations(tmp_path) == (['LFPG'], [49.012798], [2.55])
+        assert snapshot.metar_stations(tmp_path, exclude_countries={'FR'}) == ([], [], [])
+
+    def test_write_data_dir_snapshot(self, airports, tmp_path):
+        """The snapshot covers every country file of the data tree."""
+        data_dir = tmp_path / 'data'
+        for airport in airports:
+            country_dir = data_dir / airport['iso_country'].lower()
+            country_dir.mkdir(parents=True)
+            with open(country_dir / 'airports.json', 'w') as f:
+                json.dump({'airports': [airport]}, f)
+        snapshot.write_data_dir_snapshot(data_dir, tmp_path / 'snapshot')
+        idents = snapshot.read_table(tmp_path / 'snapshot', 'airports', columns=['ident'])
+        assert sorted(idents.column('ident').to_pylist()) == ['GB-0001', 'LFPG']
@@ -0,0 +1,129 @@
+import json
+import numpy as np
+import pytest
+from src.spatial import SpatialIndex, haversine_km, load_or_build, nearest_points
+
+
+@pytest.fixture
+def records():
+    """Create airports on both sides of the antimeridian and near a pole."""
+    return [
+        {'ident': 'LFPG', 'type': 'large_airport', 'iso_country': 'FR',
+         'latitude_deg': 49.012798, 'longitude_deg': 2.55, 'metar_available': True},
+        {'ident': 'LFPO', 'type': 'large_airport', 'iso_country': 'FR',
+         'coordinates': '48.7233, 2.3794', 'metar_available': False},
+        {'ident': 'EGLL', 'type': 'large_airport', 'iso_country': 'GB',
+         'coordinates': '51.4706, -0.461941', 'metar_available': True},
+        {'ident': 'FR-0001', 'type': 'heliport', 'iso_country': 'FR',
+         'coordinates': '48.86, 2.35'},
+        {'ident': 'NFFN', 'type': 'large_airport', 'iso_country': 'FJ',
+         'coordinates': '-17.7554, 177.443'},
+        {'ident': 'NSFA', 'type': 'large_airport', 'iso_country': 'WS',
+         'coordinates': '-13.83, -172.008'},
+        {'ident': 'ENSB', 'type': 'medium_airport', 'iso_country': 'SJ',
+         'coordinates': '78.246101, 15.4656'},
+        {'ident': 'XXXX', 'type': 'closed', 'iso_country': 'FR', 'coordinates': ''},
+    ]
+
+
+@pytest.fixture
+def index(records):
+    return SpatialIndex.from_records(records)
+
+
+class TestSpatialIndex:
+
+    def test_haversine_km(self):
+        """Paris CDG to London Heathrow is about 347 km."""
+        assert haversine_km(49.012798, 2.55, 51.4706, -0.461941) == pytest.approx(347, abs=2)
+
+    def test_records_without_position_are_skipped(self, index):
+        assert len(index) == 7
+        assert index.position('XXXX') is None
+        assert index.position('LFPG') == (49.012798, 2.55)
+
+    def test_nearest(self, index):
+        """Nearest airports are returned closest first."""
+        results = index.nearest(48.86, 2.35, k=3)
+        assert [r.ident for r in results] == ['FR-0001', 'LFPO', 'LFPG']
+        assert results[0].distance_km == pytest.approx(0, abs=1e-6)
+        assert results[1].type == 'large_airport'
+        assert results[1].iso_country == 'FR'
+
+    def test_nearest_filters(self, index):
+        """Type and METAR filters apply before ranking."""
+        assert index.nearest(48.86, 2.35, types=['large_airport'])[0].ident == 'LFPO'
+        assert index.nearest(48.86, 2.35, metar_available=True)[0].ident == 'LFPG'
+        assert index.nearest(48.86, 2.35, k=5, metar_available=True)[-1].ident == 'EGLL'
+
+    def test_nearest_across_antimeridian(self, index):
+        """Queries wrap around longitude 180."""
+        assert index.nearest(-15.0, 179.9)[0].ident == 'NFFN'
+        assert index.nearest(-15.0, -179.9, k=2)[1].ident in {'NFFN', 'NSFA'}
+
+    def test_nearest_far_away(self, index):
+        """The search widens until enough airports are found."""
+        assert index.nearest(-60.0, -60.0, k=7)[-1].ident == 'ENSB'
+        assert len(index.nearest(-60.0, -60.0, k=20)) == 7
+        assert index.nearest(-60.0, -60.0, max_distance_km=100) == []
+
+    def test_within(self, index):
+        """All airports within the radius, nearest first."""
+        assert [r.ident for r in index.within(48.86, 2.35, 50)] == ['FR-0001', 'LFPO', 'LFPG']
+        assert [r.ident for r in index.within(48.86, 2.35, 500)][-1] == 'EGLL'
+        assert index.within(89.0, 0.0, 1500)[0].ident == 'ENSB'
+
+    def test_matches_brute_force(self):
+        """Grid queries match a scan over every point."""
+        rng = np.random.default_rng(1)
+        lat = rng.uniform(-90, 90, 2000)
+        lon = rng.uniform(-180, 180, 2000)
+        index = SpatialIndex.from_records(
+            {'ident': f'P{i}', 'latitude_deg': a, 'longitude_deg': b}
+            for i, (a, b) in enumerate(zip(lat, lon))
+        )
+        for qlat, qlon in zip(rng.uniform(-90, 90, 50), rng.uniform(-180, 180, 50)):
+            distances = np.sort(haversine_km(qlat, qlon, lat, lon))
+            nearest = [r.distance_km for r in index.nearest(qlat, qlon, k=5)]
+            assert nearest == pytest.approx(distances[:5].tolist())
+            assert len(index.within(qlat, qlon, 1000)) == (distances <= 1000).sum()
+
+    def test_nearest_points(self):
+        """Each point is matched with its nearest reference, block by block."""
+        rng = np.random.default_rng(2)
+        lat, lon = rng.uniform(-90, 90, 500), rng.uniform(-180, 180, 500)
+        ref_lat, ref_lon = rng.uniform(-90, 90, 40), rng.uniform(-180, 180, 40)
+        nearest, distances = nearest_points(lat, lon, ref_lat, ref_lon, block_size=100)
+        expected = haversine_km(lat[:, None], lon[:, None], ref_lat, ref_lon)
+        assert (nearest == expected.argmin(axis=1)).all()
+        assert distances == pytest.approx(expected.min(axis=1))
+        with pytest.raises(ValueError):
+            nearest_points(lat, lon, [], [])
+
+    def test_save_and_load(self, index, tmp_path):
+        path = tmp_path / 'spatial.npz'
+        index.save(path)
+        loaded = SpatialIndex.load(path)
+        assert loaded is not None
+        assert loaded.nearest(48.86, 2.35, k=3) == index.nearest(48.86, 2.35, k=3)
+        assert SpatialIndex.load(tmp_path / 'missing.npz') is None
+
+    def test_load_or_build(self, records, tmp_path):
+        """The index is built from the data tree once, then loaded until the tree changes."""
+        data_dir = tmp_path / 'data'
+        (data_dir / 'fr').mkdir(parents=True)
+        with open(data_dir / 'fr' / 'airports.json', 'w') as f:
+            json.dump({'airports': records[:4]}, f)
+        index_path = tmp_path / 'spatial.npz'
+
+        assert len(load_or_build(data_dir, index_path)) == 4
+        assert index_path.exists()
+        mtime = index_path.stat().st_mtime_ns
+        assert len(load_or_build(data_dir, index_path)) == 4
+        assert index_path.stat().st_mtime_ns == mtime
+
+        with open(data_dir / 'fr' / 'airports.json', 'w') as f:
+            json.dump({'airports': records[:3]}, f)
+        assert len(load_or_build(data_dir, index_path)) == 3
+        (data_dir / 'fr' / 'airports.json').unlink()
+        assert len(load_or_build(data_dir, index_path)) == 0
@@ -0,0 +1,111 @@
+import json
+
+import pytest
+from src.tiles import (
+    build_clusters, build_leaves, load_points, mercator, read_tile, tile_of, tiles_in_view,
+    write_data_dir_tiles,
+)
+
+
+AIRPORTS = {
+    'fr': [
+        {'ident': 'LFPG', 'type': 'large_airport', 'coordinates': '49.012798, 2.55'},
+        {'ident': 'XXXX', 'type': 'closed', 'coordinates': ''},
+        {'ident': 'LFPO', 'type': 'large_airport', 'latitude_deg': '48.7233', 'longitude_deg': '2.3794'},
+    ],
+    'gb': [{'ident': 'EGLL', 'type': 'large_airport', 'coordinates': '51.4706, -0.461941'}],
+    'fj': [{'ident': 'NFFN', 'type': 'large_airport', 'coordinates': '-17.7554, 177.443'}],
+    'aq': [{'ident': 'NZSP', 'type': 'small_airport', 'coordinates': '-89.9999, 0.0'}],
+}
+
+
+def write_data_dir(data_dir, airports):
+    for code, records in airports.items():
+        (data_dir / code).mkdir(parents=True, exist_ok=True)
+        with open(data_dir / code / 'airports.json', 'w') as f:
+            json.dump({'airports': records}, f)
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    write_data_dir(tmp_path / 'data', AIRPORTS)
+    return tmp_path / 'data'
+
+
+@pytest.fixture
+def points(data_dir):
+    return load_points(data_dir)
+
+
+class TestTiles:
+
+    def test_tile_of(self):
+        assert tile_of(0.0, 0.0, 0) == (0, 0)
+        assert tile_of(49.0, 2.5, 1) == (1, 0)
+        assert tile_of(-17.7, 177.4, 1) == (1, 1)
+        # Positions beyond the projection limit fall in the edge tiles
+        assert tile_of(-90.0, 180.0, 3) == (7, 7)
+        x, y = mercator([85.0511287798], [-180.0])
+        assert (x[0], y[0]) == (0.0, pytest.approx(0.0, abs=1e-9))
+
+    def test_load_points(self, points):
+        """Airports without a position are skipped, the others keep their file position."""
+        assert len(points.lat) == 5
+        i = points.ident.index('LFPO')
+        assert (points.country[i], int(points.position[i])) == ('FR', 2)
+        assert (points.lat[i], points.lon[i]) == (48.7233, 2.3794)
+
+    def test_clusters_count_every_airport(self, points):
+        """Each zoom holds every airport once, centroids within their tile."""
+        pyramid = build_clusters(points, max_zoom=5)
+        assert sorted(pyramid) == [0, 1, 2, 3, 4]
+        for zoom, tiles in pyramid.items():
+            assert sum(sum(c['count']) for c in tiles.values()) == 5
+            for (x, y), clusters in tiles.items():
+                for lat, lon in zip(clusters['lat'], clusters['lon']):
+                    assert tile_of(lat, lon, zoom) == (x, y)
+
+        # Paris airports are a single cluster at low zooms
+        (world,) = pyramid[0].values()
+        paris = world['count'].index(2)
+        assert world['lat'][paris] == pytest.approx((49.012798 + 48.7233) / 2, abs=1e-4)
+
+    def test_leaves(self, points):
+        leaves = build_leaves(points, max_zoom=4)
+        markers = leaves[tile_of(49.0, 2.5, 4)]
+        assert markers['ident'] == ['LFPG', 'LFPO']
+        assert markers['country'] == ['FR', 'FR']
+        assert markers['index'] == [0, 2]
+        assert sum(len(m['ident']) for m in leaves.values()) == 5
+
+    def test_write_tiles(self, data_dir, tmp_path):
+        """Unchanged tiles are not rewritten and tiles left empty are removed."""
+        tiles_dir = tmp_path / 'tiles'
+        stats = write_data_dir_tiles(data_dir, tiles_dir, max_zoom=4)
+        index = json.loads((tiles_dir / 'index.json').read_text())
+        assert index['max_zoom'] == 4
+        assert index['total_airports'] == 5
+        assert index['tiles']['0'] == 1
+        assert stats['written'] == sum(index['tiles'].values()) + 1
+
+        x, y = tile_of(-17.7554, 177.443, 4)
+        assert read_tile(tiles_dir, 4, x, y)['markers']['ident'] == ['NFFN']
+        # London and Paris are on either side of a cell boundary at zoom 0
+        assert read_tile(tiles_dir, 0, 0, 0)['clusters']['count'] == [1, 2, 1, 1]
+
+        stats = write_data_dir_tiles(data_dir, tiles_dir, max_zoom=4)
+        assert stats['written'] == 0
+        assert stats['removed'] == 0
+
+        (data_dir / 'fj' / 'airports.json').unlink()
+        stats = write_data_dir_tiles(data_dir, tiles_dir, max_zoom=4)
+        assert read_tile(tiles_dir, 4, x, y) is None
+        assert not (tiles_dir / '4' / str(x)).exists()
+        # The zoom 0 and 1 tiles still hold other airports
+        assert stats['removed'] == 3
+
+    def test_tiles_in_view(self):
+        view = set(tiles_in_view(48.0, 1.0, 52.0, 3.0, 7))
+        assert tile_of(49.0, 2.5, 7) in view
+        assert tile_of(51.4706, -0.461941, 7) not in view
+        assert set(tiles_in_view(-85.0, -180.0, 85.0, 179.9, 1)) == {(0, 0), (0, 1), (1, 0), (1, 1)}
@@ -1,8 +1,24 @@
 import pytest
 import pandas as pd
 import json
+import re
+import subprocess
+import sys
+import threading
+import time
 import responses
-from src.update_data import AirportDataUpdater
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+from src import http_client, update_data
+from src.cache import EnrichmentCache
+from src.checkpoint import Checkpoint
+from src.countries import CountryMetadata
+from src.models import Airport
+from src.export import dumps_compact
+from src.scheduler import BudgetScheduler
+from src.scope import EnrichmentScope
+from src.shard import Shard
+from src.update_data import AirportDataUpdater, parse_args, shard_command
 
 
 @pytest.fixture(autouse=True)
@@ -10,7 +26,18 @@ def _api_key(monkeypatch):
     monkeypatch.setenv("AIRPORTDB_API_KEY", "testkey")
 
 
+@pytest.fixture(autouse=True)
+def _no_backoff(monkeypatch):
+    """Retry failed requests without waiting."""
+    monkeypatch.setattr(http_client, "DEFAULT_BACKOFF", 0.0)
+
+
 def mock_airport_apis(rsps, idents):
+    mock_airportdb_api(rsps, idents)
+    mock_metar_api(rsps, idents)
+
+
+def mock_airportdb_api(rsps, idents):
     for ident in idents:
         rsps.add(
             responses.GET,
@@ -19,12 +46,20 @@ def mock_airport_apis(rsps, idents):
             status=200,
             match=[responses.matchers.query_param_matcher({"apiToken": "testkey"})],
         )
-        rsps.add(
-            responses.GET,
-            f"https://aviationweather.gov/api/data/metar?ids={ident}&format=json",
-            json=[{"id": ident}],
-            status=200,
-        )
+
+
+def mock_metar_api(rsps, stations):
+    """Answer (batched) METAR queries with a report for every known station."""
+    def metar_callback(request):
+        ids = parse_qs(urlparse(request.url).query)['ids'][0].split(',')
+        body = [{"icaoId": ident} for ident in ids if ident in stations]
+        return 200, {}, json.dumps(body)
+
+    rsps.add_callback(
+        responses.GET,
+        re.compile(r"https://aviationweather\.gov/api/data/metar.*"),
+        callback=metar_callback,
+    )
 
 @pytest.fixture
 def sample_airports_data():
@@ -71,32 +106,35 @@ def updater(temp_dir, _api_key):
 
 class TestAirportDataUpdater:
 
-    @responses.activate
-    def test_load_country_names(self, updater):
-        """Test loading country names from API."""
-        # Mock the country names API response
-        responses.add(
-            responses.GET,
-            "https://country.io/names.json",
-            json={'US': 'United States', 'GB': 'United Kingdom'},
-            status=200
-        )
-
-        updater.load_country_names()
+    def test_load_country_names(self, updater, temp_dir):
+        """Country names come from the local metadata table, without any request."""
+        with responses.RequestsMock():
+            updater.load_country_names()
         assert updater.country_names['US'] == 'United States'
         assert updater.country_names['GB'] == 'United Kingdom'
+        assert updater.metadata.version >= 1
 
-    @responses.activate
-    def test_load_country_names_failure(self, updater):
-        """Test handling of country names API failure."""
-        responses.add(
-            responses.GET,
-            "https://country.io/names.json",
-            status=404
+    def test_metadata_refresh_in_update(self, temp_dir, sample_airports_data):
+        """The background refresh does not change the names used by the run."""
+        updater = AirportDataUpdater(
+            source_url="https://example.com/airports.csv",
+            data_dir=temp_dir / 'data',
+            metadata=CountryMetadata(temp_dir / 'country_metadata.json'),
+            refresh_metadata=True,
         )
+        with responses.RequestsMock(assert_all_requests_are_fired=False) as rsps:
+            rsps.add(responses.GET, "https://country.io/names.json", json={'FR': 'République française'})
+            rsps.add(responses.GET, "https://country.io/continent.json", json={'FR': 'EU'})
+            rsps.add(
+                responses.GET, "https://example.com/airports.csv",
+                body=sample_airports_data.to_csv(index=False),
+            )
+            mock_airport_apis(rsps, ['EGLL', 'LFPG'])
+            assert updater.update() is True
 
-        updater.load_country_names()
-        assert updater.country_names == {}
+        with open(temp_dir / 'data' / 'fr' / 'airports.json') as f:
+            assert json.load(f)['country_name'] == 'France'
+        assert CountryMetadata(temp_dir / 'country_metadata.json').name('FR') == 'République française'
 
     def test_get_country_name(self, updater):
         """Test country name retrieval."""
@@ -120,6 +158,53 @@ class TestAirportDataUpdater:
         assert len(df) == 3
         assert list(df['iso_country'].unique()) == ['US', 'GB', 'FR']
 
+    @responses.activate
+    def test_download_source_data_compact(self, updater, sample_airports_data):
+        """Only the used columns are parsed, with compact dtypes."""
+        source = sample_airports_data.assign(wikipedia_link='https://example.com')
+        responses.add(
+            responses.GET,
+            "https://example.com/airports.csv",
+            body=source.to_csv(index=False),
+            status=200
+        )
+
+        df = updater.download_source_data()
+        assert 'wikipedia_link' not in df.columns
+        assert str(df['type'].dtype) == 'category'
+        assert str(df['iso_country'].dtype) == 'category'
+        assert str(df['elevation_ft'].dtype) == 'float32'
+        # "NA" is a continent and a country code, not a missing value
+        assert df.loc[0, 'continent'] == 'NA'
+
+    @responses.activate
+    def test_download_source_data_conditional(self, updater, sample_airports_data, temp_dir):
+        """The local copy is reused when the server answers 304."""
+        updater.source_cache_dir = temp_dir / 'cache'
+        responses.add(
+            responses.GET,
+            "https://example.com/airports.csv",
+            body=sample_airports_data.to_csv(index=False),
+            status=200,
+            headers={'ETag': '"v1"', 'Last-Modified': 'Wed, 01 Oct 2025 00:00:00 GMT'},
+        )
+        assert len(updater.download_source_data()) == 3
+        assert 'If-None-Match' not in responses.calls[0].request.headers
+
+        responses.replace(
+            responses.GET,
+            "https://example.com/airports.csv",
+            status=304,
+            match=[responses.matchers.header_matcher({
+                'If-None-Match': '"v1"',
+                'If-Modified-Since': 'Wed, 01 Oct 2025 00:00:00 GMT',
+            })],
+        )
+        df = updater.download_source_data()
+        assert df is not None
+        assert len(df) == 3
+        assert len(responses.calls) == 2
+
     @responses.activate
     def test_download_source_data_failure(self, updater):
         """Test handling of download failure."""
@@ -156,7 +241,8 @@ class TestAirportDataUpdater:
         assert cdg['runways'][0]['id'] == 1
         assert cdg['metar_available'] is True
 
-        assert len(responses.calls) == 4
+        # One AirportDB call per airport, a single batched METAR query
+        assert len(responses.calls) == 3
 
         # Verify API usage stats
         fr_stats = updater.api_stats['FR']
@@ -166,6 +252,38 @@ class TestAirportDataUpdater:
         assert gb_stats['metar_fetched'] == 1
         assert gb_stats['airportdb_fetched'] == 1
 
+    def test_build_records(self, sample_airports_data):
+        """Records skip missing values and cast elevation_ft to float."""
+        frame = sample_airports_data.astype({'type': 'category', 'iso_country': 'category'})
+        frame.loc[1, 'iata_code'] = None
+        frame.loc[2, 'elevation_ft'] = None
+
+        records = AirportDataUpdater._build_records(frame)
+
+        assert [r['ident'] for r in records] == ['KJFK', 'EGLL', 'LFPG']
+        assert all(isinstance(r, Airport) for r in records)
+        assert records[0]['elevation_ft'] == 13.0
+        assert isinstance(records[0]['elevation_ft'], float)
+        assert type(records[0]['type']) is str
+        assert 'iata_code' not in records[1]
+        assert 'elevation_ft' not in records[2]
+        assert records[2]['coordinates'] == '49.0128,2.5500'
+
+    def test_count_types(self):
+        """Type distributions are counted per country in order of appearance."""
+        frame = pd.DataFrame({
+            'iso_country': ['FR', 'GB', 'FR', 'FR', None],
+            'type': ['medium_airport', 'large_airport', 'large_airport', None, 'small_airport'],
+        }).astype({'iso_country': 'category', 'type': 'category'})
+
+        assert AirportDataUpdater._count_types(frame) == {
+            'FR': {'medium_airport': 1, 'large_airport': 1, 'unknown': 1},
+            'GB': {'large_airport': 1},
+        }
+        assert list(AirportDataUpdater._count_types(frame)['FR']) == [
+            'medium_airport', 'large_airport', 'unknown'
+        ]
+
     @responses.activate
     def test_skip_existing_runways_and_metar(self, updater, sample_airports_data, temp_dir):
         """Ensure AirportDB and METAR APIs are skipped when data already exists."""
@@ -252,16 +370,182 @@ class TestAirportDataUpdater:
             assert len(data['airports']) == 1
             assert data['types_distribution']['large_airport'] == 1
 
+        # Compact variant for the map
+        with open(fr_dir / 'markers.json') as f:
+            markers = json.load(f)
+            assert markers['country_name'] == 'France'
+            assert markers['markers']['ident'] == ['LFPG']
+        assert (fr_dir / 'markers.json.gz').exists()
+        assert (fr_dir / 'details' / '0.json').exists()
+
+    def test_save_country_data_in_processes(self, sample_airports_data, temp_dir):
+        """Countries saved by worker processes match, and reruns skip them."""
+        updater = AirportDataUpdater(
+            source_url="https://example.com/airports.csv",
+            data_dir=temp_dir,
+            save_workers=2,
+        )
+        with responses.RequestsMock() as rsps:
+            mock_airport_apis(rsps, ['EGLL', 'LFPG'])
+            updater.process_airports(sample_airports_data)
+        updater.save_country_data()
+        assert updater.write_stats['written'] > 0
+        with open(temp_dir / 'gb' / 'airports.json') as f:
+            assert json.load(f)['airports'][0]['ident'] == 'EGLL'
+
+        updater.save_country_data()
+        assert updater.write_stats['written'] == 0
+        assert updater.write_stats['skipped'] > 0
+
+    def test_assign_nearest_metar(self, updater):
+        """Every airport gets its nearest METAR-reporting airport."""
+        updater.countries_data = {
+            'FR': [
+                {'ident': 'LFPG', 'coordinates': '49.0128,2.5500', 'metar_available': True},
+                {'ident': 'LFPB', 'coordinates': '48.9694,2.4414', 'metar_available': False},
+                {'ident': 'FR-0001', 'coordinates': '', 'metar_available': False},
+            ],
+            'GB': [
+                {'ident': 'EGLL', 'coordinates': '51.4775,-0.4614', 'metar_available': True},
+                {'ident': 'EGKB', 'coordinates': '51.3308,0.0325'},
+            ],
+        }
+        updater.assign_nearest_metar()
+
+        fr, gb = updater.countries_data['FR'], updater.countries_data['GB']
+        assert fr[0]['nearest_metar'] == {'ident': 'LFPG', 'distance_km': 0.0}
+        assert fr[1]['nearest_metar']['ident'] == 'LFPG'
+        assert fr[1]['nearest_metar']['distance_km'] == pytest.approx(9, abs=1)
+        assert 'nearest_metar' not in fr[2]
+        assert gb[1]['nearest_metar']['ident'] == 'EGLL'
+
+    def test_assign_nearest_metar_incremental(self, updater, temp_dir):
+        """Stations of countries not rebuilt come from their saved files."""
+        (temp_dir / 'gb').mkdir()
+        with open(temp_dir / 'gb' / 'airports.json', 'w') as f:
+            json.dump({'airports': [
+                {'ident': 'EGLL', 'coordinates': '51.4775,-0.4614', 'metar_available': True},
+            ]}, f)
+        updater.refreshed_countries = {'FR'}
+        updater.countries_data = {
+            'FR': [{'ident': 'LFAC', 'coordinates': '50.9621,1.9548', 'metar_available': False}],
+        }
+        updater.assign_nearest_metar()
+        assert updater.countries_data['FR'][0]['nearest_metar']['ident'] == 'EGLL'
+
+    def test_incremental_remaps_neighbour_countries(self, temp_dir):
+        """A station flipping in a rebuilt country remaps the countries pointing at it."""
+        source = pd.DataFrame({
+            'ident': ['LFPG', 'LFAC', 'EBBR'],
+            'type': ['large_airport', 'medium_airport', 'large_airport'],
+            'name': ['Charles de Gaulle', 'Calais', 'Brussels'],
+            'iso_country': ['FR', 'FR', 'BE'],
+            'coordinates': ['49.0128,2.5500', '50.9621,1.9548', '50.9014,4.4844'],
+        })
+        clock = {'now': 1_000_000.0}
+        cache = EnrichmentCache(
+            temp_dir / 'cache.sqlite', ttls={'metar': 100}, jitter=0, clock=lambda: clock['now'],
+        )
+
+        def run(stations):
+            updater = AirportDataUpdater(
+                source_url="https://example.com/airports.csv",
+                data_dir=temp_dir / 'data',
+                manifest_path=temp_dir / 'manifest.json',
+                incremental=True,
+                cache=cache,
+            )
+            with responses.RequestsMock(assert_all_requests_are_fired=False) as rsps:
+                rsps.add(responses.GET, "https://example.com/airports.csv",
+                         body=source.to_csv(index=False), status=200)
+                mock_airportdb_api(rsps, ['LFPG', 'LFAC', 'EBBR'])
+                mock_metar_api(rsps, stations)
+                assert updater.update() is True
+            return updater
+
+        def calais():
+            with open(temp_dir / 'data' / 'fr' / 'airports.json') as f:
+                return next(a for a in json.load(f)['airports'] if a['ident'] == 'LFAC')
+
+        # A country outside the scope, never mapped by a full run, with a
+        # station next to Calais
+        us_file = temp_dir / 'data' / 'us' / 'airports.json'
+        us_file.parent.mkdir(parents=True)
+        us_file.write_text(json.dumps({'airports': [
+            {'ident': 'KXYZ', 'iso_country': 'US', 'coordinates': '50.9600,1.9500',
+             'metar_available': True},
+            {'ident': 'KABC', 'iso_country': 'US', 'coordinates': '40.0000,-75.0000',
+             'metar_available': False},
+        ]}))
+        us_before = us_file.read_text()
+
+        run(['LFPG', 'EBBR'])
+        assert calais()['nearest_metar']['ident'] == 'EBBR'
+
+        # Only the METAR entry of EBBR expires: BE alone is rebuilt
+        clock['now'] -= 1000
+        cache.set('metar', 'EBBR', True)
+        clock['now'] += 1050
+        updater = run(['LFPG'])
+
+        assert sorted(updater.countries_data) == ['BE', 'FR']
+        assert updater.countries_data['BE'][0]['metar_available'] is False
+        assert calais()['nearest_metar']['ident'] == 'LFPG'
+        assert us_file.read_text() == us_before
+        with open(temp_dir / 'data' / 'countries.json') as f:
+            assert [c['code'] for c in json.load(f)] == ['BE', 'FR']
+        cache.close()
+
+    def test_snapshot_written_and_reused(self, updater, temp_dir):
+        """The Parquet snapshot covers the data tree and feeds incremental runs."""
+        pytest.importorskip('pyarrow')
+        updater.snapshot_dir = temp_dir / 'snapshot'
+        updater.countries_data = {
+            'GB': [{'ident': 'EGLL', 'iso_country': 'GB', 'coordinates': '51.4775,-0.4614',
+                    'metar_available': True}],
+        }
+        updater.save_country_data()
+        updater.save_snapshot()
+        assert (temp_dir / 'snapshot' / 'airports.parquet').exists()
+
+        # The country file is gone: stations can only come from the snapshot
+        (temp_dir / 'gb' / 'airports.json').unlink()
+        updater.refreshed_countries = {'FR'}
+        updater.countries_data = {
+            'FR': [{'ident': 'LFAC', 'coordinates': '50.9621,1.9548', 'metar_available': False}],
+        }
+        updater.assign_nearest_metar()
+        assert updater.countries_data['FR'][0]['nearest_metar']['ident'] == 'EGLL'
+
+    def test_tiles_written(self, updater, temp_dir):
+        """The tiles cover the whole data tree, not only the countries of the run."""
+        updater.tiles_dir = temp_dir / 'tiles'
+        (temp_dir / 'gb').mkdir()
+        with open(temp_dir / 'gb' / 'airports.json', 'w') as f:
+            json.dump({'airports': [{'ident': 'EGLL', 'coordinates': '51.4775,-0.4614'}]}, f)
+        updater.countries_data = {
+            'FR': [{'ident': 'LFPG', 'coordinates': '49.0128,2.55'}],
+        }
+        updater.save_country_data()
+        updater.save_tiles()
+        with open(temp_dir / 'tiles' / '0' / '0' / '0.json') as f:
+            assert sum(json.load(f)['clusters']['count']) == 2
+        assert updater.tile_stats['written'] > 0
+
+    def test_search_index_written(self, updater, temp_dir):
+        updater.search_dir = temp_dir / 'search'
+        updater.countries_data = {
+            'FR': [{'ident': 'LFPG', 'name': 'Charles de Gaulle', 'iata_code': 'CDG'}],
+        }
+        updater.save_country_data()
+        updater.save_search_index()
+        with open(temp_dir / 'search' / 'terms' / 'cd.json') as f:
+            assert json.load(f)['codes'] == {'cdg': [0]}
+        assert updater.search_stats['written'] > 0
+
     def test_full_update_process(self, updater, sample_airports_data):
         """Test the complete update process."""
         with responses.RequestsMock() as rsps:
-            # Mock country names API
-            rsps.add(
-                responses.GET,
-                "https://country.io/names.json",
-                json={'GB': 'United Kingdom', 'FR': 'France'},
-                status=200
-            )
 
             # Mock airports data API
             rsps.add(
@@ -284,7 +568,200 @@ class TestAirportDataUpdater:
                 c for c in rsps.calls
                 if "airportdb.io" in c.request.url or "aviationweather.gov" in c.request.url
             ]
-            assert len(enrichment_calls) == 4
+            assert len(enrichment_calls) == 3
+
+    def test_run_report(self, sample_airports_data, temp_dir):
+        """The run report holds stage timings, request metrics and statistics."""
+        report_path = temp_dir / 'run_report.json'
+        updater = AirportDataUpdater(
+            source_url="https://example.com/airports.csv",
+            data_dir=temp_dir / 'data',
+            report_path=report_path,
+        )
+        with responses.RequestsMock() as rsps:
+            rsps.add(
+                responses.GET, "https://example.com/airports.csv",
+                body=sample_airports_data.to_csv(index=False),
+            )
+            mock_airport_apis(rsps, ['EGLL', 'LFPG'])
+            assert updater.update() is True
+
+        with open(report_path) as f:
+            report = json.load(f)
+        assert report['success'] is True
+        assert list(report['stages'])[:2] == ['load_country_names', 'download_source_data']
+        assert all(stage['status'] == 'ok' for stage in report['stages'].values())
+        assert report['http']['airportdb.io']['statuses'] == {'200': 2}
+        assert report['http']['airportdb.io']['latency_ms']['p95'] is not None
+        assert report['enrichment']['airportdb_fetched'] == 2
+        assert report['writes']['country_files']['written'] > 0
+
+    def test_run_report_on_failure(self, temp_dir):
+        """A failed run still writes its report."""
+        report_path = temp_dir / 'run_report.json'
+        updater = AirportDataUpdater(
+            source_url="https://example.com/airports.csv",
+            data_dir=temp_dir / 'data',
+            report_path=report_path,
+        )
+        with responses.RequestsMock() as rsps:
+            rsps.add(responses.GET, "https://example.com/airports.csv", status=500)
+            assert updater.update() is False
+
+        with open(report_path) as f:
+            report = json.load(f)
+        assert report['success'] is False
+        assert report['error']
+        assert report['http']['example.com']['statuses'] == {'500': 4}
+
+    def test_resume_interrupted_run(self, sample_airports_data, temp_dir, monkeypatch):
+        """A resumed run reuses the countries processed before the interruption."""
+        def make_updater(resume):
+            return AirportDataUpdater(
+                source_url="https://example.com/airports.csv",
+                data_dir=temp_dir / 'data',
+                checkpoint=Checkpoint(temp_dir / 'checkpoint'),
+                resume=resume,
+                save_workers=1,
+            )
+
+        def mock_sources(rsps):
+            rsps.add(
+                responses.GET, "https://example.com/airports.csv",
+                body=sample_airports_data.to_csv(index=False),
+            )
+
+        def interrupted(self):
+            raise KeyboardInterrupt
+
+        updater = make_updater(resume=False)
+        with responses.RequestsMock() as rsps:
+            mock_sources(rsps)
+            mock_airport_apis(rsps, ['EGLL', 'LFPG'])
+            with monkeypatch.context() as m:
+                m.setattr(AirportDataUpdater, 'save_country_data', interrupted)
+                with pytest.raises(KeyboardInterrupt):
+                    updater.update()
+        assert (temp_dir / 'checkpoint' / 'countries' / 'fr.json').exists()
+
+        updater = make_updater(resume=True)
+        with responses.RequestsMock() as rsps:
+            mock_sources(rsps)
+            assert updater.update() is True
+            assert not any("airportdb.io" in c.request.url for c in rsps.calls)
+
+        with open(temp_dir / 'data' / 'fr' / 'airports.json') as f:
+            airport = json.load(f)['airports'][0]
+        assert airport['city'] == 'Test City'
+        assert airport['metar_available'] is True
+        assert updater.api_stats['FR']['airportdb_fetched'] == 1
+        assert not (temp_dir / 'checkpoint').exists()
+
+    def test_countries_stored_batch_by_batch(self, sample_airports_data, temp_dir, monkeypatch):
+        """Each batch of countries is stored and journaled before the next one is built."""
+        monkeypatch.setattr(update_data, 'PROCESS_BATCH_SIZE', 1)
+        checkpoint = Checkpoint(temp_dir / 'checkpoint')
+        checkpoint.start('run')
+        updater = AirportDataUpdater(
+            source_url="https://example.com/airports.csv",
+            data_dir=temp_dir / 'data',
+            checkpoint=checkpoint,
+        )
+        updater.countries_data = checkpoint.countries
+        build_records = AirportDataUpdater._build_records
+
+        def crash_on_fr(frame):
+            if (frame['iso_country'] == 'FR').any():
+                assert (temp_dir / 'checkpoint' / 'countries' / 'gb.json').exists()
+                raise KeyboardInterrupt
+            return build_records(frame)
+
+        monkeypatch.setattr(AirportDataUpdater, '_build_records', staticmethod(crash_on_fr))
+        with responses.RequestsMock(assert_all_requests_are_fired=False) as rsps:
+            mock_airport_apis(rsps, ['EGLL', 'LFPG'])
+            with pytest.raises(KeyboardInterrupt):
+                updater.process_airports(sample_airports_data)
+
+        resumed = Checkpoint(temp_dir / 'checkpoint')
+        assert resumed.start('run', resume=True)
+        assert set(resumed.processed) == {'GB'}
+        assert resumed.countries['GB'][0]['city'] == 'Test City'
+
+    def test_resume_journaled_results(self, sample_airports_data, temp_dir):
+        """Enrichment results journaled by an interrupted run are not fetched again."""
+        checkpoint = Checkpoint(temp_dir / 'checkpoint')
+        checkpoint.start('run')
+        checkpoint.record('airportdb', {'EGLL': {'ident': 'EGLL', 'city': 'Journaled'}})
+        checkpoint.flush()
+        checkpoint = Checkpoint(temp_dir / 'checkpoint')
+        assert checkpoint.start('run', resume=True)
+
+        updater = AirportDataUpdater(
+            source_url="https://example.com/airports.csv",
+            data_dir=temp_dir / 'data',
+            checkpoint=checkpoint,
+        )
+        updater.countries_data = checkpoint.countries
+        with responses.RequestsMock() as rsps:
+            mock_airport_apis(rsps, ['LFPG'])
+            updater.process_airports(sample_airports_data)
+            airportdb_calls = [c for c in rsps.calls if "airportdb.io" in c.request.url]
+            assert len(airportdb_calls) == 1
+
+        assert updater.countries_data['GB'][0]['city'] == 'Journaled'
+        assert set(checkpoint.countries) == {'GB', 'FR'}
+
+    def test_sharded_update(self, sample_airports_data, temp_dir):
+        """Shard runs merged together give the countries index of a single run."""
+        def run(shard, data_dir):
+            updater = AirportDataUpdater(
+                source_url="https://example.com/airports.csv",
+                data_dir=data_dir,
+                shard=shard,
+                shard_dir=temp_dir / 'shards',
+                save_workers=1,
+            )
+            with responses.RequestsMock(assert_all_requests_are_fired=False) as rsps:
+                rsps.add(
+                    responses.GET, "https://example.com/airports.csv",
+                    body=sample_airports_data.to_csv(index=False),
+                )
+                mock_airport_apis(rsps, ['EGLL', 'LFPG'])
+                assert updater.update() is True
+            return updater
+
+        single = run(None, temp_dir / 'single')
+        sharded = temp_dir / 'sharded'
+        first = run(Shard(1, 2), sharded)
+        assert set(first.countries_data) == {'FR'}
+        assert not (sharded / 'countries.json').exists()
+        assert run(Shard(2, 2), sharded).shard_countries == {'GB'}
+
+        merger = AirportDataUpdater(
+            source_url="https://example.com/airports.csv",
+            data_dir=sharded,
+            shard_dir=temp_dir / 'shards',
+        )
+        assert merger.merge_shards(2) is True
+        assert (sharded / 'countries.json').read_text() == \
+            (single.data_dir / 'countries.json').read_text()
+        assert not list((temp_dir / 'shards').iterdir())
+        assert merger.merge_shards(2) is False
+
+    def test_shard_command(self):
+        """Worker processes share the rate limits and budgets of the host."""
+        args = parse_args(['--workers', '3', '--metar-rate', '1.5', '--airportdb-budget', '10'])
+        commands = [shard_command(['--workers', '3'], args, Shard(n, 3)) for n in (1, 2, 3)]
+
+        def option(command, name):
+            # The last occurrence of an option wins
+            return command[max(i for i, arg in enumerate(command) if arg == name) + 1]
+
+        assert [option(c, '--shard') for c in commands] == ['1/3', '2/3', '3/3']
+        assert all(option(c, '--workers') == '1' for c in commands)
+        assert option(commands[0], '--metar-rate') == '0.5'
+        assert [int(option(c, '--airportdb-budget')) for c in commands] == [4, 3, 3]
+        assert all('--metar-budget' not in c for c in commands)
 
     @responses.activate
     def test_handle_missing_data(self, updater):
@@ -307,15 +784,445 @@ class TestAirportDataUpdater:
         assert 'type' in airport
         assert airport['ident'] == 'TEST1'
 
+    @responses.activate
+    def test_concurrent_lookups_respect_host_limit(self, temp_dir):
+        """Lookups run concurrently but never exceed the per-host limit."""
+        idents = [f'LF{i:02d}' for i in range(8)]
+        df = pd.DataFrame({
+            'ident': idents,
+            'type': ['medium_airport'] * len(idents),
+            'iso_country': ['FR'] * len(idents),
+        })
+        lock = threading.Lock()
+        in_flight = {'current': 0, 'peak': 0}
+
+        def slow_details(request):
+            with lock:
+                in_flight['current'] += 1
+                in_flight['peak'] = max(in_flight['peak'], in_flight['current'])
+            # Later idents answer first, so completion order differs from row order
+            ident = request.url.split('?')[0].rsplit('/', 1)[-1]
+            time.sleep(0.01 * (len(idents) - idents.index(ident)))
+            with lock:
+                in_flight['current'] -= 1
+            return 200, {}, json.dumps({'ident': ident, 'runways': [{'id': ident}]})
+
+        responses.add_callback(
+            responses.GET,
+            re.compile(r"https://airportdb\.io/api/v1/airport/.*"),
+            callback=slow_details,
+        )
+        responses.add(
+            responses.GET,
+            re.compile(r"https://aviationweather\.gov/api/data/metar.*"),
+            json=[],
+            status=200,
+        )
+
+        updater = AirportDataUpdater(
+            source_url="https://example.com/airports.csv",
+            data_dir=temp_dir,
+            max_per_host=2,
+        )
+        updater.process_airports(df)
+
+        airports = updater.countries_data['FR']
+        assert [a['ident'] for a in airports] == idents
+        assert [a['runways'][0]['id'] for a in airports] == idents
+        assert all(a['metar_available'] is False for a in airports)
+        assert in_flight['peak'] == 2
+
+    @responses.activate
+    def test_concurrent_output_matches_sequential(self, sample_airports_data, temp_dir):
+        """Saved files are identical whatever the concurrency limit."""
+        mock_airport_apis(responses, ['EGLL', 'LFPG'])
+        outputs = []
+        for max_per_host in (1, 8):
+            data_dir = temp_dir / str(max_per_host)
+            updater = AirportDataUpdater(
+                source_url="https://example.com/airports.csv",
+                data_dir=data_dir,
+                max_per_host=max_per_host,
+            )
+            updater.process_airports(sample_airports_data)
+            outputs.append(dumps_compact(updater.countries_data))
+        assert outputs[0] == outputs[1]
+
+    @responses.activate
+    def test_check_metar_available_many(self, temp_dir):
+        """METAR checks are chunked and split back out per station."""
+        mock_metar_api(responses, ['EGLL', 'LFPG', 'EDDF'])
+        updater = AirportDataUpdater(
+            source_url="https://example.com/airports.csv",
+            data_dir=temp_dir,
+            metar_batch_size=2,
+        )
+
+        result = updater.check_metar_available_many(
+            ['EGLL', 'LFXX', 'LFPG', 'EGLL', 'EDDF', 'EDXX']
+        )
+
+        assert result == {
+            'EGLL': True, 'LFXX': False, 'LFPG': True, 'EDDF': True, 'EDXX': False
+        }
+        # 5 unique idents in chunks of 2
+        assert len(responses.calls) == 3
+        queried = sorted(
+            parse_qs(urlparse(c.request.url).query)['ids'][0] for c in responses.calls
+        )
+        assert queried == ['EDXX', 'EGLL,LFXX', 'LFPG,EDDF']
+
+    @responses.activate
+    def test_check_metar_available_many_failure(self, updater):
+        """A failed METAR batch reports its stations as unknown after retries."""
+        responses.add(
+            responses.GET,
+            re.compile(r"https://aviationweather\.gov/api/data/metar.*"),
+            status=500,
+        )
+        assert updater.check_metar_available_many(['EGLL', 'LFPG']) == {
+            'EGLL': None, 'LFPG': None
+        }
+        assert len(responses.calls) == 1 + http_client.DEFAULT_MAX_RETRIES
+        assert updater.check_metar_available('EGLL') is None
+
+    @responses.activate
+    def test_check_metar_available_many_no_reports(self, updater, temp_dir):
+        """A 204 without body means that none of the stations reports METAR."""
+        responses.add(
+            responses.GET,
+            re.compile(r"https://aviationweather\.gov/api/data/metar.*"),
+            status=204,
+            body='',
+        )
+        cache = EnrichmentCache(temp_dir / 'cache.sqlite')
+        updater.cache = cache
+        updater.checkpoint = Checkpoint(temp_dir / 'checkpoint')
+        updater.checkpoint.start('run')
+
+        assert updater.check_metar_available_many(['EGLL', 'LFPG']) == {
+            'EGLL': False, 'LFPG': False
+        }
+        assert len(responses.calls) == 1
+        assert cache.get('metar', 'EGLL') is False
+        updater.checkpoint.flush()
+        journal = Checkpoint(temp_dir / 'checkpoint')
+        assert journal.start('run', resume=True)
+        assert journal.results['metar'] == {'EGLL': False, 'LFPG': False}
+        cache.close()
+
+    @responses.activate
+    def test_failed_lookups_are_unknown(self, updater, sample_airports_data, temp_dir):
+        """Failed lookups keep previous data and are not cached as negative."""
+        fr_dir = temp_dir / 'fr'
+        fr_dir.mkdir()
+        with open(fr_dir / 'airports.json', 'w') as f:
+            json.dump({'airports': [{'ident': 'LFPG', 'runways': [], 'metar_available': None}]}, f)
+        responses.add(
+            responses.GET,
+            re.compile(r"https://airportdb\.io/api/v1/airport/.*"),
+            status=429,
+        )
+        responses.add(
+            responses.GET,
+            re.compile(r"https://aviationweather\.gov/api/data/metar.*"),
+            status=503,
+        )
+        cache = EnrichmentCache(temp_dir / 'cache.sqlite')
+        updater.cache = cache
+
+        updater.process_airports(sample_airports_data)
+
+        cdg = updater.countries_data['FR'][0]
+        assert 'runways' not in cdg
+        assert cdg['metar_available'] is None
+        assert updater.api_stats['FR']['airportdb_failed'] == 1
+        assert updater.api_stats['FR']['metar_failed'] == 1
+        assert len(cache) == 0
+        cache.close()
+
+    @responses.activate
+    def test_missing_airportdb_entry_is_cached(self, updater):
+        """A 404 from AirportDB is a known absence of details."""
+        responses.add(
+            responses.GET,
+            "https://airportdb.io/api/v1/airport/XXXX",
+            status=404,
+        )
+        assert updater.fetch_airport_details('XXXX') == {}
+        assert updater.fetch_airport_details('XXXX') == {}
+        assert len(responses.calls) == 1
+
+    @responses.activate
+    def test_persistent_cache_avoids_calls(self, sample_airports_data, temp_dir):
+        """A second run served from the persistent cache makes no API call."""
+        mock_airport_apis(responses, ['EGLL', 'LFPG'])
+        cache = EnrichmentCache(temp_dir / 'cache.sqlite')
+
+        for run in range(2):
+            updater = AirportDataUpdater(
+                source_url="https://example.com/airports.csv",
+                data_dir=temp_dir / f'run{run}',
+                cache=cache,
+            )
+            updater.process_airports(sample_airports_data)
+
+        assert len(responses.calls) == 3
+        lhr = updater.countries_data['GB'][0]
+        assert lhr['runways'][0]['id'] == 1
+        assert lhr['metar_available'] is True
+        assert cache.stats['airportdb']['hits'] == 2
+        assert cache.stats['metar']['hits'] == 2
+        cache.close()
+
+    @responses.activate
+    def test_expired_cache_entries_are_refreshed(self, updater, sample_airports_data, temp_dir):
+        """Existing data is reused and seeded until its cache entry expires."""
+        clock = {'now': 1_000_000.0}
+        cache = EnrichmentCache(
+            temp_dir / 'cache.sqlite', ttls={'airportdb': 100, 'metar': 100},
+            jitter=0, clock=lambda: clock['now'],
+        )
+        updater.cache = cache
+        fr_dir = temp_dir / 'fr'
+        fr_dir.mkdir()
+        with open(fr_dir / 'airports.json', 'w') as f:
+            json.dump({'airports': [{
+                'ident': 'LFPG', 'runways': [{'id': 99}], 'metar_available': False,
+            }]}, f)
+        mock_airport_apis(responses, ['EGLL', 'LFPG'])
+
+        updater.process_airports(sample_airports_data)
+        cdg = updater.countries_data['FR'][0]
+        assert cdg['runways'][0]['id'] == 99
+        assert updater.api_stats['FR']['airportdb_skipped'] == 1
+        assert cache.fetched_at('airportdb', 'LFPG') == clock['now']
+
+        clock['now'] += 1000
+        updater.process_airports(sample_airports_data)
+        cdg = updater.countries_data['FR'][0]
+        assert cdg['runways'][0]['id'] == 1
+        assert cdg['metar_available'] is True
+        assert updater.api_stats['FR']['airportdb_fetched'] == 1
+        assert updater.api_stats['FR']['metar_fetched'] == 1
+        cache.close()
+
+    def test_seeded_details_keep_fresh_source_fields(self, sample_airports_data, temp_dir):
+        """Details reused from a previous file do not bring back its source columns."""
+        cache = EnrichmentCache(temp_dir / 'cache.sqlite')
+        fr_file = temp_dir / 'data' / 'fr' / 'airports.json'
+        fr_file.parent.mkdir(parents=True)
+        with open(fr_file, 'w') as f:
+            json.dump({'airports': [{
+                'ident': 'LFPG', 'name': 'Charles de Gaulle', 'type': 'large_airport',
+                'coordinates': '49.0128,2.5500', 'runways': [{'id': 99}],
+                'metar_available': True, 'nearest_metar': 'LFPG',
+            }]}, f)
+
+        def run(source):
+            updater = AirportDataUpdater(
+                source_url="https://example.com/airports.csv",
+                data_dir=temp_dir / 'data',
+                cache=cache,
+            )
+            with responses.RequestsMock(assert_all_requests_are_fired=False) as rsps:
+                mock_airport_apis(rsps, ['EGLL', 'LFPG'])
+                updater.process_airports(source)
+            return updater
+
+        run(sample_airports_data)
+        assert 'name' not in cache.get('airportdb', 'LFPG')
+
+        changed = sample_airports_data.copy()
+        changed.loc[changed['ident'] == 'LFPG', 'name'] = 'Paris Charles de Gaulle'
+        updater = run(changed)
+
+        cdg = updater.countries_data['FR'][0]
+        assert cdg['name'] == 'Paris Charles de Gaulle'
+        assert cdg['runways'][0]['id'] == 99
+        assert updater.api_stats['FR']['airportdb_failed'] == 0
+        cache.close()
+
+    def test_incremental_update(self, sample_airports_data, temp_dir):
+        """Only countries whose source rows changed are rewritten."""
+        def run(source, incremental):
+            updater = AirportDataUpdater(
+                source_url="https://example.com/airports.csv",
+                data_dir=temp_dir / 'data',
+                manifest_path=temp_dir / 'manifest.json',
+                incremental=incremental,
+            )
+            with responses.RequestsMock(assert_all_requests_are_fired=False) as rsps:
+                rsps.add(responses.GET, "https://example.com/airports.csv",
+                         body=source.to_csv(index=False), status=200)
+                mock_airport_apis(rsps, ['EGLL', 'LFPG'])
+                assert updater.update() is True
+            return updater
+
+        run(sample_airports_data, incremental=True)
+        assert (temp_dir / 'manifest.json').exists()
+        gb_file = temp_dir / 'data' / 'gb' / 'airports.json'
+        gb_before = gb_file.read_text()
+
+        changed = sample_airports_data.copy()
+        changed.loc[changed['ident'] == 'LFPG', 'name'] = 'Paris Charles de Gaulle'
+        updater = run(changed, incremental=True)
+
+        assert updater.refreshed_countries == {'FR'}
+        assert list(updater.countries_data) == ['FR']
+        assert gb_file.read_text() == gb_before
+        with open(temp_dir / 'data' / 'fr' / 'airports.json') as f:
+            assert json.load(f)['airports'][0]['name'] == 'Paris Charles de Gaulle'
+        with open(temp_dir / 'data' / 'countries.json') as f:
+            assert [c['code'] for c in json.load(f)] == ['FR', 'GB']
+
+    def test_incremental_revisits_unresolved_countries(self, sample_airports_data, temp_dir):
+        """Unchanged countries with failed lookups or expired cache entries are processed again."""
+        clock = {'now': 1_000_000.0}
+        cache = EnrichmentCache(
+            temp_dir / 'cache.sqlite', ttls={'airportdb': 100, 'metar': 100},
+            jitter=0, clock=lambda: clock['now'],
+        )
+
+        def run(metar_failing=False):
+            updater = AirportDataUpdater(
+                source_url="https://example.com/airports.csv",
+                data_dir=temp_dir / 'data',
+                manifest_path=temp_dir / 'manifest.json',
+                incremental=True,
+                cache=cache,
+            )
+            with responses.RequestsMock(assert_all_requests_are_fired=False) as rsps:
+                rsps.add(responses.GET, "https://example.com/airports.csv",
+                         body=sample_airports_data.to_csv(index=False), status=200)
+                mock_airportdb_api(rsps, ['EGLL', 'LFPG'])
+                if metar_failing:
+                    rsps.add(responses.GET, re.compile(r"https://aviationweather\.gov/.*"),
+                             status=503)
+                else:
+                    mock_metar_api(rsps, ['EGLL', 'LFPG'])
+                assert updater.update() is True
+            return updater
+
+        run(metar_failing=True)
+        with open(temp_dir / 'data' / 'fr' / 'airports.json') as f:
+            assert json.load(f)['airports'][0]['metar_available'] is None
+
+        updater = run()
+        assert updater.refreshed_countries == {'FR', 'GB'}
+        with open(temp_dir / 'data' / 'fr' / 'airports.json') as f:
+            assert json.load(f)['airports'][0]['metar_available'] is True
+
+        assert run().refreshed_countries == set()
+        clock['now'] += 1000
+        assert run().refreshed_countries == {'FR', 'GB'}
+        cache.close()
+
+    def test_incremental_removes_emptied_countries(self, sample_airports_data, temp_dir):
+        """A country gone from the source loses its files and index entry, not one left out of scope."""
+        def run(source):
+            updater = AirportDataUpdater(
+                source_url="https://example.com/airports.csv",
+                data_dir=temp_dir / 'data',
+                manifest_path=temp_dir / 'manifest.json',
+                incremental=True,
+            )
+            with responses.RequestsMock(assert_all_requests_are_fired=False) as rsps:
+                rsps.add(responses.GET, "https://example.com/airports.csv",
+                         body=source.to_csv(index=False), status=200)
+                mock_airport_apis(rsps, ['EGLL', 'LFPG'])
+                assert updater.update() is True
+            return updater
+
+        run(sample_airports_data)
+        assert (temp_dir / 'data' / 'gb' / 'details' / '0.json').exists()
+
+        updater = run(sample_airports_data[sample_airports_data['iso_country'] != 'GB'])
+        assert updater.removed_countries == {'GB'}
+        assert not (temp_dir / 'data' / 'gb').exists()
+        assert (temp_dir / 'data' / 'fr' / 'airports.json').exists()
+        with open(temp_dir / 'data' / 'countries.json') as f:
+            assert [c['code'] for c in json.load(f)] == ['FR']
+
+        reclassified = sample_airports_data.copy()
+        reclassified.loc[reclassified['ident'] == 'LFPG', 'type'] = 'small_airport'
+        updater = run(reclassified)
+        assert updater.removed_countries == set()
+        assert (temp_dir / 'data' / 'fr' / 'airports.json').exists()
+
+    @responses.activate
+    def test_configurable_scope_and_budget(self, sample_airports_data, temp_dir):
+        """Worldwide scope within a budget, leftovers picked up by the next run."""
+        mock_airport_apis(responses, ['KJFK', 'EGLL', 'LFPG'])
+        updater = AirportDataUpdater(
+            source_url="https://example.com/airports.csv",
+            data_dir=temp_dir,
+            scope=EnrichmentScope(types={'large_airport'}),
+            scheduler=BudgetScheduler({'airportdb': 1, 'metar': 0}),
+        )
+        updater.process_airports(sample_airports_data)
+
+        assert list(updater.countries_data) == ['US', 'GB', 'FR']
+        assert len(responses.calls) == 1
+        # Countries are served in round-robin, alphabetically
+        fr = updater.countries_data['FR'][0]
+        assert fr['runways'][0]['id'] == 1
+        assert updater.api_stats['US']['airportdb_deferred'] == 1
+        assert all(
+            airports[0]['metar_available'] is None
+            for airports in updater.countries_data.values()
+        )
+        assert sum(stats['metar_deferred'] for stats in updater.api_stats.values()) == 3
+        updater.save_country_data()
+
+        # Unknown METAR availability is checked again by the next run
+        updater = AirportDataUpdater(
+            source_url="https://example.com/airports.csv",
+            data_dir=temp_dir,
+            scope=EnrichmentScope(types={'large_airport'}),
+        )
+        updater.process_airports(sample_airports_data)
+        assert len(responses.calls) == 1 + 2 + 1
+        assert all(
+            airports[0]['metar_available'] is True
+            for airports in updater.countries_data.values()
+        )
+
+    @responses.activate
+    def test_cache_hits_are_not_charged_to_budget(self, sample_airports_data, temp_dir):
+        """Lookups answered by the cache leave the whole budget to the misses."""
+        mock_airport_apis(responses, ['KJFK', 'EGLL', 'LFPG'])
+        cache = EnrichmentCache(temp_dir / 'cache.sqlite')
+        for ident in ('EGLL', 'LFPG'):
+            cache.set('airportdb', ident, {'ident': ident, 'runways': [{'id': 7}]})
+        for ident in ('KJFK', 'EGLL', 'LFPG'):
+            cache.set('metar', ident, True)
+        updater = AirportDataUpdater(
+            source_url="https://example.com/airports.csv",
+            data_dir=temp_dir,
+            cache=cache,
+            scope=EnrichmentScope(types={'large_airport'}),
+            scheduler=BudgetScheduler({'airportdb': 1, 'metar': 0}),
+        )
+        updater.process_airports(sample_airports_data)
+
+        # FR and GB come first in the rotation but are cache hits
+        assert [c.request.url.split('?')[0] for c in responses.calls] == [
+            'https://airportdb.io/api/v1/airport/KJFK'
+        ]
+        assert updater.scheduler.deferred == {'airportdb': 0, 'metar': 0}
+        assert updater.countries_data['US'][0]['runways'][0]['id'] == 1
+        assert updater.countries_data['FR'][0]['runways'][0]['id'] == 7
+        assert all(
+            airports[0]['metar_available'] is True
+            for airports in updater.countries_data.values()
+        )
+        cache.close()
+
     def test_error_handling(self, updater):
         """Test error handling in the update process."""
         with responses.RequestsMock() as rsps:
             # Mock failed APIs
-            rsps.add(
-                responses.GET,
-                "https://country.io/names.json",
-                status=500
-            )
             rsps.add(
                 responses.GET,
                 "https://example.com/airports.csv",
@@ -324,6 +1231,17 @@ class TestAirportDataUpdater:
 
             assert updater.update() is False
 
+    def test_import_is_lightweight(self):
+        """Importing the module loads neither pandas nor the other heavy dependencies."""
+        code = (
+            "import sys, src.update_data; "
+            "print(','.join(sorted(m for m in ('pandas', 'numpy', 'pyarrow', 'requests', 'tqdm', 'dotenv') "
+            "if m in sys.modules)))"
+        )
+        result = subprocess.run([sys.executable, '-c', code], cwd=Path(__file__).parent.parent,
+                                capture_output=True, text=True, check=True)
+        assert result.stdout.strip() == ''
+
 
 if __name__ == '__main__':
     pytest.main([__file__])